@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import httpx
+import pandas as pd
+from extractor import Extractor
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncExtractor(Extractor):
+    """
+    Extractor that fetches API pages and sources concurrently with asyncio
+
+    API requests go through an httpx.AsyncClient (connections are kept alive and reused for every page,
+    requests have a timeout, and at most max_concurrency requests are in flight at once). Database reads and
+    csv files, which have blocking clients, run in threads of the default executor, so they overlap with the API requests.
+
+    It has the same DataFrame-returning methods as the Extractor (so it can be used in its place), and
+    extract_tables extracts several tables at once:
+        extractor = AsyncExtractor()
+        frames = extractor.extract_tables(ETL_TABLES) # {"customers": df, "orders": df, ...}
+
+    The async versions of the methods (fetch_*) can be awaited from an event loop of your own.
+    """
+
+    def __init__(self, max_concurrency=8, timeout=30.0, transport=None, **kwargs):
+        """
+        Arguments:
+            max_concurrency: max number of requests/reads in flight at the same time
+            timeout: timeout of every API request in seconds (connecting, and waiting for the response)
+            transport: optional httpx transport, e.g httpx.ASGITransport(app=run_api.app) to call the API in-process
+            kwargs: passed on to the Extractor (csv_engine, csv_cache)
+        """
+
+        super().__init__(**kwargs)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.transport = transport
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _client(self):
+        # a client lives for one run of the event loop (one extract_* call), and keeps its connections open until then
+        limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        return httpx.AsyncClient(timeout=self.timeout, limits=limits, transport=self.transport)
+
+    ######### API ###########
+
+    async def fetch_api(self, client, endpoint, base_url="http://localhost:8000", data_format="json", since=None):
+        """
+        Async version of extract_from_api
+
+        Arguments:
+            client: the httpx.AsyncClient to send the request with
+            rest: see Extractor.extract_from_api
+
+        Returns:
+                pandas Dataframe containing the response data (empty if the request failed)
+        """
+
+        params = {"since": since} if since is not None else None
+        try:
+            df, _ = await self._fetch_page(client, f"{base_url}/{endpoint}", params, self._accept_header(data_format))
+        except Exception as e:
+            logger.error(f"Error when processing {endpoint}: {e}")
+            return pd.DataFrame()
+
+        logger.info(f"Extracted {len(df)} rows of data from {endpoint}")
+        return df
+
+    async def fetch_api_paginated(self, client, endpoint, page_size=10000, base_url="http://localhost:8000",
+                                  data_format="json", since=None):
+        """
+        Async version of extract_from_api_paginated
+
+        The first page tells how many rows there are (X-Total-Count header), then all remaining pages are
+        requested at once (at most max_concurrency at a time, see _fetch_page) and put together in order.
+
+        Arguments:
+            client: the httpx.AsyncClient to send the requests with
+            rest: see Extractor.extract_from_api_paginated
+
+        Returns:
+                pandas Dataframe containing all pages (empty if a request failed)
+        """
+
+        full_url = f"{base_url}/{endpoint}"
+        headers = self._accept_header(data_format)
+
+        def page_params(offset):
+            # the since filter is applied by the API before paginating, so the offsets are relative to the new rows
+            params = {"offset": offset, "limit": page_size}
+            if since is not None:
+                params["since"] = since
+            return params
+
+        try:
+            first_page, total_rows = await self._fetch_page(client, full_url, page_params(0), headers)
+            rest = await asyncio.gather(*(self._fetch_page(client, full_url, page_params(offset), headers)
+                                          for offset in range(page_size, total_rows, page_size)))
+        except Exception as e:
+            logger.error(f"Error when processing {endpoint}: {e}")
+            return pd.DataFrame()
+
+        pages = [first_page] + [page for page, _ in rest]
+        df = pd.concat(pages, ignore_index=True)
+        logger.info(f"Extracted {len(df)} rows of data from {len(pages)} pages of {endpoint}")
+        return df
+
+    async def _fetch_page(self, client, full_url, params, headers=None):
+        # requests a single page and returns it as a df, together with the total row count from the X-Total-Count header
+        # the semaphore caps the requests in flight, the response is parsed outside of it (in a thread, since parsing is CPU work)
+        async with self._semaphore:
+            response = await client.get(full_url, params=params, headers=headers)
+
+        if response.status_code != 200:
+            raise RuntimeError(f"Status code {response.status_code} from {full_url} ({params}): {response.text}")
+
+        self.bytes_received += len(response.content)
+        df = await asyncio.to_thread(self._read_api_response, response)
+        total_rows = int(response.headers.get("X-Total-Count", len(df)))
+        return df, total_rows
+
+    ######### source database and csv files ###########
+
+    async def fetch_db(self, table_name, since=None, key_column=None, columns=None, filters=None):
+        # extract_from_db in a thread (mysql.connector blocks), the read counts towards the concurrency limit
+        async with self._semaphore:
+            return await asyncio.to_thread(self.extract_from_db, table_name, since, key_column, columns, filters)
+
+    async def fetch_csv(self, file_path):
+        # extract_from_csv in a thread
+        async with self._semaphore:
+            return await asyncio.to_thread(self.extract_from_csv, file_path)
+
+    async def fetch_table(self, client, table_info, since=None, base_url="http://localhost:8000", columns=None, filters=None):
+        """
+        Extracts a table described like in main.ETL_TABLES (type db/csv/api, with an optional page_size and data_format)
+
+        columns and filters are pushed down to the query of db tables (see Extractor.extract_from_db), e.g the
+        Transformer's required_columns of the table
+
+        Returns:
+                pandas Dataframe of the table
+        """
+
+        if table_info["type"] == "db":
+            return await self.fetch_db(table_info["name"], since, table_info.get("watermark"), columns, filters)
+        if table_info["type"] == "csv":
+            return await self.fetch_csv(table_info["path"])
+        if table_info.get("page_size"):
+            return await self.fetch_api_paginated(client, table_info["name"], table_info["page_size"], base_url,
+                                                  table_info.get("data_format", "json"), since)
+        return await self.fetch_api(client, table_info["name"], base_url, table_info.get("data_format", "json"), since)
+
+    ######### DataFrame-returning API (same as the Extractor) ###########
+
+    def extract_tables(self, table_infos, since=None, base_url="http://localhost:8000", columns=None, filters=None):
+        """
+        Extracts several tables at once (their API pages, database reads and csv files all overlap)
+
+        Arguments:
+            table_infos: tables described like in main.ETL_TABLES
+            since: optional dict of watermarks by table name, only rows newer than them are extracted
+            base_url: base URL address for the API
+            columns: optional dict of table name -> the columns to extract from db tables (e.g Transformer.required_columns)
+            filters: optional dict of table name -> filters of db tables (see Extractor.extract_from_db)
+
+        Returns:
+                dict of table name -> pandas Dataframe
+        """
+
+        since = since or {}
+        columns = columns or {}
+        filters = filters or {}
+
+        async def extract_all():
+            async with self._client() as client:
+                frames = await asyncio.gather(*(self.fetch_table(client, table_info, since.get(table_info["name"]), base_url,
+                                                                 columns.get(table_info["name"]), filters.get(table_info["name"]))
+                                                for table_info in table_infos))
+            return {table_info["name"]: df for table_info, df in zip(table_infos, frames)}
+
+        return self._run(extract_all())
+
+    def extract_from_api(self, endpoint, base_url="http://localhost:8000", data_format="json", since=None):
+        # see Extractor.extract_from_api
+        async def extract():
+            async with self._client() as client:
+                return await self.fetch_api(client, endpoint, base_url, data_format, since)
+
+        return self._run(extract())
+
+    def extract_from_api_paginated(self, endpoint, page_size=10000, max_workers=None, base_url="http://localhost:8000",
+                                   data_format="json", since=None):
+        # see Extractor.extract_from_api_paginated (the pages in flight are capped by max_concurrency, max_workers is ignored)
+        async def extract():
+            async with self._client() as client:
+                return await self.fetch_api_paginated(client, endpoint, page_size, base_url, data_format, since)
+
+        return self._run(extract())
+
+    def _run(self, coroutine):
+        # runs a coroutine in a new event loop (every thread calling the extractor gets its own loop)
+        async def run():
+            # a semaphore is bound to the loop it's first used in, so every loop gets a new one
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            return await coroutine
+
+        return asyncio.run(run())
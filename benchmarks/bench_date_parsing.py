@@ -0,0 +1,77 @@
+"""
+Benchmark of the order date parsing: pd.to_datetime on every row vs Transformer._parse_dates
+
+The three date columns of orders are built by sampling the date strings of data/orders.csv,
+so they have the same (limited) set of distinct days as the real data.
+
+Usage (from the repository root):
+    python benchmarks/bench_date_parsing.py --rows 10000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# the benchmark lives in benchmarks/, the ETL modules in the repository root
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+import pandas as pd
+from transformer import Transformer, DATE_CACHE, DATE_FORMAT
+
+DATE_COLUMNS = ["order_date", "required_date", "shipped_date"]
+
+
+def build_orders(rows, seed=0):
+    # date columns of `rows` orders, sampled from the sample data (shipped_date has its missing values too)
+    orders = pd.read_csv(os.path.join(ROOT_DIR, "data", "orders.csv"))
+    rng = np.random.default_rng(seed)
+    positions = rng.integers(0, len(orders), size=rows)
+    return pd.DataFrame({col: orders[col].to_numpy()[positions] for col in DATE_COLUMNS})
+
+
+def parse_to_datetime(df):
+    # the previous code: every row of every column is parsed
+    return {col: pd.to_datetime(df[col], format=DATE_FORMAT, errors="coerce") for col in DATE_COLUMNS}
+
+
+def parse_cached(df, date_transformer):
+    return {col: date_transformer._parse_dates(df[col]) for col in DATE_COLUMNS}
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Order date parsing benchmark")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="number of orders")
+    args = parser.parse_args()
+
+    print(f"Building {args.rows} orders..")
+    df = build_orders(args.rows)
+
+    baseline_time, expected = timed(parse_to_datetime, df)
+
+    DATE_CACHE.clear()
+    cold_time, cold = timed(parse_cached, df, Transformer())
+    warm_time, _ = timed(parse_cached, df, Transformer()) # e.g the next chunk or the next run in the same process
+    seconds_time, _ = timed(parse_cached, df, Transformer(date_unit="s"))
+
+    # the cached parsing must give exactly the same dates
+    for col in DATE_COLUMNS:
+        pd.testing.assert_series_equal(expected[col], cold[col])
+
+    print(f"{'pd.to_datetime (3 columns)':<36} {baseline_time:8.2f} s")
+    print(f"{'_parse_dates, empty cache':<36} {cold_time:8.2f} s  ({baseline_time / cold_time:.1f}x)")
+    print(f"{'_parse_dates, warm cache':<36} {warm_time:8.2f} s  ({baseline_time / warm_time:.1f}x)")
+    print(f"{'_parse_dates, warm cache, [s] unit':<36} {seconds_time:8.2f} s  ({baseline_time / seconds_time:.1f}x)")
+    print(f"{len(DATE_CACHE[DATE_FORMAT])} distinct date strings parsed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Memory benchmark for the Transformer: peak RSS per table, with and without copy-free mode
+
+Every (table, mode) case runs in its own Python process, since the peak RSS (ru_maxrss) of a
+process can only go up. The sample data in data/ is repeated --scale times to get a measurable size.
+
+Usage (from the repository root):
+    python benchmarks/bench_memory.py --scale 200
+"""
+
+import argparse
+import gc
+import logging
+import json
+import os
+import resource
+import subprocess
+import sys
+
+# the benchmark lives in benchmarks/, the ETL modules in the repository root
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import pandas as pd
+from transformer import Transformer
+from loader import add_row_hash
+
+
+# csv file of each table in data/, and the reference tables its transformation needs
+TABLES = {
+    "brands": ("brands.csv", []),
+    "categories": ("categories.csv", []),
+    "stores": ("stores.csv", []),
+    "staffs": ("staffs.csv", ["stores"]),
+    "products": ("products.csv", ["brands", "categories"]),
+    "stocks": ("stocks.csv", ["stores", "products"]),
+    "customers": ("customers.csv", []),
+    "orders": ("orders.csv", ["stores", "staffs", "customers"]),
+    "order_items": ("order_items.csv", ["orders", "products"])
+}
+
+# (in the order they have to be transformed in, so the reference data of a table is there before it's needed)
+REFERENCE_ORDER = ["brands", "categories", "stores", "staffs", "products", "customers", "orders"]
+
+
+def peak_rss_mb():
+    # peak resident set size of this process so far (ru_maxrss is in KB on Linux, in bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak /= 1024
+    return peak / 1024
+
+
+def read_table(table_name, scale=1):
+    file_name = TABLES[table_name][0]
+    df = pd.read_csv(os.path.join(ROOT_DIR, "data", file_name))
+    if scale > 1:
+        df = pd.concat([df] * scale, ignore_index=True)
+    return df
+
+
+def measure(table_name, copy_free, scale):
+    """
+    Runs one case: transforms a table the way main.process_table does, and returns the peak RSS
+
+    The reference data the table needs is added first (from the unscaled sample data), then the scaled
+    table is read. The RSS at that point is the baseline, from there on the table is transformed, added
+    to the reference data and hashed for loading, while the extracted df is released after the transform.
+    """
+
+    transformer = Transformer(copy_free=copy_free)
+
+    dependencies = TABLES[table_name][1]
+    for reference_table in REFERENCE_ORDER:
+        if reference_table in dependencies:
+            transformer.add_reference_data(transformer.transform(read_table(reference_table), reference_table),
+                                           reference_table)
+
+    df = read_table(table_name, scale)
+    gc.collect()
+    baseline = peak_rss_mb()
+
+    transformed_df = transformer.transform(df, table_name)
+    del df
+    if table_name in REFERENCE_ORDER:
+        transformer.add_reference_data(transformed_df, table_name)
+    hashed_df = add_row_hash(transformed_df)
+
+    peak = peak_rss_mb()
+    return {"table": table_name, "copy_free": copy_free, "rows": len(hashed_df),
+            "baseline_mb": round(baseline, 1), "peak_mb": round(peak, 1), "transform_mb": round(peak - baseline, 1)}
+
+
+def run_case(table_name, copy_free, scale):
+    # runs a case in a fresh process and returns its result
+    command = [sys.executable, os.path.abspath(__file__), "--case", table_name, "--scale", str(scale)]
+    if copy_free:
+        command.append("--copy-free")
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS per table, with and without copy-free transforms")
+    parser.add_argument("--scale", type=int, default=200, help="number of times the sample data is repeated")
+    parser.add_argument("--tables", nargs="*", default=list(TABLES), help="tables to benchmark")
+    parser.add_argument("--case", help=argparse.SUPPRESS) # (used for the per-case subprocesses)
+    parser.add_argument("--copy-free", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # the log of the Transformer (e.g the data quality warnings) isn't part of the measurement
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.case:
+        print(json.dumps(measure(args.case, args.copy_free, args.scale)))
+        return
+
+    print(f"Peak RSS per table (sample data x{args.scale}), MB above the RSS after reading the table")
+    print(f"{'table':<12} {'rows':>10} {'copy':>10} {'copy-free':>10} {'saved':>8}")
+
+    for table_name in args.tables:
+        copied = run_case(table_name, False, args.scale)
+        copy_free = run_case(table_name, True, args.scale)
+        saved = copied["transform_mb"] - copy_free["transform_mb"]
+        print(f"{table_name:<12} {copied['rows']:>10} {copied['transform_mb']:>10} {copy_free['transform_mb']:>10} {saved:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+End-to-end benchmark of the ETL: times the Extractor, Transformer and Loader for every table, at one or more scale factors
+
+Runs offline: the data comes from data_generator.py, the API is called in-process (run_api.app through
+a TestClient), and ProductDB/BikeCorpDB are SQLite stand-ins (see sqlite_standin.py). The results are
+written as JSON, so runs of different versions can be compared.
+
+Usage (from the repository root):
+    python benchmarks/run_benchmarks.py --scales 1 10 100
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# the benchmark lives in benchmarks/, the ETL modules in the repository root (run_api reads data/ relative to it)
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)
+
+import numpy as np
+import pandas as pd
+import polars as pl
+from fastapi.testclient import TestClient
+
+import run_api
+from data_generator import generate_dataset, write_dataset
+from main import ETL_TABLES, TRANSFORMER_ENGINES
+from transformer import Transformer
+from sqlite_standin import create_source_database, create_target_database, StandInExtractor, StandInLoader
+
+
+API_BASE_URL = "http://testserver" # (the host name TestClient answers to)
+
+
+def serve_dataset(data_dir):
+    # points the API endpoints at the generated data (read the same way run_api reads data/)
+    for endpoint, key_column in run_api.KEY_COLUMNS.items():
+        frame = pl.read_csv(os.path.join(data_dir, f"{endpoint}.csv"))
+        setattr(run_api, endpoint, frame.sort(key_column, maintain_order=True))
+
+
+def extract(extractor, table_info, data_dir):
+    # extracts a table the way main.process_table does (db tables in one go)
+    if table_info["type"] == "db":
+        return extractor.extract_from_db(table_info["name"])
+    if table_info["type"] == "csv":
+        return extractor.extract_from_csv(os.path.join(data_dir, os.path.basename(table_info["path"])))
+    if table_info.get("page_size"):
+        return extractor.extract_from_api_paginated(table_info["name"], page_size=table_info["page_size"],
+                                                    base_url=API_BASE_URL, data_format=table_info.get("data_format", "json"))
+    return extractor.extract_from_api(table_info["name"], base_url=API_BASE_URL,
+                                      data_format=table_info.get("data_format", "json"))
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_scale(scale, engine="pandas", copy_free=False, compact=False):
+    """
+    Runs the ETL of every table once on a generated data set of the given scale
+
+    Returns:
+            dict with the rows and the extract/transform/load seconds of every table, and the stage and end-to-end totals
+    """
+
+    print(f"\nScale {scale}x: generating data..")
+    dataset, generate_seconds = timed(generate_dataset, scale)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_dataset(dataset, data_dir)
+        serve_dataset(data_dir)
+
+        source = create_source_database(dataset)
+        target = create_target_database()
+        del dataset
+
+        if engine == "pandas":
+            transformer = Transformer(copy_free=copy_free, compact=compact)
+        else:
+            transformer = TRANSFORMER_ENGINES[engine]()
+
+        reference_tables = {dependency for table_info in ETL_TABLES for dependency in table_info["depends_on"]}
+        tables = {}
+
+        with TestClient(run_api.app) as api_client:
+            extractor = StandInExtractor(source, api_client)
+            loader = StandInLoader(target)
+            run_start = time.perf_counter()
+
+            for table_info in ETL_TABLES:
+                table_name = table_info["name"]
+                df, extract_seconds = timed(extract, extractor, table_info, data_dir)
+                rows_extracted = len(df)
+                transformed_df, transform_seconds = timed(transformer.transform, df, table_name)
+                del df
+                if table_name in reference_tables:
+                    transformer.add_reference_data(transformed_df, table_name)
+                loaded, load_seconds = timed(loader.load, transformed_df, table_name,
+                                             method=table_info.get("load_method", "merge"),
+                                             batch_size=table_info.get("batch_size"))
+
+                tables[table_name] = {
+                    "rows_extracted": rows_extracted,
+                    "rows_loaded": len(transformed_df) if loaded else 0,
+                    "extract_seconds": round(extract_seconds, 4),
+                    "transform_seconds": round(transform_seconds, 4),
+                    "load_seconds": round(load_seconds, 4)
+                }
+                print(f"  {table_name:<12} {rows_extracted:>10} rows  extract {extract_seconds:7.2f}s  "
+                      f"transform {transform_seconds:7.2f}s  load {load_seconds:7.2f}s")
+
+            end_to_end_seconds = time.perf_counter() - run_start
+
+    stages = {stage: round(sum(table[f"{stage}_seconds"] for table in tables.values()), 4)
+              for stage in ["extract", "transform", "load"]}
+    print(f"  total: extract {stages['extract']:.2f}s, transform {stages['transform']:.2f}s, load {stages['load']:.2f}s, "
+          f"end to end {end_to_end_seconds:.2f}s")
+
+    return {
+        "scale": scale,
+        "generate_seconds": round(generate_seconds, 4),
+        "tables": tables,
+        "stages": stages,
+        "end_to_end_seconds": round(end_to_end_seconds, 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end ETL benchmark on generated data with local stand-ins")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="scale factors to run (1 to 1000)")
+    parser.add_argument("--engine", choices=sorted(TRANSFORMER_ENGINES), default="pandas", help="transformer engine")
+    parser.add_argument("--copy-free", action="store_true", help="copy-free Transformer (pandas engine)")
+    parser.add_argument("--compact", action="store_true", help="compact dtypes in the Transformer (pandas engine)")
+    parser.add_argument("--output", help="JSON file for the results (default: benchmarks/results/benchmark_<time>.json)")
+    parser.add_argument("--verbose", action="store_true", help="show the log of the ETL")
+    args = parser.parse_args()
+
+    # the ETL's log is only shown with --verbose (errors are always shown)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR, format="%(levelname)s %(name)s: %(message)s")
+
+    created = datetime.now()
+    results = {
+        "created": created.isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "polars": pl.__version__,
+            "numpy": np.__version__
+        },
+        "options": {"engine": args.engine, "copy_free": args.copy_free, "compact": args.compact},
+        "runs": [run_scale(scale, args.engine, args.copy_free, args.compact) for scale in args.scales]
+    }
+
+    output = args.output or os.path.join(BENCHMARK_DIR, "results", f"benchmark_{created:%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
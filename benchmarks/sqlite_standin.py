@@ -0,0 +1,213 @@
+"""
+SQLite stand-in for the MySQL databases, so the benchmarks can run without a MySQL server
+
+StandInConnection wraps an sqlite3 connection in the small part of the mysql.connector interface
+the Extractor and Loader use (dictionary/unbuffered cursors, %s parameters, SET/LOCK/START TRANSACTION statements,
+@@max_allowed_packet, CHECKSUM TABLE, INSERT ... ON DUPLICATE KEY UPDATE). LOAD DATA LOCAL INFILE is answered
+with the "not allowed" error, so the Loader falls back to INSERTs, as it does on such a server.
+
+The timings are of course not those of MySQL, but they show where the Python side spends its time.
+"""
+
+import re
+import sqlite3
+import zlib
+from contextlib import nullcontext
+
+import mysql.connector
+import numpy as np
+import pandas as pd
+from extractor import Extractor
+from loader import Loader, PRIMARY_KEYS
+
+
+# columns of the BikeCorpDB tables (see setup_target_database.py)
+TARGET_COLUMNS = {
+    "brands": ["brand_id", "brand_name"],
+    "categories": ["category_id", "category_name"],
+    "stores": ["store_id", "name", "phone", "email", "street", "city", "state", "zip_code"],
+    "products": ["product_id", "product_name", "brand_id", "category_id", "model_year", "list_price"],
+    "staffs": ["staff_id", "first_name", "last_name", "email", "phone", "active", "store_id", "manager_id"],
+    "stocks": ["store_id", "product_id", "quantity"],
+    "customers": ["customer_id", "first_name", "last_name", "phone", "email", "street", "city", "state", "zip_code"],
+    "orders": ["order_id", "customer_id", "order_status", "order_date", "required_date", "shipped_date", "store_id", "staff_id"],
+    "order_items": ["order_id", "item_id", "product_id", "quantity", "list_price", "discount"]
+}
+
+# (SQLite limits the number of parameters of a statement, multi-row INSERTs above it are split up)
+SQLITE_MAX_PARAMETERS = 32000
+
+# the value reported for @@max_allowed_packet (the MySQL 8 default)
+MAX_ALLOWED_PACKET = 64 * 1024 * 1024
+
+# values sqlite3 can't bind by itself
+sqlite3.register_adapter(pd.Timestamp, lambda value: value.strftime("%Y-%m-%d"))
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.int32, int)
+sqlite3.register_adapter(np.int8, int)
+sqlite3.register_adapter(np.float64, float)
+
+
+class StandInCursor:
+    """
+    mysql.connector style cursor on top of an sqlite3 cursor
+    """
+
+    def __init__(self, connection, dictionary=False):
+        self._cursor = connection.cursor()
+        self.dictionary = dictionary
+        self.column_names = ()
+        self._rows = None
+
+    def execute(self, query, params=()):
+        params = tuple(params or ())
+        self._rows = None
+
+        if query.startswith(("SET ", "LOCK TABLES", "UNLOCK TABLES", "START TRANSACTION")):
+            # (an in-memory database has a single connection, so it's always consistent)
+            return
+        if query.startswith("SELECT @@max_allowed_packet"):
+            self._rows = [(MAX_ALLOWED_PACKET,)]
+            return
+        if query.startswith("CHECKSUM TABLE"):
+            # (a CRC of all the rows of the table, like MySQL's live checksum)
+            table_name = query.split()[2]
+            rows = self._cursor.execute(f"SELECT * FROM {table_name}").fetchall()
+            self._rows = [(table_name, zlib.crc32(repr(rows).encode()))]
+            return
+        if query.startswith("LOAD DATA"):
+            raise mysql.connector.Error("LOAD DATA LOCAL INFILE is not supported by the SQLite stand-in", errno=1148)
+
+        query = self._translate(query)
+
+        # a multi-row INSERT with too many parameters is sent as several smaller INSERTs
+        if query.startswith("INSERT") and len(params) > SQLITE_MAX_PARAMETERS:
+            self._execute_split(query, params)
+            return
+
+        self._cursor.execute(query, params)
+        if self._cursor.description:
+            self.column_names = tuple(column[0] for column in self._cursor.description)
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(self._translate(query), [tuple(params) for params in seq_params])
+
+    def fetchall(self):
+        rows = self._rows if self._rows is not None else self._cursor.fetchall()
+        self._rows = None
+        return [self._as_row(row) for row in rows]
+
+    def fetchmany(self, size):
+        return [self._as_row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchone(self):
+        rows = self.fetchall()
+        return rows[0] if rows else None
+
+    def close(self):
+        self._cursor.close()
+
+    def _as_row(self, row):
+        return dict(zip(self.column_names, row)) if self.dictionary else row
+
+    def _translate(self, query):
+        # MySQL -> SQLite: %s parameters become ?, and ON DUPLICATE KEY UPDATE col = VALUES(col) an ON CONFLICT upsert
+        query = query.replace("%s", "?")
+        match = re.search(r" ON DUPLICATE KEY UPDATE (.*)$", query, flags=re.S)
+        if match:
+            table_name = re.match(r"INSERT INTO (\w+)", query).group(1)
+            updates = re.sub(r"VALUES\((\w+)\)", r"excluded.\1", match.group(1))
+            query = (query[:match.start()] + f" ON CONFLICT ({', '.join(PRIMARY_KEYS[table_name])}) DO UPDATE SET {updates}")
+        return query
+
+    def _execute_split(self, query, params):
+        # splits "INSERT ... VALUES (?, ?), (?, ?), ... [ON CONFLICT ...]" into statements with fewer rows
+        head, rest = query.split(" VALUES ", 1)
+        row_placeholders = rest[:rest.index(")") + 1]
+        tail = rest[rest.index(" ON CONFLICT"):] if " ON CONFLICT" in rest else ""
+        row_width = row_placeholders.count("?")
+        rows_per_statement = SQLITE_MAX_PARAMETERS // row_width
+
+        for start in range(0, len(params), rows_per_statement * row_width):
+            batch = params[start:start + rows_per_statement * row_width]
+            statement = f"{head} VALUES " + ", ".join([row_placeholders] * (len(batch) // row_width)) + tail
+            self._cursor.execute(statement, batch)
+
+
+class StandInConnection:
+    """
+    mysql.connector style connection on top of an sqlite3 connection
+    """
+
+    unread_result = False
+
+    def __init__(self, path=":memory:"):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, dictionary=False, buffered=True):
+        return StandInCursor(self._connection, dictionary=dictionary)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def consume_results(self):
+        pass
+
+    def close(self):
+        self._connection.close()
+
+
+def create_source_database(dataset, tables=("brands", "categories", "products", "stocks")):
+    """
+    Creates an in-memory stand-in for ProductDB with the given tables of a generated data set
+    """
+
+    connection = StandInConnection()
+    for table_name in tables:
+        dataset[table_name].to_sql(table_name, connection._connection, index=False)
+    return connection
+
+
+def create_target_database():
+    """
+    Creates an in-memory stand-in for BikeCorpDB, with the tables of TARGET_COLUMNS (and their primary keys and row_hash)
+    """
+
+    connection = StandInConnection()
+    for table_name, columns in TARGET_COLUMNS.items():
+        connection._connection.execute(
+            f"CREATE TABLE {table_name} ({', '.join(columns)}, row_hash INTEGER, "
+            f"PRIMARY KEY ({', '.join(PRIMARY_KEYS[table_name])}))"
+        )
+    return connection
+
+
+class StandInExtractor(Extractor):
+    """
+    Extractor reading ProductDB from a stand-in connection, and the API from an in-process client (e.g TestClient(run_api.app))
+    """
+
+    def __init__(self, source_connection, api_client, **kwargs):
+        super().__init__(**kwargs)
+        self.session.close()
+        self.session = api_client
+        self.source_connection = source_connection
+
+    def connect_to_productDB(self):
+        return nullcontext(self.source_connection)
+
+
+class StandInLoader(Loader):
+    """
+    Loader writing to a stand-in connection instead of the BikeCorpDB pool
+    """
+
+    def __init__(self, target_connection, **kwargs):
+        super().__init__(**kwargs)
+        self.target_connection = target_connection
+
+    def connect_to_db(self):
+        return nullcontext(self.target_connection)
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import pandas as pd
+
+try:
+    # the checkpoints are Parquet files, which pandas writes and reads with pyarrow, without it nothing is checkpointed
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+
+def make_fingerprint(*parts):
+    """
+    Returns a short hash of the given parts (anything JSON serialisable, e.g the mtime and size of a file)
+    """
+
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class CheckpointStore:
+    """
+    Class that keeps the output of the stages of each table (the extracted and the transformed frames) in a local
+    Parquet cache, so a run that failed part way can be resumed without redoing the stages that were completed
+
+    Every checkpoint is keyed by table, stage and a fingerprint of the table's source (e.g file mtime/size, DB checksum,
+    API ETag), so a checkpoint is only used as long as its source hasn't changed. A checkpoint is a directory of
+    Parquet files (one per chunk), and each table has a small manifest (<table>.json) with its fingerprint and the
+    stages that were completed. The "load" stage has no output, it is only recorded in the manifest.
+    """
+
+    def __init__(self, directory="checkpoints"):
+        """
+        Arguments:
+            directory: directory the checkpoints are kept in (created if it doesn't exist), None to not checkpoint anything
+        """
+
+        self.directory = directory
+        # the manifest of a table is read, changed and written back by the threads of its stages (in pipelined runs
+        # the extract and transform checkpoints are written at the same time), so each table has a lock for it
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self.enabled = directory is not None and pyarrow is not None
+        if directory is not None and pyarrow is None:
+            logger.warning("pyarrow is not installed, so no checkpoints are written")
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    def completed(self, table_name, stage, fingerprint):
+        """
+        Returns True if the stage of the table was completed for the given fingerprint (and its output can be used)
+        """
+
+        if not self.enabled or fingerprint is None:
+            return False
+        manifest = self._read_manifest(table_name)
+        return manifest["fingerprint"] == fingerprint and stage in manifest["stages"]
+
+    def mark_completed(self, table_name, stage, fingerprint):
+        """
+        Records a stage of the table as completed for the given fingerprint
+        (the checkpoints of an older fingerprint of the table are removed)
+        """
+
+        if not self.enabled or fingerprint is None:
+            return
+        with self._table_lock(table_name):
+            manifest = self._start(table_name, fingerprint)
+            if stage not in manifest["stages"]:
+                manifest["stages"].append(stage)
+            self._write_manifest(table_name, manifest)
+
+    def save(self, df, table_name, stage, fingerprint):
+        """
+        Checkpoints the output of a stage (a DataFrame) and marks the stage as completed
+
+        Empty frames aren't checkpointed (the Extractor returns an empty frame when an extraction fails).
+        A frame that can't be written (e.g an object column with mixed types) is only logged, the run goes on without it.
+        """
+
+        if not self.enabled or fingerprint is None or df.empty:
+            return
+        path = self._prepare(table_name, stage, fingerprint)
+
+        if self._write_part(df, path, 0):
+            self.mark_completed(table_name, stage, fingerprint)
+
+    def save_chunks(self, chunks, table_name, stage, fingerprint):
+        """
+        Checkpoints a stream of chunks as they pass through (e.g the transformed chunks on their way to the loader)
+
+        The stage is marked as completed once the last chunk has passed, so a stream that was cut short is never used.
+
+        Yields the chunks
+        """
+
+        if not self.enabled or fingerprint is None:
+            yield from chunks
+            return
+
+        path = self._prepare(table_name, stage, fingerprint)
+
+        written = True
+        for i, chunk in enumerate(chunks):
+            written = written and self._write_part(chunk, path, i)
+            yield chunk
+
+        if written:
+            self.mark_completed(table_name, stage, fingerprint)
+
+    def load(self, table_name, stage, fingerprint, columns=None):
+        """
+        Reads the checkpointed output of a stage
+
+        Arguments:
+            table_name, stage, fingerprint: the checkpoint
+            columns: only read these columns (e.g the key column, to rebuild reference data)
+
+        Returns:
+                the DataFrame, or None if there's no completed checkpoint for the fingerprint
+        """
+
+        if not self.completed(table_name, stage, fingerprint):
+            return None
+        return pd.concat(self.load_chunks(table_name, stage, fingerprint, columns), ignore_index=True)
+
+    def load_chunks(self, table_name, stage, fingerprint, columns=None):
+        """
+        Reads the checkpointed output of a stage chunk by chunk, as it was written (see load)
+
+        Yields DataFrames
+        """
+
+        path = self._checkpoint_path(table_name, stage)
+        for part in sorted(os.listdir(path)):
+            yield pd.read_parquet(os.path.join(path, part), columns=columns)
+
+    def _write_part(self, df, path, number):
+        # writes one chunk of a checkpoint, returns False if it couldn't be written
+        try:
+            df.to_parquet(os.path.join(path, f"part-{number:05d}.parquet"), index=False)
+            return True
+        except (pyarrow.ArrowException, ValueError, TypeError) as e:
+            logger.warning(f"Could not checkpoint {os.path.basename(path)}: {e}")
+            return False
+
+    def _table_lock(self, table_name):
+        # the lock of a table's manifest (reentrant, since _start is also called with it held)
+        with self._locks_lock:
+            return self._locks.setdefault(table_name, threading.RLock())
+
+    def _start(self, table_name, fingerprint):
+        # the manifest of the table for the fingerprint, a new fingerprint (=the source changed) discards the old checkpoints
+        with self._table_lock(table_name):
+            manifest = self._read_manifest(table_name)
+            if manifest["fingerprint"] != fingerprint:
+                for stage in manifest["stages"]:
+                    shutil.rmtree(self._checkpoint_path(table_name, stage), ignore_errors=True)
+                manifest = {"fingerprint": fingerprint, "stages": []}
+                self._write_manifest(table_name, manifest)
+            return manifest
+
+    def _prepare(self, table_name, stage, fingerprint):
+        # empties the checkpoint directory of a stage before it's (re)written, the stage isn't completed until it's written
+        with self._table_lock(table_name):
+            manifest = self._start(table_name, fingerprint)
+            if stage in manifest["stages"]:
+                manifest["stages"].remove(stage)
+                self._write_manifest(table_name, manifest)
+
+        path = self._checkpoint_path(table_name, stage)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return path
+
+    def _checkpoint_path(self, table_name, stage):
+        return os.path.join(self.directory, f"{table_name}.{stage}")
+
+    def _manifest_path(self, table_name):
+        return os.path.join(self.directory, f"{table_name}.json")
+
+    def _read_manifest(self, table_name):
+        if os.path.exists(self._manifest_path(table_name)):
+            with open(self._manifest_path(table_name)) as f:
+                return json.load(f)
+        return {"fingerprint": None, "stages": []}
+
+    def _write_manifest(self, table_name, manifest):
+        # writing to a temporary file first, so a crash can't leave a half written manifest behind
+        # (called with the table's lock held, see _table_lock, so the threads of a table don't share the temporary file)
+        temp_path = f"{self._manifest_path(table_name)}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(temp_path, self._manifest_path(table_name))
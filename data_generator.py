@@ -0,0 +1,111 @@
+import argparse
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# tables of the sample data in data/, in the layout of the sources (csv files, ProductDB tables, API endpoints)
+SOURCE_TABLES = ["brands", "categories", "stores", "staffs", "products", "stocks", "customers", "orders", "order_items"]
+
+# the tables that grow with the scale factor, and their key columns that are shifted for every copy
+# (brands, categories, stores and staffs stay as they are, other tables refer to stores and staffs by name)
+SCALED_KEYS = {
+    "products": ["product_id"],
+    "stocks": ["product_id"],
+    "customers": ["customer_id"],
+    "orders": ["order_id", "customer_id"],
+    "order_items": ["order_id", "product_id"]
+}
+
+
+def load_sample_data(data_dir="data"):
+    """
+    Reads the sample data (the csv files in data/)
+
+    Returns:
+            dict with a DataFrame for each table in SOURCE_TABLES
+    """
+
+    return {table_name: pd.read_csv(os.path.join(data_dir, f"{table_name}.csv")) for table_name in SOURCE_TABLES}
+
+
+def _key_stride(sample, key_column):
+    # every copy of the data shifts a key by a multiple of the stride, which is a power of 10 above every value of the key
+    # in any table (including invalid references), so the keys of two copies never collide and invalid keys stay invalid
+    max_value = max(int(df[key_column].max()) for df in sample.values() if key_column in df.columns)
+    return 10 ** len(str(max_value))
+
+
+def generate_dataset(scale=1, data_dir="data", tables=None):
+    """
+    Generates a consistent BikeCorp data set of (about) scale times the size of the sample data
+
+    The sample tables that grow are repeated scale times, with the keys of every copy shifted past the keys
+    of the previous copies, so e.g the orders of copy 3 belong to the customers of copy 3 and the order items
+    of copy 3 to those orders and to the products of copy 3. The quirks of the sample data (invalid references,
+    unparseable dates, missing values) are repeated in every copy, so the transformations have the same work to do.
+
+    Arguments:
+        scale: scale factor (1 gives the sample data itself, e.g 1000 gives ~4.7 million order items)
+        data_dir: directory with the sample csv files
+        tables: optional list of the tables to generate (e.g only the ProductDB tables), None generates all of them.
+                The keys are shifted the same way either way, so tables generated separately still fit together
+
+    Returns:
+            dict with a DataFrame for each table in SOURCE_TABLES (or in tables), in the layout of the sample csv files
+    """
+
+    if scale < 1:
+        raise ValueError("The scale factor has to be at least 1")
+
+    sample = load_sample_data(data_dir)
+    strides = {key_column: _key_stride(sample, key_column)
+               for key_columns in SCALED_KEYS.values() for key_column in key_columns}
+
+    dataset = {}
+    for table_name, df in sample.items():
+        if tables is not None and table_name not in tables:
+            continue
+        if table_name not in SCALED_KEYS or scale == 1:
+            dataset[table_name] = df
+            continue
+
+        # the copy number of every row of the scaled table (0 for the rows of the first copy, and so on)
+        copy_numbers = np.repeat(np.arange(scale, dtype="int64"), len(df))
+        scaled_df = pd.concat([df] * scale, ignore_index=True)
+
+        for key_column in SCALED_KEYS[table_name]:
+            scaled_df[key_column] = scaled_df[key_column] + copy_numbers * strides[key_column]
+
+        dataset[table_name] = scaled_df
+
+    return dataset
+
+
+def write_dataset(dataset, output_dir):
+    """
+    Writes a generated data set as csv files (one per table, same names and layout as data/)
+
+    Arguments:
+        dataset: dict of DataFrames from generate_dataset
+        output_dir: directory the csv files are written to (created if it doesn't exist)
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    for table_name, df in dataset.items():
+        # missing values are written as NULL, like in the sample files
+        df.to_csv(os.path.join(output_dir, f"{table_name}.csv"), index=False, na_rep="NULL")
+        logger.info(f"Wrote {len(df)} rows to {os.path.join(output_dir, f'{table_name}.csv')}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates a scaled up copy of the BikeCorp sample data")
+    parser.add_argument("--scale", type=int, default=10, help="scale factor (e.g 10 gives 10 times the sample data)")
+    parser.add_argument("--output", default=os.path.join("data", "generated"), help="directory for the csv files")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    write_dataset(generate_dataset(args.scale), args.output)
@@ -0,0 +1,131 @@
+import logging
+import json
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from mysql.connector import pooling
+
+logger = logging.getLogger(__name__)
+
+
+# number of connections kept open per database (mysql-connector allows at most 32 per pool)
+DEFAULT_POOL_SIZE = 8
+
+# extra connection options per database
+# BikeCorpDB needs local infile enabled for the LOAD DATA LOCAL INFILE bulk load in the Loader
+CONNECTION_OPTIONS = {
+    "BikeCorpDB": {"allow_local_infile": True}
+}
+
+_pools = {}
+_pool_slots = {}
+_pools_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def load_credentials(path="cred_info.json"):
+    """
+    Reads the database credentials (host, user, password) from cred_info.json
+
+    The file is only read and parsed the first time, after that the cached credentials are returned
+
+    Returns:
+            dict with the credentials
+    """
+
+    with open(path) as f:
+        json_content = json.load(f)
+
+    return {
+        "host": json_content["host"],
+        "user": json_content["user"],
+        "password": json_content["password"]
+    }
+
+
+def get_pool(database, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Returns the shared connection pool of a database, creating it the first time
+
+    Arguments:
+        database: name of the database (e.g ProductDB, BikeCorpDB)
+        pool_size: number of connections in the pool, only used when the pool is created
+
+    Returns:
+            a mysql.connector MySQLConnectionPool
+    """
+
+    with _pools_lock:
+        if database not in _pools:
+            _pools[database] = pooling.MySQLConnectionPool(
+                pool_name=f"{database}_pool",
+                pool_size=pool_size,
+                # no session reset (a round-trip) every time a connection goes back to the pool: the session
+                # settings changed by the ETL are set back by whoever changed them (see Loader._set_session,
+                # and the snapshot transactions of Extractor._extract_db_ranges)
+                pool_reset_session=False,
+                database=database,
+                **load_credentials(),
+                **CONNECTION_OPTIONS.get(database, {})
+            )
+            # mysql-connector raises an error when the pool is empty, so a semaphore makes callers wait for a free connection instead
+            _pool_slots[database] = threading.BoundedSemaphore(pool_size)
+            logger.info(f"Created connection pool for {database} with {pool_size} connections")
+
+        return _pools[database]
+
+
+@contextmanager
+def pooled_connection(database):
+    """
+    Checks a connection to a database out of its shared pool, and returns it to the pool afterwards
+
+    Usage:
+        with pooled_connection("ProductDB") as connection:
+            cursor = connection.cursor()
+            ...
+
+    Waits if every connection in the pool is in use.
+    """
+
+    pool = get_pool(database)
+    slots = _pool_slots[database]
+
+    slots.acquire()
+    try:
+        connection = pool.get_connection()
+        try:
+            yield connection
+        finally:
+            # closing a pooled connection hands it back to the pool, it stays open
+            connection.close()
+    finally:
+        slots.release()
+
+
+def close_pools():
+    """
+    Closes all the connections in every pool (e.g at the end of the ETL process)
+    """
+
+    with _pools_lock:
+        for database, pool in _pools.items():
+            slots = _pool_slots[database]
+            # taking every slot waits for the connections still in use to be handed back to the pool
+            for _ in range(pool.pool_size):
+                slots.acquire()
+            try:
+                # the pool is emptied one connection at a time and each one is disconnected,
+                # instead of closed (which would only hand it back to the pool)
+                while True:
+                    try:
+                        connection = pool.get_connection()
+                    except pooling.PoolError:
+                        break
+                    connection.disconnect()
+            finally:
+                for _ in range(pool.pool_size):
+                    slots.release()
+            logger.info(f"Closed connection pool for {database}")
+        _pools.clear()
+        _pool_slots.clear()
@@ -1,9 +1,78 @@
+import logging
+import re
+import threading
 import mysql.connector
 import pandas as pd
+from db_connection import pooled_connection, DEFAULT_POOL_SIZE
+from checkpoint import make_fingerprint
+from pipeline import merged
 import os
 import json
 import requests #used for making HTTP reuqests to the API
+from requests.adapters import HTTPAdapter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 
+try:
+    # pyarrow is needed to read the binary (Arrow IPC/Parquet) API responses, JSON works without it
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+
+# media types that can be asked for from the API with the Accept header
+API_MEDIA_TYPES = {
+    "json": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+
+# schema hints of the csv sources, by file name: the columns that are read and their dtypes
+# with them pandas doesn't have to infer the type of every column, and columns the ETL doesn't use (e.g the street
+# of staffs, which is dropped by the transformation) aren't parsed at all. A file that doesn't match its hints
+# is read with type inference instead
+CSV_SCHEMAS = {
+    "stores.csv": {"name": "object", "phone": "object", "email": "object", "street": "object", "city": "object",
+                   "state": "object", "zip_code": "int64"},
+    "staffs.csv": {"name": "object", "last_name": "object", "email": "object", "phone": "object", "active": "int64",
+                   "store_name": "object", "manager_id": "float64"},
+    "customers.csv": {"customer_id": "int64", "first_name": "object", "last_name": "object", "phone": "object",
+                      "email": "object", "street": "object", "city": "object", "state": "object", "zip_code": "int64"},
+    "orders.csv": {"order_id": "int64", "customer_id": "int64", "order_status": "int64", "order_date": "object",
+                   "required_date": "object", "shipped_date": "object", "store": "object", "staff_name": "object"},
+    "order_items.csv": {"order_id": "int64", "item_id": "int64", "product_id": "int64", "quantity": "int64",
+                        "list_price": "float64", "discount": "float64"}
+}
+
+# the strings that mean a missing value in the csv files (NULL, as written by MySQL, or an empty field)
+CSV_NA_VALUES = ["NULL", ""]
+
+
+# table and column names are put in the SQL of the db extraction as they are (only values can be bound as parameters),
+# so only plain identifiers are accepted
+SQL_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# comparison operators a filter can use, e.g {"model_year": (">=", 2018)}
+FILTER_OPERATORS = {"=", "!=", "<", "<=", ">", ">="}
+
+# integer key column of the ProductDB tables that can be read in key ranges over several connections at once
+# (see Extractor._extract_db_ranges). stocks has no primary key, product_id is the indexed column of its foreign key
+DB_SPLIT_KEYS = {
+    "products": "product_id",
+    "stocks": "product_id"
+}
+
+# max number of connections a table can be read over (one connection of the pool is needed to coordinate the snapshot)
+MAX_DB_CONNECTIONS = DEFAULT_POOL_SIZE - 1
+
+# a split read checks out all its connections while holding this lock, so two split reads at the same time can't
+# each get part of the pool and then wait on each other for the rest
+_split_checkout_lock = threading.Lock()
 
 
 class Extractor:
@@ -17,14 +86,37 @@ class Extractor:
     """
     
     
-    def __init__(self): 
+    def __init__(self, csv_engine="c", csv_cache=None, db_connections=1): 
         """ 
         Initialization of the Extractor object
         
-    
+        Arguments:
+            csv_engine: parser for the csv files, "c" (pandas' own parser) or "pyarrow" (Arrow's multithreaded reader)
+            csv_cache: optional checkpoint.CheckpointStore the parsed csv files are cached in (as Parquet), a file is then
+                       only parsed again once its mtime or size has changed
+            db_connections: number of connections the tables of DB_SPLIT_KEYS are read over at once, each reading a
+                            key range of the same snapshot (see _extract_db_ranges). 1 reads every table over one connection
         """        
 
-        self.connection = None
+        if csv_engine == "pyarrow" and pa is None:
+            logger.warning("pyarrow is not installed -> reading the csv files with the C parser instead")
+            csv_engine = "c"
+        self.csv_engine = csv_engine
+        self.csv_cache = csv_cache
+        if not 1 <= db_connections <= MAX_DB_CONNECTIONS:
+            raise ValueError(f"db_connections has to be between 1 and {MAX_DB_CONNECTIONS} (the pool has {DEFAULT_POOL_SIZE} "
+                             f"connections, one of them coordinates the snapshot), got {db_connections}")
+        self.db_connections = db_connections
+
+        # a session keeps the HTTP connections to the API alive between requests (instead of reconnecting every time)
+        # the pool is sized so concurrent page requests can each have their own connection
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # number of bytes read from the API and csv files (for the run metrics, see metrics.py)
+        self.bytes_received = 0
 
             
     ######## CSV ###############       
@@ -42,92 +134,319 @@ class Extractor:
 
         try:
             
-            print(f"\nExtracting data from {file_path}..")
+            logger.debug(f"Extracting data from {file_path}..")
 
             # checking if the file exists
             if not os.path.exists(file_path):
-                print(f"Error: File {file_path} not found")
+                logger.error(f"Error: File {file_path} not found")
                 return pd.DataFrame()
             
 
+            # files that haven't changed since they were last parsed are read from the csv cache
+            schema = CSV_SCHEMAS.get(os.path.basename(file_path))
+            cache_key = os.path.splitext(os.path.basename(file_path))[0]
+            fingerprint = None
+            if self.csv_cache is not None and self.csv_cache.enabled:
+                fingerprint = make_fingerprint(os.path.abspath(file_path), self.fingerprint_csv(file_path), schema, self.csv_engine)
+                df = self.csv_cache.load(cache_key, "csv", fingerprint)
+                if df is not None:
+                    logger.info(f"Read {len(df)} rows of {file_path} from the csv cache (the file hasn't changed)")
+                    return df
+
             #next we read the CSV file into a pandas df
-            # pandas should automatically detect headers and data types from the CSV
-            df = pd.read_csv(file_path)
-            print(f"Extracted {len(df)} rows of data from {file_path}")
+            df = self._read_csv(file_path, schema)
+            self.bytes_received += os.path.getsize(file_path)
+            if fingerprint is not None:
+                self.csv_cache.save(df, cache_key, "csv", fingerprint)
+            logger.info(f"Extracted {len(df)} rows of data from {file_path}")
             return df
                 
         except Exception as e:
-                print(f"Sorry, error when attempting to extract data from {file_path}: {e}")
+                logger.error(f"Sorry, error when attempting to extract data from {file_path}: {e}")
                 return pd.DataFrame()
             
         
       
     
+    def _read_csv(self, file_path, schema=None):
+        # parses a csv file, with its schema hints (columns and dtypes) if it has any
+        # the pyarrow engine reads the file with several threads, the C parser with one
+        if schema is not None:
+            try:
+                return pd.read_csv(file_path, usecols=list(schema), dtype=schema, na_values=CSV_NA_VALUES,
+                                   keep_default_na=False, engine=self.csv_engine)
+            except (ValueError, TypeError) as e:
+                logger.warning(f"{file_path} doesn't match its schema hints ({e}) -> reading it with type inference")
+        
+        # without hints pandas infers the type of every column (and treats NULL, NA, n/a etc. as missing values)
+        return pd.read_csv(file_path, engine=self.csv_engine)
+    
     ######### source database ###################
     
     
     def connect_to_productDB(self):
         """
-        method which attempts to make a connection to the mySQL server
-        mysql.connector.connect() establishes the connection with the credidentials passed in
-        returns a connection object
+        method which checks a connection to the ProductDB mySQL database out of the shared connection pool (see db_connection.py)
+        
+        returns a context manager giving a connection object, which goes back to the pool when the with block ends:
+            with self.connect_to_productDB() as connection:
+                ...
         """
 
-        with open("cred_info.json") as f:
-            content = f.read()
-            json_content = json.loads(content)
-            #connect to the MySQL server 
-            self.connection = mysql.connector.connect(
-                host = json_content["host"],
-                user = json_content["user"],
-                password = json_content["password"],
-                database= "ProductDB"
-                )
-        
-        return self.connection
+        return pooled_connection("ProductDB")
     
-    def extract_from_db(self, table_name):
+    def extract_from_db(self, table_name, since=None, key_column=None, columns=None, filters=None):
         """
         Function which extracts data from a (to be)specified table in the source database (here: ProductDB)
         
         Arguments:
             table_name: Name of the table from which to extract data (e.g brands, staffs, stocks)
+            since: if set (together with key_column), only rows where key_column > since are extracted (incremental extraction)
+            key_column: column the since watermark is compared with (e.g product_id)
+            columns: optional list of the columns to extract (e.g Transformer.required_columns), None extracts them all
+            filters: optional dict of column -> condition, only the rows matching all of them are extracted.
+                     A condition is a value (column = value), a list of values (column IN values) or an
+                     (operator, value) tuple, e.g {"brand_id": [1, 2], "model_year": (">=", 2018)}.
+                     The values are bound as parameters of the query
 
         Returns a DataFrame containing the extracte data
         """
 
-        print("\nExtracting data from ProductDB")
+        logger.debug("Extracting data from ProductDB")
 
         #connect to the source database, ProductDB
         try:
-            if self.connection is None or not self.connection.is_connected():
-                self.connect_to_productDB()
+            if self._split_reads(table_name):
+                # the key ranges are read over several connections at once, and put together
+                chunks = list(self._extract_db_ranges(table_name, 50000, since, key_column, columns, filters))
+                return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+            
+            with self.connect_to_productDB() as connection:
                 
-            #creates cursor, here dictionary=true return the results as a dict which is easier to work with 
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(f"SELECT * FROM {table_name}") # grabs all with *
-            results = cursor.fetchall() # fetchall method retrieves all the rows in the result set of a query  
+                #creates cursor, here dictionary=true return the results as a dict which is easier to work with 
+                cursor = connection.cursor(dictionary=True)
+                query, params = self._select_query(table_name, since, key_column, columns, filters)
+                cursor.execute(query, params) # grabs the columns (all with *) of the rows matching the filters
+                results = cursor.fetchall() # fetchall method retrieves all the rows in the result set of a query  
+                cursor.close()
             
             if not results:
-                print(f"No data found in {table_name} table...")   
-                cursor.close()
+                logger.debug(f"No data found in {table_name} table...")   
                 return pd.DataFrame()
         
             df = pd.DataFrame(results) # table data goes into a df
-            print(f"Extracted {len(df)} rows of records from {table_name} table")
-            
-            # closing cursor but keeping connection open for now
-            cursor.close()
+            logger.info(f"Extracted {len(df)} rows of records from {table_name} table")
             return df
             
         # error handling in case connection or extraction fails
         except mysql.connector.Error as e:
-            print(f"Oh no, error when attempting to extarct data from {table_name}: {e}")        
+            logger.error(f"Oh no, error when attempting to extarct data from {table_name}: {e}")
             return pd.DataFrame()
+
+    def extract_from_db_chunks(self, table_name, chunk_size=50000, since=None, key_column=None, columns=None, filters=None):
+        """
+        Streaming version of extract_from_db for large tables
+
+        Instead of fetching the whole table into memory at once, the rows are read through an
+        unbuffered cursor (the rows stay on the server until they're fetched) and yielded as
+        DataFrames of at most chunk_size rows. Memory use is then bounded by the chunk size
+        rather than by the size of the table.
+
+        Arguments:
+            table_name: Name of the table from which to extract data
+            chunk_size: max number of rows in each yielded DataFrame
+            since, key_column: only extract rows newer than a watermark (see extract_from_db)
+            columns, filters: only extract these columns, of the rows matching the filters (see extract_from_db)
+
+        Yields DataFrames containing consecutive chunks of the table
+        """
+
+        logger.debug(f"Streaming data from {table_name} table in ProductDB in chunks of {chunk_size} rows")
+
+        if self._split_reads(table_name):
+            yield from self._extract_db_ranges(table_name, chunk_size, since, key_column, columns, filters)
+            return
+
+        # the connection is kept out of the pool until every chunk has been read
+        with self.connect_to_productDB() as connection:
+            query, params = self._select_query(table_name, since, key_column, columns, filters)
+            total_rows = 0
+            for chunk in self._read_chunks(connection, query, params, chunk_size):
+                total_rows += len(chunk)
+                yield chunk
+            logger.info(f"Extracted {total_rows} rows of records from {table_name} table")
+
+    def _read_chunks(self, connection, query, params, chunk_size):
+        # runs a query and yields its rows as DataFrames of at most chunk_size rows
+
+        # buffered=False -> rows are fetched from the server as we go, not all at once
+        # a plain (tuple) cursor is used since tuples take up far less memory than dicts
+        cursor = connection.cursor(buffered=False)
+
+        try:
+            cursor.execute(query, params)
+            columns = cursor.column_names
+
+            while True:
+                rows = cursor.fetchmany(chunk_size) # fetchmany retrieves the next (up to) chunk_size rows
+                if not rows:
+                    break
+                yield pd.DataFrame.from_records(rows, columns=columns)
+
+        finally:
+            # if the consumer stops early, the unread rows must be consumed before the connection goes back to the pool
+            if connection.unread_result:
+                connection.consume_results()
+            cursor.close()
+
+    def _split_reads(self, table_name):
+        # True if the table is read in key ranges over several connections
+        return self.db_connections > 1 and table_name in DB_SPLIT_KEYS
+
+    def _extract_db_ranges(self, table_name, chunk_size, since=None, key_column=None, columns=None, filters=None):
+        """
+        Reads a table in key ranges (of DB_SPLIT_KEYS) over several connections at once, which together give a
+        point-in-time copy of the table
+
+        Every connection starts a transaction WITH CONSISTENT SNAPSHOT while another connection holds a read lock
+        on the table, so all of them read the table as it was at the same moment (InnoDB keeps that version of the
+        rows for them), whatever is written to it afterwards. The lock is only held while the snapshots are taken.
+        If the table can't be locked (e.g missing LOCK TABLES privilege), the snapshots are taken without it, a few
+        milliseconds apart, and a warning is logged.
+
+        The range boundaries are spread evenly between the MIN and MAX of the key (of the rows matching the filters),
+        the rows with a NULL key are read with the first range.
+
+        Arguments:
+            table_name, since, key_column, columns, filters: see extract_from_db
+            chunk_size: max number of rows in each yielded DataFrame
+
+        Yields DataFrames of at most chunk_size rows, in the order they are read (the ranges are interleaved)
+        """
+
+        split_key = DB_SPLIT_KEYS[table_name]
+
+        with ExitStack() as stack:
+            # every connection is checked out before the table is locked, so it isn't locked while waiting on the pool
+            with _split_checkout_lock:
+                coordinator = stack.enter_context(self.connect_to_productDB())
+                connections = [stack.enter_context(self.connect_to_productDB()) for _ in range(self.db_connections)]
+            # the read only transactions are ended before the connections go back to the pool (the pool doesn't reset them)
+            for connection in connections:
+                stack.callback(connection.rollback)
+
+            cursor = coordinator.cursor()
+            locked = self._lock_for_snapshot(cursor, table_name)
+            try:
+                where, params, _ = self._where_clause(table_name, since, key_column, filters)
+                cursor.execute(f"SELECT MIN({split_key}), MAX({split_key}) FROM {table_name}{where}", params)
+                low, high = cursor.fetchone()
+
+                for connection in connections:
+                    snapshot_cursor = connection.cursor()
+                    snapshot_cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+                    snapshot_cursor.close()
+            finally:
+                if locked:
+                    cursor.execute("UNLOCK TABLES")
+                cursor.close()
+
+            # (with no rows, or only rows with a NULL key, the whole table is a single range)
+            boundaries = []
+            if low is not None:
+                boundaries = sorted({int(low) + (int(high) - int(low) + 1) * i // len(connections)
+                                     for i in range(1, len(connections))} - {int(low)})
+            ranges = list(zip([None] + boundaries, boundaries + [None]))
+            logger.info(f"Extracting {table_name} in {len(ranges)} {split_key} ranges over {len(ranges)} connections")
+
+            streams = []
+            for connection, key_range in zip(connections, ranges):
+                query, params = self._select_query(table_name, since, key_column, columns, filters,
+                                                   key_range=(split_key, *key_range))
+                streams.append(self._read_chunks(connection, query, params, chunk_size))
+
+            total_rows = 0
+            for chunk in merged(streams, f"{table_name} extract", queue_size=len(streams)):
+                total_rows += len(chunk)
+                yield chunk
+            logger.info(f"Extracted {total_rows} rows of records from {table_name} table")
+
+    def _lock_for_snapshot(self, cursor, table_name):
+        # read locks the table (writes to it wait until it's unlocked), returns False if it couldn't be locked
+        try:
+            cursor.execute(f"LOCK TABLES {table_name} READ")
+            return True
+        except mysql.connector.Error as e:
+            logger.warning(f"Could not lock {table_name} while the snapshots of its key ranges are taken ({e}) -> "
+                           f"the ranges are read from snapshots taken a few milliseconds apart")
+            return False
+
+    def _select_query(self, table_name, since=None, key_column=None, columns=None, filters=None, key_range=None):
+        # builds the SELECT for a table: only the given columns (projection), and a WHERE with the filters (see _where_clause)
+        for column in columns or []:
+            if not SQL_IDENTIFIER.match(column):
+                raise ValueError(f"Invalid column name in the extraction of {table_name}: {column!r}")
+        
+        select_list = ", ".join(columns) if columns else "*"
+        where, params, order_by = self._where_clause(table_name, since, key_column, filters, key_range)
+        return f"SELECT {select_list} FROM {table_name}{where}{order_by}", params
+    
+    def _where_clause(self, table_name, since=None, key_column=None, filters=None, key_range=None):
+        # builds the WHERE of the filters, of the key range (column, start, end) read by one connection in split reads,
+        # and, when only rows newer than a watermark are wanted, of the key column. Every value is passed as a parameter
+        # returns the WHERE, its parameters and the ORDER BY
+        range_column = key_range[0] if key_range else None
+        for identifier in [table_name, key_column, range_column, *(filters or {})]:
+            if identifier is not None and not SQL_IDENTIFIER.match(identifier):
+                raise ValueError(f"Invalid table or column name in the extraction of {table_name}: {identifier!r}")
+        
+        conditions = []
+        params = []
+        
+        for column, condition in (filters or {}).items():
+            if isinstance(condition, (list, set, frozenset)):
+                values = list(condition)
+                if not values:
+                    raise ValueError(f"Empty list of values in the {column} filter of {table_name}")
+                conditions.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+                params.extend(values)
+            elif isinstance(condition, tuple):
+                operator, value = condition
+                if operator not in FILTER_OPERATORS:
+                    raise ValueError(f"Invalid operator in the {column} filter of {table_name}: {operator!r}")
+                conditions.append(f"{column} {operator} %s")
+                params.append(value)
+            else:
+                conditions.append(f"{column} = %s")
+                params.append(condition)
+        if filters and key_range is None:
+            logger.info(f"Extracting the {table_name} rows matching {' AND '.join(conditions)} {params}")
+        
+        if key_range is not None:
+            # a range without a start also has the rows with a NULL key
+            _, start, end = key_range
+            if start is not None:
+                conditions.append(f"{range_column} >= %s")
+                params.append(start)
+            if end is not None:
+                conditions.append(f"({range_column} < %s{f' OR {range_column} IS NULL' if start is None else ''})")
+                params.append(end)
         
+        order_by = ""
+        if since is not None and key_column is not None:
+            if key_range is None:
+                logger.info(f"Incremental extraction: only rows with {key_column} > {since}")
+            # the watermark is passed as a parameter, the key column is ordered on so chunks come in key order
+            conditions.append(f"{key_column} > %s")
+            params.append(since)
+            order_by = f" ORDER BY {key_column}"
+        
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, tuple(params), order_by
+
                
     ######### API ###########
-    def extract_from_api(self, endpoint, base_url="http://localhost:8000"):
+    def extract_from_api(self, endpoint, base_url="http://localhost:8000", data_format="json", since=None):
         """
         Extracts data from endpoints(=data sources available from the API) on a fastAPI server
         
@@ -137,12 +456,15 @@ class Extractor:
         Arguments:
                 endpoint: API endpoint (e.g customers, orders, order_items)
                 base_url: base URL address for the API
+                data_format: "json", or "arrow"/"parquet" to get a binary columnar response which is
+                        faster to parse and keeps the column types (e.g dates)
+                since: if set, only rows with a key newer than this watermark are requested (incremental extraction)
                 
         Returns:
                 pandas Dataframe containing the response data from the API
         """
         
-        print("\nBeginning process of extracting data from API")
+        logger.debug("Beginning process of extracting data from API")
 
         
         try:
@@ -151,45 +473,189 @@ class Extractor:
 
                 
             full_url = f"{base_url}/{endpoint}" #making a varible that contains the full url address for each endpoint
-            print(f"Requesting data from {full_url}...")
+            logger.debug(f"Requesting data from {full_url}...")
                             
             
             #requests.get() sends an HTTP GET request to the newly created url
             # the API server receives the request and sends back data
             # the response variable below contains everything the server sends back (data, status codes, headers)
-            response = requests.get(full_url)
-            response_text = response.text
+            params = {"since": since} if since is not None else None
+            response = self.session.get(full_url, params=params, headers=self._accept_header(data_format))
             
             # checks if the request was successful (=HTTP status code 200)
             if response.status_code == 200:
                 
-                #can then parse the response (which is in the JSON file format) into a python data structure:
-                response_text = json.loads(response_text)
-                data = json.loads(response_text)
-            
-                #then converts it to a pandas df 
-                df = pd.DataFrame(data)
-                
-                return df
+                #can then parse the response into a pandas df
+                self.bytes_received += len(response.content)
+                return self._read_api_response(response)
             
             else:
                 #error handling
-                print(f"Error when accessing {endpoint}: Status code {response.status_code}")
-                print(f"Response text: {response.text}")
+                logger.error(f"Error when accessing {endpoint}: Status code {response.status_code}")
+                logger.error(f"Response text: {response.text}")
                 return pd.DataFrame()
 
  
         except Exception as e:
-                print(f"Error when processing {endpoint}: {e}")
+                logger.error(f"Error when processing {endpoint}: {e}")
                 return pd.DataFrame()
 
+    def extract_from_api_paginated(self, endpoint, page_size=10000, max_workers=4, base_url="http://localhost:8000",
+                                   data_format="json", since=None):
+        """
+        Extracts all data from a paginated API endpoint by fetching its pages concurrently
+        
+        Arguments:
+                endpoint: API endpoint (e.g customers, orders, order_items)
+                page_size: number of rows requested per page
+                max_workers: max number of pages requested at the same time
+                base_url: base URL address for the API
+                data_format: format of the pages, "json", "arrow" or "parquet" (see extract_from_api)
+                since: only request rows newer than this watermark (see extract_from_api)
+                
+        Returns:
+                pandas Dataframe containing all pages from the API
+        """
+        
+        logger.debug(f"Extracting data from API endpoint {endpoint} in pages of {page_size} rows")
+        
+        try:
+            pages = list(self.iter_api_pages(endpoint, page_size, max_workers, base_url, data_format, since))
+        except Exception as e:
+            logger.error(f"Error when processing {endpoint}: {e}")
+            return pd.DataFrame()
+        
+        if not pages:
+            return pd.DataFrame()
+        
+        df = pd.concat(pages, ignore_index=True)
+        logger.info(f"Extracted {len(df)} rows of data from {len(pages)} pages of {endpoint}")
+        return df
+    
+    def iter_api_pages(self, endpoint, page_size=10000, max_workers=4, base_url="http://localhost:8000", data_format="json",
+                       since=None):
+        """
+        Streams a paginated API endpoint as a sequence of DataFrames (one per page), in order
+        
+        The first page tells how many rows there are in total (X-Total-Count header), after which
+        the remaining pages are requested concurrently. At most max_workers pages are requested ahead
+        of the consumer, so memory stays bounded even for very large endpoints.
+        
+        Arguments: see extract_from_api_paginated
+        
+        Yields DataFrames, one for each page
+        """
+        
+        full_url = f"{base_url}/{endpoint}"
+        headers = self._accept_header(data_format)
+        
+        def page_params(offset):
+            # the since filter is applied by the API before paginating, so the offsets are relative to the new rows
+            params = {"offset": offset, "limit": page_size}
+            if since is not None:
+                params["since"] = since
+            return params
+        
+        first_page, total_rows = self._get_api_page(full_url, page_params(0), headers)
+        yield first_page
+        
+        offsets = iter(range(page_size, total_rows, page_size))
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            # keeping a window of max_workers requests in flight and yielding the pages in order as they complete
+            in_flight = deque()
+            for offset in offsets:
+                in_flight.append(pool.submit(self._get_api_page, full_url, page_params(offset), headers))
+                if len(in_flight) >= max_workers:
+                    break
+            
+            while in_flight:
+                page, _ = in_flight.popleft().result()
+                next_offset = next(offsets, None)
+                if next_offset is not None:
+                    in_flight.append(pool.submit(self._get_api_page, full_url, page_params(next_offset), headers))
+                yield page
+    
+    def _get_api_page(self, full_url, params, headers=None):
+        # requests a single page and returns it as a df, together with the total row count from the X-Total-Count header
+        response = self.session.get(full_url, params=params, headers=headers)
+        
+        if response.status_code != 200:
+            raise RuntimeError(f"Status code {response.status_code} from {full_url} ({params}): {response.text}")
+        
+        self.bytes_received += len(response.content)
+        df = self._read_api_response(response)
+        total_rows = int(response.headers.get("X-Total-Count", len(df)))
+        return df, total_rows
+    
+    def _accept_header(self, data_format):
+        # the Accept header asking the API for the given format (JSON if the binary formats can't be read)
+        if data_format != "json" and pa is None:
+            logger.warning(f"pyarrow is not installed, so {data_format} can't be read -> requesting JSON instead")
+            data_format = "json"
+        return {"Accept": API_MEDIA_TYPES[data_format]}
+    
+    def _read_api_response(self, response):
+        """
+        Converts an API response into a DataFrame, based on the format the API answered with (Content-Type)
+        
+        Arrow and Parquet responses are read straight into columns with their types intact,
+        dates become datetime64 columns rather than Python date objects
+        """
+        
+        content_type = response.headers.get("Content-Type", "")
+        
+        if content_type.startswith(API_MEDIA_TYPES["arrow"]):
+            table = pa.ipc.open_stream(response.content).read_all()
+            return table.to_pandas(date_as_object=False)
+        
+        if content_type.startswith(API_MEDIA_TYPES["parquet"]):
+            table = pq.read_table(pa.BufferReader(response.content))
+            return table.to_pandas(date_as_object=False)
+        
+        # the API returns the JSON of the frame as a JSON string, so it has to be parsed twice
+        data = json.loads(json.loads(response.text))
+        return pd.DataFrame(data)
+
+    ######### source fingerprints ###########
+    # a fingerprint identifies the current contents of a source, so checkpoints of a table are only reused
+    # as long as its source hasn't changed (see checkpoint.py). None means the source couldn't be fingerprinted
+
+    def fingerprint_csv(self, file_path):
+        # modification time and size of the file
+        if not os.path.exists(file_path):
+            return None
+        stat = os.stat(file_path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def fingerprint_db(self, table_name):
+        # the live checksum of the table in ProductDB (CHECKSUM TABLE reads the whole table, but it's far cheaper than extracting it)
+        try:
+            with self.connect_to_productDB() as connection:
+                cursor = connection.cursor()
+                cursor.execute(f"CHECKSUM TABLE {table_name}")
+                row = cursor.fetchone()
+                cursor.close()
+            return row[1] if row else None
+        except mysql.connector.Error as e:
+            logger.warning(f"Could not checksum the {table_name} table: {e}")
+            return None
+
+    def fingerprint_api(self, endpoint, base_url="http://localhost:8000"):
+        # the ETag the API sends for the data of an endpoint (asked for with an empty page)
+        try:
+            response = self.session.get(f"{base_url}/{endpoint}", params={"limit": 0})
+            return response.headers.get("ETag") if response.status_code == 200 else None
+        except requests.RequestException as e:
+            logger.warning(f"Could not get the ETag of {endpoint}: {e}")
+            return None
+
     def close_connections(self):
         """
-        closes any open database connections if existing
+        closes the API session
+        (database connections go back to the shared pool after every extraction, see db_connection.close_pools)
         """
-        if self.connection is not None and self.connection.is_connected():
-            self.connection.close()
-            print("Connection to Database closed")
+        self.session.close()
 
 
 
@@ -1,6 +1,130 @@
+import logging
 import mysql.connector
 import pandas as pd
-import json
+import os
+import csv
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from db_connection import pooled_connection
+
+logger = logging.getLogger(__name__)
+
+
+# MySQL error numbers meaning that LOAD DATA LOCAL INFILE is disabled on the server or the client
+LOCAL_INFILE_DISABLED_ERRORS = {1148, 2068, 3948}
+
+# number of decimals of the DECIMAL columns in BikeCorpDB (see setup_target_database.py)
+DECIMAL_SCALES = {
+    "products": {"list_price": 2},
+    "order_items": {"list_price": 2, "discount": 2}
+}
+
+
+# primary key of each table in BikeCorpDB (see setup_target_database.py), used to merge rows in "merge" loads
+PRIMARY_KEYS = {
+    "brands": ["brand_id"],
+    "categories": ["category_id"],
+    "stores": ["store_id"],
+    "staffs": ["staff_id"],
+    "products": ["product_id"],
+    "stocks": ["store_id", "product_id"],
+    "customers": ["customer_id"],
+    "orders": ["order_id"],
+    "order_items": ["order_id", "item_id"]
+}
+
+
+# session settings of the target connection while a df is loaded, per tuning profile:
+# variable -> (value during the load, value it's set back to afterwards, since the connection goes back to the pool)
+SESSION_PROFILES = {
+    # foreign keys aren't checked, so tables can be loaded in any order (and at the same time)
+    "default": {"foreign_key_checks": (0, 1)},
+    # bulk loads: unique secondary indexes aren't checked either (the loaded rows must not have duplicates in them),
+    # and autocommit is off so every load (or batch) is one transaction (mysql-connector connects with autocommit off too)
+    "bulk": {"foreign_key_checks": (0, 1), "unique_checks": (0, 1), "autocommit": (0, 0)}
+}
+
+# with several load workers, dfs of at least this many rows are split into key ranges loaded over several connections at once
+PARALLEL_MIN_ROWS = 50000
+
+
+def add_row_hash(df):
+    """
+    Adds a row_hash column holding a 64 bit hash of the content of each row
+    
+    The hash is computed for all rows at once (pandas hash_pandas_object), and stored alongside the
+    data in the target database, so that a later merge load can skip the rows that haven't changed.
+    
+    Columns are normalised before hashing, so the same values give the same hash from run to run,
+    even if e.g an id column comes out as float in one run (because of a NULL) and as int in the next.
+    
+    Returns a new DataFrame with the row_hash column (signed, to fit in a MySQL BIGINT)
+    """
+    
+    data_columns = [col for col in df.columns if col != "row_hash"]
+    normalised = {}
+    
+    for col in data_columns:
+        values = df[col]
+        if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+            normalised[col] = values.astype("float64")
+        elif pd.api.types.is_datetime64_any_dtype(values):
+            normalised[col] = values.astype("datetime64[ns]")
+        else:
+            normalised[col] = values.astype(object)
+    
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(normalised, index=df.index), index=False)
+    
+    # assign returns a new df, with copy-on-write enabled (Transformer copy_free mode) the data columns aren't copied
+    return df[data_columns].assign(row_hash=hashes.to_numpy().view("int64"))
+
+
+def encode_for_infile(df, table_name):
+    """
+    Prepares a df to be written to a LOAD DATA file in the format the BikeCorpDB columns expect
+    
+    - datetime columns are written as YYYY-MM-DD (DATE columns)
+    - DECIMAL columns are rounded and written with a fixed number of decimals
+    - float columns only holding whole numbers (int columns with NULLs) are written as integers
+    - backslashes, tabs and newlines in text are escaped, so they can't break the file format
+    
+    Missing values are left as NaN/None, and written as \\N (=NULL) by to_csv
+    
+    Returns a new DataFrame with the encoded values
+    """
+    
+    encoded = {}
+    decimal_scales = DECIMAL_SCALES.get(table_name, {})
+    
+    for col in df.columns:
+        values = df[col]
+        
+        if pd.api.types.is_datetime64_any_dtype(values):
+            values = values.dt.strftime("%Y-%m-%d")
+        
+        elif col in decimal_scales:
+            scale = decimal_scales[col]
+            values = pd.to_numeric(values, errors="coerce").round(scale)
+            values = values.map(lambda x: f"{x:.{scale}f}", na_action="ignore")
+        
+        elif pd.api.types.is_float_dtype(values):
+            non_null = values.dropna()
+            if (non_null == non_null.round()).all():
+                values = values.astype("Int64")
+        
+        elif values.dtype == "object" or pd.api.types.is_string_dtype(values) or isinstance(values.dtype, pd.CategoricalDtype):
+            # (text can also come as Arrow backed strings or categoricals, see Transformer compact mode)
+            text = values.astype(object).astype(str)
+            text = text.str.replace("\\", "\\\\", regex=False).str.replace("\t", "\\t", regex=False)
+            text = text.str.replace("\n", "\\n", regex=False).str.replace("\r", "\\r", regex=False)
+            values = text.where(values.notna(), None)
+        
+        encoded[col] = values
+    
+    return pd.DataFrame(encoded, index=df.index)
 
 class Loader:
     
@@ -9,40 +133,52 @@ class Loader:
     
     """
     
-    def __init__(self, target_db="BikeCorpDB"):
+    def __init__(self, target_db="BikeCorpDB", workers=1, session_profile="default"):
         
         """
         Initialises the Loader with the target DB and conneciton
         
         Arguments: 
             target_db: Name of the target database
+            workers: number of connections a large df is loaded over at once, each loading a range of its primary key
+                     (see _load_parallel). 1 loads every df over a single connection
+            session_profile: session settings used while loading (see SESSION_PROFILES)
             
         """
         
+        if session_profile not in SESSION_PROFILES:
+            raise ValueError(f"Unknown session profile {session_profile}, choose from {sorted(SESSION_PROFILES)}")
+        
         self.target_db = target_db
-        self.connection = None 
+        self.workers = workers
+        self.session_profile = session_profile
+        self._lock = threading.Lock() # the counters below are updated by several threads in parallel loads
+        self.max_allowed_packet = None # looked up from the server the first time batches are used
+        # rows loaded successfully and bytes sent in LOAD DATA files (for the run metrics, see metrics.py)
+        self.rows_loaded = 0
+        self.bytes_sent = 0
         
     def connect_to_db(self):
-    # method for the actual connection to target db
-        
-        with open("cred_info.json") as f:
-            content = f.read()
-            json_content = json.loads(content)
-            self.connection = mysql.connector.connect(
-                host = json_content["host"],
-                user = json_content["user"],
-                password = json_content["password"],
-                database = self.target_db
-            )
-        return self.connection
+    # method which checks a connection to the target db out of the shared connection pool (see db_connection.py)
+    # used as "with self.connect_to_db() as connection:", the connection goes back to the pool after the with block
+        
+        return pooled_connection(self.target_db)
     
-    def load(self, df, table_name):
+    def load(self, df, table_name, method="insert", batch_size=None):
         """
         Method that handles loading of a dataframe into a database table
         
+        Every row is stored with a row_hash (see add_row_hash), the hash of its content.
+        
         Arguments:
                 df: pandas DataFrame to be loaded
                 table_name: Name of table for the df to be loaded into
+                method: "insert" for row INSERTs, or "merge" to upsert with INSERT ... ON DUPLICATE KEY UPDATE,
+                        skipping the rows whose row_hash shows they are unchanged in the table already,
+                        or "infile" to merge the same way but bulk load the new/changed rows with
+                        LOAD DATA LOCAL INFILE ... REPLACE (falls back to "merge" if the server doesn't allow local infile)
+                batch_size: if set, rows are inserted with multi-row INSERTs of (at most) batch_size rows,
+                        each committed on its own, instead of one big transaction
                 
         Returns:
                 Bool - True if loading was successful, False otherwise
@@ -50,57 +186,334 @@ class Loader:
         """
         
         if df.empty:
-            print(f"Attention: Empty dataframe inserted for {table_name} -> Nothing to load!!")
+            logger.warning(f"Attention: Empty dataframe inserted for {table_name} -> Nothing to load!!")
             return False
         
+        if self.workers > 1 and len(df) >= PARALLEL_MIN_ROWS:
+            return self._load_parallel(df, table_name, method, batch_size)
+        return self._load_range(df, table_name, method, batch_size)
+    
+    def _load_range(self, df, table_name, method, batch_size):
+        # loads a df over one pooled connection (see load for the arguments)
         try:
-            #connect to the db if not alreayd conencted
-            if self.connection is None or not self.connection.is_connected():
-                self.connect_to_db()
-                
-
-            cursor = self.connection.cursor()
-            
-            # create list of column names from the current df
-            columns = list(df.columns)
-            
-            #create placeholders for the SQL insert statements
-            placeholders =", ".join(["%s" for _ in columns])
-            
-            #creates a string of column names for SQL insert statemment
-            column_names = ", ".join(columns)
+            #connect to the db
+            with self.connect_to_db() as connection:
+                try:
+                    self._load_df(connection, df, table_name, method, batch_size)
+                except mysql.connector.Error:
+                    connection.rollback()
+                    raise
+            with self._lock:
+                self.rows_loaded += len(df)
+            return True
             
-            # the SQL INSERT statement:
-            insert_query =f"INSERT INTO {table_name} ({column_names}) VALUES ({placeholders})"
+        except mysql.connector.Error as e:
+            logger.error(f"Error when attempting to load data into {table_name} table: {e}")
+            return False
+    
+    def _load_parallel(self, df, table_name, method, batch_size):
+        """
+        Loads a large df over several pooled connections at once (self.workers of them)
+        
+        The rows are sorted by primary key and split into that many disjoint key ranges (the rows of one value of the
+        first key column, e.g all the items of an order, stay in the same range), and each range is loaded by a thread
+        with a connection of its own. Every range is committed on its own, so when one fails the others stay loaded.
+        
+        Returns:
+                Bool - True if every range was loaded successfully
+        """
+        
+        df = self._sort_by_key(df, table_name)
+        
+        # the range boundaries are moved back to the first row of the key they fall on
+        keys = df[PRIMARY_KEYS[table_name][0]].to_numpy()
+        boundaries = [int(np.searchsorted(keys, keys[len(df) * i // self.workers], side="left")) for i in range(1, self.workers)]
+        boundaries = sorted(set([0] + boundaries + [len(df)]))
+        ranges = [df.iloc[start:end] for start, end in zip(boundaries, boundaries[1:]) if end > start]
+        
+        logger.info(f"Loading {len(df)} rows into {table_name} over {len(ranges)} connections")
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            results = list(pool.map(lambda key_range: self._load_range(key_range, table_name, method, batch_size), ranges))
+        
+        if not all(results):
+            logger.error(f"{results.count(False)} of the {len(ranges)} key ranges of {table_name} failed to load")
+        return all(results)
+
+    def _load_df(self, connection, df, table_name, method, batch_size):
+        # loads the df over the given connection (see load for the arguments)
+
+        cursor = connection.cursor()
+        
+        #as previous week, have to disable foreign key check temporarily to load without regard to order
+        # (with the other settings of the session profile)
+        self._set_session(cursor, SESSION_PROFILES[self.session_profile], during_load=True)
+        try:
+            df = add_row_hash(df)
+            key_columns = None
             
-            #as previous week, have to disable foreign key check temporarily to load without regard to order
-            cursor.execute("SET FOREIGN_KEY_CHECKS=0")
+            if method in ("merge", "infile"):
+                # only the new and changed rows are sent, they're then inserted or updated (replaced) based on the primary key
+                key_columns = PRIMARY_KEYS[table_name]
+                total_rows = len(df)
+                df = self._changed_rows(cursor, df, table_name, key_columns)
+                logger.debug(f"Merging {len(df)} new/changed rows into {table_name} ({total_rows - len(df)} unchanged rows skipped)")
             
-            #next, converting the DataFrame into a list of tuples for SQL insertion
-            # NULL values handled by converting NaN to None
-            df_values = df.astype(object).where(pd.notnull(df), None)
-            values = [tuple(x) for x in df_values.to_numpy()]
+            df = self._sort_by_key(df, table_name)
             
-            # the INSERT query is then executed for multiple rows
-            cursor.executemany(insert_query, values)
+            if df.empty:
+                logger.debug(f"Nothing new or changed to load into {table_name}")
+            elif method == "infile" and self._load_with_infile(cursor, df, table_name):
+                logger.info(f"Bulk loaded {len(df)} rows with LOAD DATA LOCAL INFILE")
+            elif batch_size:
+                self._insert_batches(connection, cursor, df, table_name, batch_size, key_columns)
+            else:
+                self._insert_rows(cursor, df, table_name, key_columns)
             
             #commits
-            self.connection.commit()
+            connection.commit()
+        finally:
+            #Turning foregin key chekc back on (and the other settings of the session profile), also when the load failed,
+            # since the connection goes back to the pool as it is
+            self._set_session(cursor, SESSION_PROFILES[self.session_profile], during_load=False)
+            cursor.close()
+        
+        logger.debug(f"Successfully loaded {len(df)} rows of records into {table_name} table!\n")
+
+    def _set_session(self, cursor, profile, during_load):
+        # applies the settings of a session profile for a load, or sets them back afterwards
+        values = {variable: settings[0] if during_load else settings[1] for variable, settings in profile.items()}
+        cursor.execute("SET " + ", ".join(f"SESSION {variable} = {value}" for variable, value in values.items()))
+    
+    def _sort_by_key(self, df, table_name):
+        # rows are sent in primary key order, so InnoDB appends them to its clustered index (which is ordered by the
+        # primary key) instead of inserting them all over it, which splits pages. Rows with the same key keep their order
+        key_columns = [col for col in PRIMARY_KEYS.get(table_name, []) if col in df.columns]
+        if not key_columns:
+            return df
+        if len(key_columns) == 1 and df[key_columns[0]].is_monotonic_increasing:
+            return df
+        return df.sort_values(key_columns, kind="stable")
+    
+    def _insert_rows(self, cursor, df, table_name, key_columns=None):
+        # loads the df with a plain INSERT statement executed for every row
+        # (when key_columns are given, existing rows with the same key are updated instead)
+        
+        # create list of column names from the current df
+        columns = list(df.columns)
+        
+        #create placeholders for the SQL insert statements
+        placeholders =", ".join(["%s" for _ in columns])
+        
+        #creates a string of column names for SQL insert statemment
+        column_names = ", ".join(columns)
+        
+        # the SQL INSERT statement:
+        insert_query =f"INSERT INTO {table_name} ({column_names}) VALUES ({placeholders})" + self._upsert_clause(columns, key_columns)
+        
+        #next, converting the DataFrame into a list of tuples for SQL insertion
+        # NULL values handled by converting NaN to None
+        df_values = df.astype(object).where(pd.notnull(df), None)
+        values = [tuple(x) for x in df_values.to_numpy()]
+        
+        # the INSERT query is then executed for multiple rows
+        cursor.executemany(insert_query, values)
+
+    def _insert_batches(self, connection, cursor, df, table_name, batch_size, key_columns=None):
+        """
+        Loads the df in batches, each sent as one multi-row INSERT ... VALUES (...),(...) statement and committed on its own
+        
+        Keeps every transaction (and the undo log) small, and a failure only loses the current batch.
+        The batch size is lowered if a batch would likely be bigger than the server's max_allowed_packet.
+        When key_columns are given, existing rows with the same key are updated instead.
+        """
+        
+        columns = list(df.columns)
+        column_names = ", ".join(columns)
+        row_placeholders = "(" + ", ".join(["%s" for _ in columns]) + ")"
+        upsert_clause = self._upsert_clause(columns, key_columns)
+        
+        # NULL values handled by converting NaN to None (as in _insert_rows)
+        df_values = df.astype(object).where(pd.notnull(df), None)
+        values = df_values.to_numpy()
+        
+        batch_size = min(batch_size, self._max_rows_per_packet(cursor, values))
+        loaded_rows = 0
+        
+        for batch_number, start in enumerate(range(0, len(values), batch_size), start=1):
+            batch = values[start:start + batch_size]
+            insert_query = (f"INSERT INTO {table_name} ({column_names}) VALUES " + ", ".join([row_placeholders] * len(batch))
+                            + upsert_clause)
+            
+            batch_start = time.perf_counter()
+            try:
+                cursor.execute(insert_query, tuple(batch.ravel()))
+                connection.commit()
+            except mysql.connector.Error:
+                logger.error(f"Batch {batch_number} failed - {loaded_rows} rows were already committed to {table_name}")
+                raise
+            seconds = time.perf_counter() - batch_start
             
-            #Turning foregin key chekc back on
-            cursor.execute("SET FOREIGN_KEY_CHECKS=1")
+            loaded_rows += len(batch)
+            logger.debug(f"Batch {batch_number}: {len(batch)} rows in {seconds:.2f}s ({len(batch) / max(seconds, 1e-9):.0f} rows/sec)")
+    
+    def _upsert_clause(self, columns, key_columns):
+        # the ON DUPLICATE KEY UPDATE part of an upsert: every non-key column takes the value of the new row
+        if not key_columns:
+            return ""
+        updates = ", ".join(f"{col} = VALUES({col})" for col in columns if col not in key_columns)
+        return f" ON DUPLICATE KEY UPDATE {updates}"
+    
+    def _changed_rows(self, cursor, df, table_name, key_columns):
+        """
+        Returns the rows of df that are new or changed compared to the table in the target database
+        
+        The primary key and row_hash of the existing rows in the key range of the df are read, and a row is unchanged
+        when a row with the same key and the same row_hash exists already. The comparison is done for all rows at once
+        by looking the keys up in an index of the existing keys.
+        """
+        
+        existing_index, existing_hashes = self._read_existing_hashes(cursor, df, table_name, key_columns)
+        if len(existing_index) == 0:
+            return df
+        
+        # rows with a missing key can't be matched, so they are always sent
+        has_key = df[key_columns].notna().all(axis=1).to_numpy()
+        
+        new_index = pd.MultiIndex.from_frame(df[key_columns].fillna(-1).astype("int64"))
+        positions = existing_index.get_indexer(new_index) # -1 where the key doesn't exist yet
+        unchanged = has_key & (positions >= 0) & (existing_hashes[positions] == df["row_hash"].to_numpy())
+        
+        return df[~unchanged]
+    
+    def _read_existing_hashes(self, cursor, df, table_name, key_columns):
+        # reads the keys and hashes of the existing rows with every key column between its lowest and highest value
+        # in the df (a range scan of the primary key), so a chunk only reads the rows of its own key range, not the whole table
+        # returns an index of the keys and an array of the hashes
+        keys = df[key_columns].dropna()
+        existing = pd.DataFrame(columns=key_columns + ["row_hash"])
+        if not keys.empty:
+            ranges = " AND ".join(f"{col} BETWEEN %s AND %s" for col in key_columns)
+            bounds = [int(bound) for col in key_columns for bound in (keys[col].min(), keys[col].max())]
+            # rows loaded before row hashes existed have a NULL row_hash, they are read as 0 so they always count as changed
+            cursor.execute(f"SELECT {', '.join(key_columns)}, COALESCE(row_hash, 0) FROM {table_name} WHERE {ranges}", tuple(bounds))
+            existing = pd.DataFrame.from_records(cursor.fetchall(), columns=key_columns + ["row_hash"])
+        return (
+            pd.MultiIndex.from_frame(existing[key_columns].astype("int64")),
+            existing["row_hash"].to_numpy(dtype="int64")
+        )
+    
+    def _max_rows_per_packet(self, cursor, values):
+        # estimates how many rows fit into one INSERT statement without exceeding max_allowed_packet
+        if self.max_allowed_packet is None:
+            cursor.execute("SELECT @@max_allowed_packet")
+            self.max_allowed_packet = cursor.fetchone()[0]
+        
+        # the size of a row in the statement is estimated from (up to) the first 1000 rows,
+        # with a safety margin for quoting/escaping, and the statement is kept at 80% of the limit
+        sample = values[:1000]
+        row_bytes = max(len(str(tuple(row))) for row in sample) * 1.5
+        return max(1, int(self.max_allowed_packet * 0.8 / row_bytes))
+
+    def _load_with_infile(self, cursor, df, table_name):
+        """
+        Bulk loads the df by writing it to a temporary tab separated file and letting MySQL read it with LOAD DATA LOCAL INFILE
+        
+        This skips building Python tuples for every row and parsing an INSERT per row on the server,
+        which makes it much faster than _insert_rows for large tables. Rows with a key that exists already
+        replace the existing row (REPLACE), so changed rows are updated like in a merge.
+        
+        Returns:
+                True if the data was loaded, False if the server/client doesn't allow local infile
+        """
+        
+        temp_file = tempfile.NamedTemporaryFile(mode="w", suffix=".tsv", encoding="utf-8", newline="", delete=False)
+        try:
+            with temp_file:
+                # MySQL's default LOAD DATA format: tab separated, \N for NULL, special characters escaped with a backslash
+                encode_for_infile(df, table_name).to_csv(
+                    temp_file, sep="\t", na_rep="\\N", index=False, header=False,
+                    quoting=csv.QUOTE_NONE, lineterminator="\n"
+                )
             
-            print(f"Successfully loaded {len(df)} rows of records into {table_name} table!\n")
+            file_size = os.path.getsize(temp_file.name)
+            column_names = ", ".join(df.columns)
+            file_path = temp_file.name.replace("\\", "/") # MySQL wants forward slashes, also on Windows
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE '{file_path}' REPLACE INTO TABLE {table_name} CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({column_names})"
+            )
+            with self._lock:
+                self.bytes_sent += file_size
             return True
+        
+        except mysql.connector.Error as e:
+            # local infile has to be enabled on both the client and the server (local_infile=1)
+            if e.errno in LOCAL_INFILE_DISABLED_ERRORS:
+                logger.warning(f"LOAD DATA LOCAL INFILE is not allowed ({e}) -> falling back to INSERT for {table_name}")
+                return False
+            raise
+        
+        finally:
+            os.remove(temp_file.name)
+
+    def fetch_existing(self, table_name, columns):
+        """
+        Reads (some columns of) the rows that are already in a table of the target database
+        
+        Used in incremental runs, where only new rows are extracted, to still know all the keys that exist
+        
+        Arguments:
+                table_name: Name of the table to read
+                columns: list of the columns to read (e.g the primary key)
+                
+        Returns:
+                pandas DataFrame with the existing rows (empty if the table can't be read)
+        """
+        
+        try:
+            with self.connect_to_db() as connection:
+                cursor = connection.cursor()
+                cursor.execute(f"SELECT {', '.join(columns)} FROM {table_name}")
+                df = pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+                cursor.close()
             
+            logger.info(f"Read {len(df)} existing rows from {table_name} table")
+            return df
+        
         except mysql.connector.Error as e:
-            print(f"Error when attempting to load data into {table_name} table: {e}")
-            if self.connection:
-                self.connection.rollback()
+            logger.error(f"Error when attempting to read existing rows from {table_name} table: {e}")
+            return pd.DataFrame(columns=columns)
+
+    def load_chunks(self, chunks, table_name, method="insert", batch_size=None):
+        """
+        Loads a stream of DataFrame chunks (e.g from Transformer.transform_chunks) into a table, one chunk at a time
+
+        Arguments:
+                chunks: iterable of pandas DataFrames
+                table_name: Name of table for the chunks to be loaded into
+                method: load method used for each chunk (see load)
+                batch_size: batch size used for each chunk (see load)
+
+        Returns:
+                Bool - True if every chunk was loaded successfully, False otherwise
+        """
+
+        success = True
+        loaded_rows = 0
+
+        for chunk in chunks:
+            if self.load(chunk, table_name, method=method, batch_size=batch_size):
+                loaded_rows += len(chunk)
+            else:
+                success = False
+
+        if loaded_rows == 0:
+            logger.warning(f"Attention: No chunks were loaded into {table_name}")
             return False
-        
+
+        logger.info(f"Loaded {loaded_rows} rows in total into {table_name} table")
+        return success
+
     def close_connection(self):
-        #closes database connection down
-        if self.connection is not None and self.connection.is_connected():
-            self.connection.close()
-            print("Database connection closed")
\ No newline at end of file
+        # nothing to close: connections go back to the shared pool after every load (see db_connection.close_pools)
+        pass
\ No newline at end of file
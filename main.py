@@ -1,110 +1,564 @@
-from extractor import Extractor
-from transformer import Transformer
-from loader import Loader
-
-def run_etl_process():
-    #Runs the entire process
-    print("Starting the ETL process...")
-    
-    #First initialize the ETL classes
-    extractor = Extractor()
-    transformer = Transformer()
-    loader = Loader()
-    
+import logging
+import argparse
+from contextlib import nullcontext
+import pandas as pd
+from extractor import Extractor, MAX_DB_CONNECTIONS
+from async_extractor import AsyncExtractor
+from transformer import Transformer, REFERENCE_KEYS, REFERENCE_NAMES, copy_on_write
+from polars_transformer import PolarsTransformer
+from loader import Loader, SESSION_PROFILES
+from scheduler import TableScheduler
+from watermarks import WatermarkStore
+from db_connection import close_pools
+from metrics import RunMetrics
+from checkpoint import CheckpointStore, make_fingerprint
+from pipeline import pipelined, QueueWait
+
+logger = logging.getLogger(__name__)
+
+
+# every table in the ETL process, with its source and the tables it depends on
+# a table is only processed once all the tables in "depends_on" are done,
+# since its transformation validates/maps keys against their reference data
+# db tables with a "chunk_size" are streamed through the ETL in chunks to keep memory bounded
+# tables are merged (upserted) by default so the ETL can be re-run against a populated BikeCorpDB,
+# only the rows that are new or changed are sent. Tables with "load_method": "infile" are bulk loaded with
+# LOAD DATA LOCAL INFILE ... REPLACE instead (the new/changed rows replace the rows with the same key)
+# tables with a "batch_size" are inserted in multi-row batches that are committed one at a time
+# api tables with a "page_size" are downloaded as pages that are requested concurrently
+# api tables with a "data_format" ("arrow"/"parquet") are downloaded in a binary columnar format instead of JSON
+# tables with a "watermark" column only extract rows with a higher value than the previous run in incremental runs
+ETL_TABLES = [
+    {"type": "db", "name": "brands", "depends_on": []},
+    {"type": "db", "name": "categories", "depends_on": []},
+    {"type": "csv", "name": "stores", "path": "data/stores.csv", "depends_on": []},
+    {"type": "db", "name": "products", "depends_on": ["brands", "categories"], "chunk_size": 50000,
+     "watermark": "product_id"},
+    {"type": "csv", "name": "staffs", "path": "data/staffs.csv", "depends_on": ["stores"]},
+    {"type": "api", "name": "customers", "depends_on": [], "page_size": 10000, "data_format": "arrow",
+     "load_method": "infile", "batch_size": 10000, "watermark": "customer_id"},
+    {"type": "db", "name": "stocks", "depends_on": ["stores", "products"], "chunk_size": 50000},
+    {"type": "api", "name": "orders", "depends_on": ["stores", "staffs", "customers"], "page_size": 10000, "data_format": "arrow",
+     "load_method": "infile", "batch_size": 10000, "watermark": "order_id"},
+    {"type": "api", "name": "order_items", "depends_on": ["orders", "products"], "page_size": 10000, "data_format": "arrow",
+     "load_method": "infile", "batch_size": 10000, "watermark": "order_id"}
+]
+
+
+def process_table(table_info, context):
+    """
+    Extracts, transforms and loads a single table
+
+    Each call uses its own Extractor and Loader, which check connections out of the shared
+    connection pools, so tables can be processed by several worker threads at once. The Transformer
+    is shared, since it holds the reference data that dependent tables need.
+
+    Arguments:
+        table_info: dict describing the table (type, name and path for csv files)
+        context: dict with what is shared by all tables in the run (see run_etl_process)
+
+    Returns:
+        True if the table was loaded successfully, False otherwise
+    """
+
+    extractor = context["extractor_class"](csv_engine=context["csv_engine"], csv_cache=context["csv_cache"],
+                                           db_connections=context["extract_connections"])
+    loader = Loader(workers=context["load_workers"], session_profile=context["session_profile"])
+    transformer = context["transformer"]
+    metrics = context["metrics"]
+    checkpoints = context["checkpoints"]
+    table_name = table_info["name"]
+
+    # in incremental runs, only the rows newer than the table's watermark are extracted
+    since = None
+    if context["incremental"] and table_info.get("watermark"):
+        since = context["watermarks"].get(table_info["name"])
+
     try:
-        
-        #processing reference tables first due to dependencies later.. 
-        reference_tables = [
-            {"type":"db", "name":"brands"}, 
-            {"type":"db", "name":"categories"},
-            {"type":"csv", "name": "stores", "path": "data/stores.csv"}
-            ]
-        
-        
-        for table_info in reference_tables:
-            if table_info["type"] == "db":            
-                df = extractor.extract_from_db(table_info["name"])
-            else: #csv
-                df = extractor.extract_from_csv(table_info["path"])
-            
-            #add reference data before transformation
-            transformer.add_reference_data(df, table_info["name"])
-            
-            # Transform
-            transformed_df = transformer.transform(df, table_info["name"])
-            
-            # Load
-            success = loader.load(transformed_df, table_info["name"])
-            
-            if success:
-                #updating ref data with the newly transformed data
-                transformer.add_reference_data(transformed_df, table_info["name"])
-            else:
-                print(f"Warning: Failed to load {table_info["name"]} data.")
-        
-        # Process tables with dependencies (first level)
-        first_level_tables = [
-            {"type": "db", "name":"products" },
-            {"type": "csv", "name": "staffs", "path": "data/staffs.csv" },
-            {"type": "api", "name": "customers"}
-        ] 
-        
-        for table_info in first_level_tables:
-            # Extract based on source
-            if table_info["type"] == "db":
-                df = extractor.extract_from_db(table_info["name"])
-            
-            elif table_info["type"] == "csv":
-                df = extractor.extract_from_csv(table_info["path"])
-            
-            else:
-                df = extractor.extract_from_api(table_info["name"])
-            
-            
-            # Transform
-            transformed_df = transformer.transform(df, table_info["name"])
-            # reference data added before being used 
-            if table_info["name"] in ["staffs", "products", "customers"]:
-                transformer.add_reference_data(transformed_df, table_info["name"])
-                
-            # Load
-            success = loader.load(transformed_df, table_info["name"])
-            if not success:
-                print(f"Warning: Failed to load {table_info["name"]} data.")
-        
-        # Process tables with dependencies (second level)
-        second_level_tables = [
-            {"type": "db", "name": "stocks"},
-            {"type": "api" , "name": "orders" },
-            {"type": "api", "name": "order_items"}
-        ] 
-        
-        for table_info in second_level_tables:
+        # the stages completed by the previous run are checkpointed under the fingerprint of the table's source
+        fingerprint = _source_fingerprint(extractor, table_info, context, since)
+
+        # large db tables are always streamed in chunks, paginated api tables in pipelined runs (a chunk per page)
+        if (table_info["type"] == "db" and table_info.get("chunk_size")) or (context["pipelined"] and table_info.get("page_size")):
+            return process_table_in_chunks(table_info, context, extractor, loader, since, fingerprint)
+
+        if _resume_loaded(context, loader, table_info, fingerprint, since):
+            return True
+
+        # when resuming, the stages the previous run got through are read from their checkpoints instead of being redone
+        transformed_df = _resume_stage(context, table_name, "transform", fingerprint)
+        if transformed_df is None:
             # Extract based on source
-            if table_info["type"] == "db":
-                df = extractor.extract_from_db(table_info["name"])
-            
-            elif table_info["type"] == "csv":
-                df = extractor.extract_from_csv(table_info["path"])
-            
-            else:
-                df = extractor.extract_from_api(table_info["name"])
-            
-            
+            with metrics.stage(table_name, "extract") as extract_metrics:
+                df = _resume_stage(context, table_name, "extract", fingerprint)
+                if df is None:
+                    if table_info["type"] == "db":
+                        df = extractor.extract_from_db(table_name, since=since, key_column=table_info.get("watermark"),
+                                                       columns=transformer.required_columns(table_name),
+                                                       filters=context["source_filters"].get(table_name))
+                    elif table_info["type"] == "csv":
+                        df = extractor.extract_from_csv(table_info["path"])
+                    elif table_info.get("page_size"):
+                        df = extractor.extract_from_api_paginated(table_name, page_size=table_info["page_size"],
+                                                                  data_format=table_info.get("data_format", "json"), since=since)
+                    else:
+                        df = extractor.extract_from_api(table_name, data_format=table_info.get("data_format", "json"),
+                                                        since=since)
+                    checkpoints.save(df, table_name, "extract", fingerprint)
+                extract_metrics.rows_out = len(df)
+                extract_metrics.bytes = extractor.bytes_received or None
+
             # Transform
-            transformed_df = transformer.transform(df, table_info["name"])
-            
-            # Load
-            success = loader.load(transformed_df, table_info["name"])
-            if not success:
-                print(f"Warning: Failed to load {table_info["name"]} data.")
+            with metrics.stage(table_name, "transform") as transform_metrics:
+                transform_metrics.rows_in = len(df)
+                transformed_df = transformer.transform(df, table_name)
+                # the extracted df isn't needed any more, so it is released rather than kept alive until the load is done
+                del df
+                transform_metrics.rows_out = len(transformed_df)
+                transform_metrics.rows_rejected = transform_metrics.rows_in - transform_metrics.rows_out
+            checkpoints.save(transformed_df, table_name, "transform", fingerprint)
+
+        # reference data is added before loading, so dependent tables can start using it
+        if table_name in context["reference_tables"]:
+            reference_df = transformed_df
+            if _partial_extract(context, table_name, since):
+                # only the new (or filtered) rows were extracted, so the keys loaded in earlier runs are read from the target database
+                existing_df = loader.fetch_existing(table_name, _reference_columns(table_name))
+                reference_df = pd.concat([existing_df, transformed_df], ignore_index=True)
+            transformer.add_reference_data(reference_df, table_name)
+
+        if since is not None and transformed_df.empty:
+            logger.info(f"No new {table_name} rows since the last run (watermark {since})")
+            checkpoints.mark_completed(table_name, "load", fingerprint)
+            return True
+
+        # Load
+        with metrics.stage(table_name, "load") as load_metrics:
+            load_metrics.rows_in = len(transformed_df)
+            success = loader.load(transformed_df, table_name, method=table_info.get("load_method", "merge"),
+                                  batch_size=table_info.get("batch_size"))
+            _record_load(load_metrics, loader)
+        if success:
+            _update_watermark(context, table_info, transformed_df)
+            checkpoints.mark_completed(table_name, "load", fingerprint)
+        else:
+            logger.warning(f"Warning: Failed to load {table_name} data.")
+        return success
 
     finally:
         # Clean up connections
         extractor.close_connections()
         loader.close_connection()
-    
-    print("ETL PROCESS COMPLETED!")
+
+
+def process_table_in_chunks(table_info, context, extractor, loader, since=None, fingerprint=None):
+    """
+    Streams a large table through the ETL one chunk at a time, so the whole table never has to be in memory at once
+
+    The chunks are read from the db table ("chunk_size" rows at a time), or are the pages of a paginated api table.
+    In pipelined runs every stage runs in a thread of its own and hands its chunks to the next stage through a bounded
+    queue (see pipeline.pipelined): chunk N+1 is extracted while chunk N is transformed and chunk N-1 is loaded,
+    so the table takes about as long as its slowest stage rather than the sum of the three.
+
+    Arguments:
+        table_info: dict describing the table (with "chunk_size", or "page_size" for api tables)
+        context: dict with what is shared by all tables in the run (see run_etl_process)
+        extractor, loader: the Extractor and Loader used for this table
+        since: watermark to extract from in incremental runs (None extracts the whole table)
+        fingerprint: fingerprint of the table's source the chunks are checkpointed under (see _source_fingerprint)
+
+    Returns:
+        True if every chunk was loaded successfully, False otherwise
+    """
+
+    transformer = context["transformer"]
+    metrics = context["metrics"]
+    checkpoints = context["checkpoints"]
+    table_name = table_info["name"]
+
+    if _resume_loaded(context, loader, table_info, fingerprint, since):
+        return True
+
+    # the stages run interleaved (or at the same time, when pipelined), chunk by chunk, so each one is timed while it
+    # produces its chunks, without the time spent waiting for the stage before it
+    extract_upstream = metrics.get(table_name, "extract")
+    transform_upstream = metrics.get(table_name, "transform")
+    if context["pipelined"]:
+        extract_upstream = QueueWait()
+        transform_upstream = QueueWait()
+
+    # the chunks are checkpointed as they pass, and when resuming the chunks of the stages the previous run
+    # got through are read back from their checkpoints instead
+    if context["resume"] and checkpoints.completed(table_name, "transform", fingerprint):
+        logger.info(f"Resuming: reading the transformed {table_name} chunks from the checkpoint of the previous run")
+        transformed_chunks = checkpoints.load_chunks(table_name, "transform", fingerprint)
+    else:
+        if context["resume"] and checkpoints.completed(table_name, "extract", fingerprint):
+            logger.info(f"Resuming: reading the extracted {table_name} chunks from the checkpoint of the previous run")
+            chunks = checkpoints.load_chunks(table_name, "extract", fingerprint)
+        elif table_info["type"] == "db":
+            chunks = extractor.extract_from_db_chunks(table_name, chunk_size=table_info["chunk_size"],
+                                                      since=since, key_column=table_info.get("watermark"),
+                                                      columns=context["transformer"].required_columns(table_name),
+                                                      filters=context["source_filters"].get(table_name))
+            chunks = checkpoints.save_chunks(chunks, table_name, "extract", fingerprint)
+        else:
+            chunks = extractor.iter_api_pages(table_name, page_size=table_info["page_size"],
+                                              data_format=table_info.get("data_format", "json"), since=since)
+            chunks = checkpoints.save_chunks(chunks, table_name, "extract", fingerprint)
+        chunks = metrics.track_chunks(chunks, table_name, "extract")
+        if context["pipelined"]:
+            chunks = pipelined(chunks, f"{table_name} extract", context["queue_size"], wait=extract_upstream)
+        transformed_chunks = transformer.transform_chunks(chunks, table_name)
+        transformed_chunks = checkpoints.save_chunks(transformed_chunks, table_name, "transform", fingerprint)
+
+    if table_info["name"] in context["reference_tables"]:
+        partial = _partial_extract(context, table_info["name"], since)
+        if partial:
+            # the chunks are added on top of the keys loaded in earlier runs
+            existing_df = loader.fetch_existing(table_info["name"], _reference_columns(table_info["name"]))
+            transformer.add_reference_data(existing_df, table_info["name"])
+        transformed_chunks = _add_reference_chunks(transformed_chunks, transformer, table_info["name"], append=partial)
+
+    # the highest key of the loaded chunks becomes the new watermark
+    loaded = {"watermark": None}
+    if table_info.get("watermark"):
+        transformed_chunks = _track_watermark(transformed_chunks, table_info["watermark"], loaded)
+
+    extract_metrics = metrics.get(table_name, "extract")
+    transformed_chunks = metrics.track_chunks(transformed_chunks, table_name, "transform", upstream=extract_upstream)
+    transform_metrics = metrics.get(table_name, "transform")
+    if context["pipelined"]:
+        transformed_chunks = pipelined(transformed_chunks, f"{table_name} transform", context["queue_size"],
+                                       wait=transform_upstream)
+
+    with metrics.stage(table_name, "load", upstream=transform_upstream) as load_metrics:
+        success = loader.load_chunks(transformed_chunks, table_name, method=table_info.get("load_method", "merge"),
+                                     batch_size=table_info.get("batch_size"))
+        load_metrics.rows_in = transform_metrics.rows_out
+        _record_load(load_metrics, loader)
+
+    transform_metrics.rows_in = extract_metrics.rows_out
+    extract_metrics.bytes = extractor.bytes_received or None
+    transform_metrics.rows_rejected = transform_metrics.rows_in - transform_metrics.rows_out
+
+    if loaded["watermark"] is None and since is not None:
+        logger.info(f"No new {table_info['name']} rows since the last run (watermark {since})")
+        checkpoints.mark_completed(table_name, "load", fingerprint)
+        return True
+
+    if success:
+        checkpoints.mark_completed(table_name, "load", fingerprint)
+    if success and loaded["watermark"] is not None and not context["source_filters"].get(table_name):
+        context["watermarks"].update(table_info["name"], loaded["watermark"])
+    elif not success:
+        logger.warning(f"Warning: Failed to load {table_info['name']} data.")
+    return success
+
+
+def _source_fingerprint(extractor, table_info, context, since=None):
+    """
+    Fingerprints the source of a table for its checkpoints (see checkpoint.py)
+
+    The fingerprint of the source (file mtime/size, DB table checksum or API ETag) is combined with the watermark
+    the table is extracted from, the columns and filters of db tables, and the fingerprints of the tables it depends on,
+    since its transformation uses their reference data. So when a source changes, its table and every table depending on it are redone.
+
+    Returns:
+        the fingerprint, or None if the table can't be checkpointed (checkpoints are off or the source couldn't be fingerprinted)
+    """
+
+    if not context["checkpoints"].enabled:
+        return None
+
+    if table_info["type"] == "db":
+        source = [extractor.fingerprint_db(table_info["name"]), context["transformer"].required_columns(table_info["name"]),
+                  context["source_filters"].get(table_info["name"])]
+        if source[0] is None:
+            source = None
+    elif table_info["type"] == "csv":
+        source = extractor.fingerprint_csv(table_info["path"])
+    else:
+        source = extractor.fingerprint_api(table_info["name"])
+
+    dependencies = [context["fingerprints"].get(dependency) for dependency in table_info["depends_on"]]
+    fingerprint = None
+    if source is not None and None not in dependencies:
+        fingerprint = make_fingerprint(table_info["name"], source, since, *dependencies)
+    context["fingerprints"][table_info["name"]] = fingerprint
+    return fingerprint
+
+
+def _resume_loaded(context, loader, table_info, fingerprint, since=None):
+    """
+    In resumed runs, checks if the previous run already loaded a table (from the same source), in which case
+    only its reference data is needed: it is read back from the checkpoint of its transformed rows
+    (or from the target database in incremental runs, where the checkpoint only has the new rows)
+
+    Returns:
+        True if the table can be skipped
+    """
+
+    table_name = table_info["name"]
+    checkpoints = context["checkpoints"]
+    if not context["resume"] or not checkpoints.completed(table_name, "load", fingerprint):
+        return False
+
+    if table_name in context["reference_tables"]:
+        if _partial_extract(context, table_name, since):
+            reference_df = loader.fetch_existing(table_name, _reference_columns(table_name))
+        else:
+            reference_df = checkpoints.load(table_name, "transform", fingerprint, columns=_reference_columns(table_name))
+            if reference_df is None:
+                return False
+        context["transformer"].add_reference_data(reference_df, table_name)
+
+    logger.info(f"Resuming: {table_name} was loaded by the previous run, skipping it")
+    return True
+
+
+def _partial_extract(context, table_name, since):
+    # True if only part of a table is extracted (the rows newer than its watermark, or the rows matching its filters),
+    # its reference data then also needs the keys of the rows loaded before
+    return since is not None or bool(context["source_filters"].get(table_name))
+
+
+def _reference_columns(table_name):
+    # the columns of a table kept as reference data: its key, and the name dependent tables refer to it by
+    return [REFERENCE_KEYS[table_name]] + ([REFERENCE_NAMES[table_name]] if table_name in REFERENCE_NAMES else [])
+
+
+def _resume_stage(context, table_name, stage, fingerprint):
+    # in resumed runs, the checkpointed output of a stage the previous run completed (None if it has to be redone)
+    if not context["resume"]:
+        return None
+    df = context["checkpoints"].load(table_name, stage, fingerprint)
+    if df is not None:
+        logger.info(f"Resuming: using the {stage}ed {table_name} rows checkpointed by the previous run")
+    return df
+
+
+def _record_load(load_metrics, loader):
+    # the rows and bytes the loader got into the target database
+    load_metrics.rows_out = loader.rows_loaded
+    load_metrics.rows_rejected = load_metrics.rows_in - loader.rows_loaded
+    load_metrics.bytes = loader.bytes_sent or None
+
+
+def _add_reference_chunks(chunks, transformer, table_name, append=False):
+    # adds each transformed chunk to the reference data as it passes through on its way to the loader
+    for i, chunk in enumerate(chunks):
+        transformer.add_reference_data(chunk, table_name, append=append or i > 0)
+        yield chunk
+
+
+def _track_watermark(chunks, column, loaded):
+    # keeps track of the highest value of the watermark column in the chunks passing through
+    for chunk in chunks:
+        chunk_max = int(chunk[column].max())
+        if loaded["watermark"] is None or chunk_max > loaded["watermark"]:
+            loaded["watermark"] = chunk_max
+        yield chunk
+
+
+def _update_watermark(context, table_info, loaded_df):
+    # saves the highest loaded key of a table as its new watermark
+    # (not for a filtered table: the rows filtered out below its highest key would never be extracted by later runs)
+    if table_info.get("watermark") and not loaded_df.empty and not context["source_filters"].get(table_info["name"]):
+        context["watermarks"].update(table_info["name"], int(loaded_df[table_info["watermark"]].max()))
+
+
+def parse_filters(filter_args):
+    """
+    Turns --filter arguments (TABLE.COLUMN=VALUE[,VALUE..]) into the source_filters of run_etl_process
+    (a single value is compared with =, several with IN)
+    """
+
+    source_filters = {}
+    for filter_arg in filter_args:
+        target, separator, values = filter_arg.partition("=")
+        table_name, dot, column = target.partition(".")
+        if not separator or not dot:
+            raise ValueError(f"Invalid filter {filter_arg!r}, expected TABLE.COLUMN=VALUE[,VALUE..]")
+        values = values.split(",")
+        source_filters.setdefault(table_name, {})[column] = values if len(values) > 1 else values[0]
+    return source_filters
+
+
+# transformer engines that can be used for the transform stage (both have the same interface)
+TRANSFORMER_ENGINES = {
+    "pandas": Transformer,
+    "polars": PolarsTransformer
+}
+
+
+# directory of the checkpoints of resumed runs when no other directory is given
+DEFAULT_CHECKPOINT_DIR = "checkpoints"
+
+
+def run_etl_process(max_workers=4, source_limits=None, incremental=False, engine="pandas", copy_free=False, compact=False,
+                    transform_workers=1, report_path="etl_report.json", checkpoint_dir=None, resume=False,
+                    csv_engine="c", csv_cache_dir="csv_cache", async_extract=False, pipelined=False, queue_size=2,
+                    load_workers=1, session_profile="default", source_filters=None, extract_connections=1):
+    """
+    Runs the entire process
+
+    Tables are processed in parallel as soon as the tables they depend on are done
+
+    Arguments:
+        max_workers: max number of tables processed at the same time
+        source_limits: optional dict capping concurrent tables per source type, e.g {"db": 2, "api": 4}
+        incremental: if True, tables with a watermark only extract and load the rows that are newer
+                     than what was loaded in the previous run
+        engine: "pandas" (Transformer) or "polars" (PolarsTransformer, runs each transformation as a lazy multi-threaded plan)
+        copy_free: if True (pandas engine), the Transformer works on the extracted frames without copying them first
+                   (see Transformer.__init__), which lowers the peak memory use of each table
+        compact: if True (pandas engine), the transformed frames get compact dtypes matching the target columns
+                 (small ints, categoricals, Arrow backed strings, see transformer.COMPACT_DTYPES)
+        transform_workers: number of processes (pandas engine) large frames are transformed by, split by key range
+                           (see Transformer._transform_partitioned), 1 transforms every frame in this process
+        report_path: JSON file the run report (time, rows, bytes and memory of every stage of every table,
+                     see metrics.RunMetrics) is written to, None to not write it
+        checkpoint_dir: directory the extracted and transformed frames of every table are checkpointed in
+                        (see checkpoint.CheckpointStore), None to not checkpoint them (unless resuming)
+        resume: if True, the stages completed by the previous run (for sources that haven't changed since)
+                are skipped: loaded tables only get their reference data back, and extracted/transformed
+                frames are read from their checkpoints (in checkpoint_dir, DEFAULT_CHECKPOINT_DIR if it isn't given)
+        csv_engine: parser for the csv sources, "c" or "pyarrow" (multithreaded), see Extractor.__init__
+        csv_cache_dir: directory the parsed csv sources are cached in, and reused from while the files are unchanged,
+                       None to parse them on every run
+        async_extract: if True, tables are extracted with the AsyncExtractor (API pages are requested with an async
+                       httpx client, see async_extractor.py) instead of the Extractor. Only the API reads change:
+                       db tables are still read by extract_from_db(_chunks), with their columns and filters
+        pipelined: if True, the extract, transform and load stages of chunked tables (large db tables, and paginated
+                   api tables, page by page) run at the same time in threads connected by bounded queues
+                   (see process_table_in_chunks)
+        queue_size: in pipelined runs, the max number of chunks waiting between two stages
+        load_workers: number of pooled connections a large frame is loaded over at once, split by primary key range
+                      (see Loader._load_parallel), 1 loads every frame over a single connection
+        session_profile: session settings of the target connections while loading ("default", or "bulk" to also
+                         skip the unique checks, see loader.SESSION_PROFILES)
+        source_filters: optional dict of db table -> filters, only the rows matching them are extracted from ProductDB,
+                        e.g {"products": {"brand_id": [1, 2]}} (see Extractor.extract_from_db). Filtered tables
+                        don't move their watermark
+        extract_connections: number of connections the large ProductDB tables (extractor.DB_SPLIT_KEYS) are read over
+                             at once, split by key range, all reading the same snapshot (see Extractor._extract_db_ranges)
+
+    Returns:
+        the run report (dict)
+    """
+
+    logger.info(f"Starting the ETL process (transformer engine: {engine})...")
+    if incremental:
+        logger.info("Incremental run: only extracting rows newer than the saved watermarks")
+    if resume:
+        # a resumed run keeps checkpointing, so it can be resumed in turn
+        checkpoint_dir = checkpoint_dir or DEFAULT_CHECKPOINT_DIR
+        logger.info(f"Resuming: stages completed by the previous run are read from {checkpoint_dir}")
+
+    # what is shared by all tables in the run:
+    # - the transformer, since it holds the reference data
+    # - the tables that other tables depend on, which have to be kept as reference data
+    # - the watermarks of the tables, saved after each successful load
+    # - the metrics of every stage of every table
+    # - the checkpoints of the stages, and the source fingerprints of the tables they're kept under
+    # - the extractor class, how the csv sources are read, and the cache of the parsed csv files
+    # - how the loaders load (connections per frame, session profile)
+    # - the filters of the db tables, and the number of connections they're read over
+    if engine == "pandas":
+        transformer = Transformer(copy_free=copy_free, compact=compact, workers=transform_workers)
+    else:
+        transformer = TRANSFORMER_ENGINES[engine]()
+
+    context = {
+        "transformer": transformer,
+        "reference_tables": {dependency for table_info in ETL_TABLES for dependency in table_info["depends_on"]},
+        "watermarks": WatermarkStore(),
+        "incremental": incremental,
+        "metrics": RunMetrics(),
+        "checkpoints": CheckpointStore(checkpoint_dir),
+        "fingerprints": {},
+        "resume": resume,
+        "extractor_class": AsyncExtractor if async_extract else Extractor,
+        "csv_engine": csv_engine,
+        "pipelined": pipelined,
+        "queue_size": queue_size,
+        "csv_cache": CheckpointStore(csv_cache_dir) if csv_cache_dir is not None else None,
+        "load_workers": load_workers,
+        "session_profile": session_profile,
+        "source_filters": source_filters or {},
+        "extract_connections": extract_connections
+    }
+
+    scheduler = TableScheduler(ETL_TABLES, max_workers=max_workers, source_limits=source_limits)
+    try:
+        # in copy-free mode copy-on-write stays on for the whole run (and is set back afterwards), so the loaders
+        # don't copy the columns of the transformed frames either (see loader.add_row_hash)
+        with copy_on_write() if copy_free and engine == "pandas" else nullcontext():
+            scheduler.run(lambda table_info: process_table(table_info, context))
+    finally:
+        # Clean up the pooled database connections
+        close_pools()
+        # the report is also written when a table failed, to show how far the run got
+        if report_path is not None:
+            context["metrics"].write_report(report_path)
+    scheduler.log_report()
+
+    logger.info("ETL PROCESS COMPLETED!")
+    return context["metrics"].report()
+
 
 if __name__ == "__main__":
-    run_etl_process()
+    parser = argparse.ArgumentParser(description="Runs the BikeCorp ETL process")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only extract and load rows newer than the watermarks saved by the previous run")
+    parser.add_argument("--engine", choices=sorted(TRANSFORMER_ENGINES), default="pandas",
+                        help="engine used for the transformations")
+    parser.add_argument("--copy-free", action="store_true",
+                        help="transform the extracted frames without copying them (pandas copy-on-write)")
+    parser.add_argument("--compact", action="store_true",
+                        help="store the transformed frames with compact dtypes (small ints, categoricals, Arrow strings)")
+    parser.add_argument("--transform-workers", type=int, default=1,
+                        help="transform large frames in this many processes, split by key range (pandas engine)")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip the stages the previous run completed, using their checkpoints (for sources that haven't changed)")
+    parser.add_argument("--checkpoint-dir",
+                        help=f"checkpoint the stages in this directory, so a failed run can be resumed "
+                             f"(with --resume: defaults to {DEFAULT_CHECKPOINT_DIR})")
+    parser.add_argument("--csv-engine", choices=["c", "pyarrow"], default="c",
+                        help="parser for the csv sources (pyarrow reads them with several threads)")
+    parser.add_argument("--csv-cache-dir", default="csv_cache", help="directory the parsed csv sources are cached in")
+    parser.add_argument("--no-csv-cache", action="store_true", help="parse the csv sources on every run")
+    parser.add_argument("--async-extract", action="store_true",
+                        help="extract with the AsyncExtractor (API pages requested concurrently with an async HTTP client)")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="overlap extracting, transforming and loading the chunks of large tables")
+    parser.add_argument("--queue-size", type=int, default=2,
+                        help="max number of chunks waiting between two stages in pipelined runs")
+    parser.add_argument("--load-workers", type=int, default=1,
+                        help="load large tables over this many connections at once, split by primary key range")
+    parser.add_argument("--session-profile", choices=sorted(SESSION_PROFILES), default="default",
+                        help="session settings while loading (bulk also turns off unique checks)")
+    parser.add_argument("--extract-connections", type=int, default=1,
+                        help=f"read the large ProductDB tables over this many connections at once, split by key range "
+                             f"(at most {MAX_DB_CONNECTIONS})")
+    parser.add_argument("--filter", action="append", default=[], metavar="TABLE.COLUMN=VALUE[,VALUE..]",
+                        help="only extract the rows of a ProductDB table with one of the values in the column (repeatable)")
+    parser.add_argument("--report", default="etl_report.json", help="JSON file the run report is written to")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="DEBUG also shows every step of the transformations and every load batch")
+    args = parser.parse_args()
+    if not 1 <= args.extract_connections <= MAX_DB_CONNECTIONS:
+        parser.error(f"--extract-connections has to be between 1 and {MAX_DB_CONNECTIONS}")
+
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # httpx logs every request at INFO, which would drown out the ETL's own log with --async-extract
+    logging.getLogger("httpx").setLevel(max(logging.WARNING, logging.getLogger().level))
+
+    run_etl_process(incremental=args.incremental, engine=args.engine, copy_free=args.copy_free, compact=args.compact,
+                    transform_workers=args.transform_workers, report_path=args.report,
+                    checkpoint_dir=args.checkpoint_dir, resume=args.resume,
+                    csv_engine=args.csv_engine, csv_cache_dir=None if args.no_csv_cache else args.csv_cache_dir,
+                    async_extract=args.async_extract, pipelined=args.pipelined, queue_size=args.queue_size,
+                    load_workers=args.load_workers, session_profile=args.session_profile,
+                    source_filters=parse_filters(args.filter), extract_connections=args.extract_connections)
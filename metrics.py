@@ -0,0 +1,196 @@
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    # resource (peak RSS of the process) is only available on Unix, on other platforms peak memory isn't recorded
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+# the stages every table goes through, in order
+STAGES = ["extract", "transform", "load"]
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size (=memory use) of the process so far in MB, or None where it can't be read
+    """
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux, but in bytes on macOS
+    if sys.platform == "darwin":
+        peak /= 1024
+    return round(peak / 1024, 1)
+
+
+class StageMetrics:
+    """
+    Metrics of one stage (extract, transform or load) of one table
+
+    - seconds: wall time spent in the stage itself
+    - rows_in / rows_out: rows going into the stage and coming out of it
+    - rows_rejected: rows the stage dropped (invalid rows removed by the transform, rows that failed to load)
+    - bytes: bytes transferred from the source/to the target where known (API responses, csv files,
+      LOAD DATA files), None otherwise
+    - peak_rss_mb: peak memory use of the process at the end of the stage. Tables run in parallel, so it's
+      the peak of the whole process up to that point, not of the table alone
+    """
+
+    def __init__(self, table_name, stage):
+        self.table_name = table_name
+        self.stage = stage
+        self.seconds = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.rows_rejected = 0
+        self.bytes = None
+        self.peak_rss_mb = None
+        # wall time including the time spent in the stages before it (for chunked tables, where stages interleave)
+        self.elapsed = 0.0
+
+    def add_bytes(self, count):
+        self.bytes = (self.bytes or 0) + count
+
+    def as_dict(self):
+        return {
+            "seconds": round(self.seconds, 4),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rows_rejected": self.rows_rejected,
+            "bytes": self.bytes,
+            "peak_rss_mb": self.peak_rss_mb
+        }
+
+
+class RunMetrics:
+    """
+    Class that records the metrics of every stage of every table in an ETL run, and writes the run report
+
+    Usage:
+        metrics = RunMetrics()
+        with metrics.stage("orders", "extract") as stage:
+            df = ...
+            stage.rows_out = len(df)
+        ...
+        metrics.write_report("etl_report.json")
+
+    Tables are processed by several threads at once, so new stages are registered under a lock.
+    """
+
+    def __init__(self):
+        self.started = datetime.now()
+        self._start_time = time.perf_counter()
+        self.stages = {} # (table_name, stage) -> StageMetrics
+        self._lock = threading.Lock()
+
+    def get(self, table_name, stage):
+        # the StageMetrics of a table's stage (created the first time)
+        with self._lock:
+            if (table_name, stage) not in self.stages:
+                self.stages[(table_name, stage)] = StageMetrics(table_name, stage)
+            return self.stages[(table_name, stage)]
+
+    @contextmanager
+    def stage(self, table_name, stage, upstream=None):
+        """
+        Times a stage of a table, and yields its StageMetrics so rows and bytes can be recorded
+
+        Arguments:
+            table_name, stage: the table and the stage (extract, transform or load)
+            upstream: StageMetrics of the stage feeding this one through a generator (chunked tables),
+                      the time spent in it while this stage runs is not counted as this stage's time
+        """
+
+        metrics = self.get(table_name, stage)
+        upstream_start = upstream.elapsed if upstream is not None else 0.0
+        start = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            elapsed = time.perf_counter() - start
+            upstream_elapsed = (upstream.elapsed - upstream_start) if upstream is not None else 0.0
+            metrics.elapsed += elapsed
+            metrics.seconds += elapsed - upstream_elapsed
+            metrics.peak_rss_mb = peak_rss_mb()
+
+    def track_chunks(self, chunks, table_name, stage, upstream=None):
+        """
+        Wraps a stream of chunks (e.g from Extractor.extract_from_db_chunks or Transformer.transform_chunks) to time
+        the stage producing them and count their rows, without changing the chunks
+
+        Arguments: see stage
+        Yields the chunks
+        """
+
+        metrics = self.get(table_name, stage)
+        iterator = iter(chunks)
+
+        while True:
+            with self.stage(table_name, stage, upstream):
+                chunk = next(iterator, None)
+            if chunk is None:
+                return
+            metrics.rows_out += len(chunk)
+            yield chunk
+
+    def report(self):
+        """
+        Returns the run report: the metrics of every stage of every table, the totals per stage and per table,
+        and the (table, stage) pairs that took the most time
+        """
+
+        tables = {}
+        for (table_name, stage), metrics in self.stages.items():
+            tables.setdefault(table_name, {})[stage] = metrics.as_dict()
+
+        for table_name, stages in tables.items():
+            stages["total_seconds"] = round(sum(stages[stage]["seconds"] for stage in STAGES if stage in stages), 4)
+
+        stage_totals = {
+            stage: {
+                "seconds": round(sum(m.seconds for m in self.stages.values() if m.stage == stage), 4),
+                "rows_out": sum(m.rows_out for m in self.stages.values() if m.stage == stage),
+                "rows_rejected": sum(m.rows_rejected for m in self.stages.values() if m.stage == stage)
+            }
+            for stage in STAGES
+        }
+
+        slowest = sorted(self.stages.values(), key=lambda m: m.seconds, reverse=True)[:5]
+
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "duration_seconds": round(time.perf_counter() - self._start_time, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": stage_totals,
+            "slowest": [{"table": m.table_name, "stage": m.stage, "seconds": round(m.seconds, 4)} for m in slowest],
+            "tables": tables
+        }
+
+    def write_report(self, path):
+        """
+        Writes the run report (see report) as JSON, and logs a short summary
+
+        Returns:
+                the report
+        """
+
+        report = self.report()
+        with open(path, "w") as f:
+            json.dump(report, f, indent=4)
+
+        for table_name, stages in report["tables"].items():
+            summary = ", ".join(f"{stage} {stages[stage]['seconds']:.2f}s ({stages[stage]['rows_out']} rows)"
+                                for stage in STAGES if stage in stages)
+            logger.info(f"{table_name}: {summary}")
+        logger.info(f"Run report written to {path}")
+        return report
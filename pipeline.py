@@ -0,0 +1,126 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# number of chunks that may wait between two stages (a full queue makes the stage before it wait, so at most about
+# queue_size + 1 chunks per stage are in memory at once, however large the table is)
+DEFAULT_QUEUE_SIZE = 2
+
+# put in the queue by a stage thread after its last chunk
+_DONE = object()
+
+
+class _Failure:
+    # put in the queue by a stage thread that raised an exception
+    def __init__(self, error):
+        self.error = error
+
+
+class QueueWait:
+    """
+    Time spent waiting on the queue of a pipelined stage, by the stage consuming from it
+
+    It has the elapsed attribute of a StageMetrics, so it can be passed as the upstream of metrics.RunMetrics.stage
+    and track_chunks: the time a stage waits for its next chunk is then not counted as time of the stage itself.
+    """
+
+    def __init__(self):
+        self.elapsed = 0.0
+
+
+def pipelined(chunks, name="stage", queue_size=DEFAULT_QUEUE_SIZE, wait=None):
+    """
+    Runs a stream of chunks (a generator doing the work of one stage, e.g extracting or transforming) in a thread
+    of its own, and yields its chunks in order through a bounded queue
+
+    Stages wrapped like this run at the same time: while the consumer works on chunk N, the stage is already
+    producing chunk N+1 (and chains of them overlap every stage, e.g extracting chunk N+1 while chunk N is
+    transformed and chunk N-1 is loaded). When the consumer is slower, the queue fills up and the stage waits
+    (backpressure), so memory stays capped at queue_size chunks per stage.
+
+    An exception raised by the stage is raised again in the consumer. When the consumer stops early
+    (e.g closes the generator), the stage is stopped after the chunk it is working on.
+
+    Arguments:
+        chunks: iterable of chunks (e.g Extractor.extract_from_db_chunks, Transformer.transform_chunks)
+        name: name of the stage, for the thread and the log
+        queue_size: max number of chunks waiting in the queue
+        wait: optional QueueWait the time the consumer spends waiting for chunks is added to
+
+    Yields the chunks
+    """
+
+    yield from merged([chunks], name, queue_size, wait)
+
+
+def merged(streams, name="stage", queue_size=DEFAULT_QUEUE_SIZE, wait=None):
+    """
+    Runs several streams of chunks at the same time, each in a thread of its own (e.g the key ranges of a table,
+    read over several connections), and yields their chunks through one bounded queue as they come in
+
+    The chunks of one stream stay in order, but the chunks of different streams are interleaved. Exceptions,
+    backpressure and stopping early work as in pipelined (which is merged with a single stream).
+
+    Arguments:
+        streams: list of iterables of chunks
+        name, queue_size, wait: see pipelined
+
+    Yields the chunks
+    """
+
+    chunk_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        # waits for room in the queue, unless the consumer has stopped. Returns False if it has
+        while not stop.is_set():
+            try:
+                chunk_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(chunks):
+        iterator = iter(chunks)
+        try:
+            for chunk in iterator:
+                if not put(chunk):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failure(e))
+        finally:
+            # a generator that was stopped early gets to clean up (e.g give its connection back to the pool)
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    threads = [threading.Thread(target=produce, args=(chunks,), name=f"pipeline-{name}-{i}", daemon=True)
+               for i, chunks in enumerate(streams)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        running = len(threads)
+        while running:
+            start = time.perf_counter()
+            item = chunk_queue.get()
+            if wait is not None:
+                wait.elapsed += time.perf_counter() - start
+
+            if item is _DONE:
+                running -= 1
+                continue
+            if isinstance(item, _Failure):
+                logger.error(f"Pipelined {name} stage failed: {item.error}")
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,324 @@
+import logging
+import polars as pl
+from transformer import REFERENCE_KEYS, REFERENCE_NAMES, SOURCE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+
+class PolarsTransformer:
+    """
+    Alternative transformer with the same interface as transformer.Transformer, built on Polars
+
+    Each table's cleaning, ID mapping and foreign key validation is written as one lazy query plan,
+    which Polars optimises and runs on all cores when it is collected. It takes (and returns) pandas
+    DataFrames like the Transformer, so the Extractor and Loader work with either engine.
+    """
+
+    def __init__(self):
+        # Initialize the PolarsTransformer with empty reference data containers
+        # each one is filled with {"keys": Series of unique keys, "names": frame of name -> key pairs or None} by add_reference_data
+        self.reference_data = {table_type: None for table_type in REFERENCE_KEYS}
+
+    def required_columns(self, table_type):
+        # the source columns the transformation of a table uses (see Transformer.required_columns)
+        return SOURCE_COLUMNS.get(table_type)
+
+    def add_reference_data(self, df, table_type, append=False):
+        """
+        Add reference data that other transformations might need (same as Transformer.add_reference_data)
+
+        Only the unique keys, and the name -> key pairs for tables looked up by name, are kept
+
+        Arguments:
+            df: pandas (or Polars) DataFrame containing reference data
+            table_type: Type of reference table (brands, categories, etc.)
+            append: if True, df is added to the existing reference data instead of replacing it
+        """
+
+        if df is None or len(df) == 0:
+            return
+
+        frame = self._to_polars(df)
+        key_column = REFERENCE_KEYS[table_type]
+        name_column = REFERENCE_NAMES.get(table_type)
+
+        keys = frame[key_column].drop_nulls()
+        names = None
+        if name_column is not None and name_column in frame.columns:
+            names = frame.select(pl.col(name_column).alias("name"), pl.col(key_column).alias("key")).drop_nulls("name")
+
+        # when a table is transformed in chunks, each chunk is appended to the existing reference data
+        existing = self.reference_data[table_type]
+        if append and existing is not None:
+            keys = pl.concat([existing["keys"], keys.cast(existing["keys"].dtype)])
+            if names is not None and existing["names"] is not None:
+                names = pl.concat([existing["names"], names], how="vertical_relaxed")
+
+        # like dict(zip(names, ids)), the last row wins if a name appears more than once
+        if names is not None:
+            names = names.unique(subset="name", keep="last", maintain_order=True)
+
+        self.reference_data[table_type] = {"keys": keys.unique().sort(), "names": names}
+        logger.debug(f"Added {table_type} reference data with {len(df)} records")
+
+    def transform(self, df, table_type):
+        """
+        Transforms a DataFrame based on its table type (same as Transformer.transform)
+
+        Arguments:
+                df: pandas (or Polars) DataFrame to be transformed
+                table_type: specific table type (ie. brands, stocks, categories ect)
+
+        Returns:
+                Transformed pandas DataFrame
+        """
+
+        if len(df) == 0:
+            logger.warning(f"Oops, received an empty Dataframe as arguemnt for {table_type} transformation")
+            return df
+
+        plans = {
+            "brands": self._plan_brands,
+            "categories": self._plan_categories,
+            "stores": self._plan_stores,
+            "staffs": self._plan_staffs,
+            "products": self._plan_products,
+            "stocks": self._plan_stocks,
+            "customers": self._plan_customers,
+            "orders": self._plan_orders,
+            "order_items": self._plan_order_items
+        }
+
+        if table_type not in plans:
+            logger.warning("Attention: Received unknown table type as argument. No transformation - returning original DataFrame")
+            return df
+
+        logger.debug(f"Initialising transformation of {table_type} data (Polars)")
+
+        # the whole plan is optimised and run at once, in parallel, when it is collected
+        transformed = plans[table_type](self._to_polars(df).lazy()).collect()
+        transformed = self._report_flags(transformed, table_type)
+
+        logger.debug(f"Transformed {transformed.height} rows of {table_type} records")
+        return transformed.to_pandas()
+
+    def transform_chunks(self, chunks, table_type):
+        """
+        Transforms a stream of DataFrame chunks one at a time (same as Transformer.transform_chunks)
+
+        Yields:
+                Transformed chunks (chunks where every row was removed are skipped)
+        """
+
+        for chunk in chunks:
+            transformed_chunk = self.transform(chunk, table_type)
+            if len(transformed_chunk) > 0:
+                yield transformed_chunk
+
+    ######## helpers ########
+
+    def _to_polars(self, df):
+        # the engine works on Polars frames, pandas frames from the Extractor are converted
+        if isinstance(df, pl.DataFrame):
+            return df
+        return pl.from_pandas(df)
+
+    def _has_reference(self, table_type):
+        return self.reference_data[table_type] is not None
+
+    def _is_valid_key(self, column, table_type):
+        # expression that is True where the value is a key of the reference table (False for nulls)
+        return pl.col(column).is_in(self.reference_data[table_type]["keys"]).fill_null(False)
+
+    def _lookup_keys(self, column, table_type):
+        # expression mapping names to keys with the name -> key pairs of the reference table (null where unknown)
+        names = self.reference_data[table_type]["names"]
+        return pl.col(column).replace_strict(names["name"], names["key"], default=None)
+
+    def _report_flags(self, frame, table_type):
+        # the plans mark fixed/removed rows with "_flag_..." columns, which are counted here and then dropped
+        flag_columns = [col for col in frame.columns if col.startswith("_flag_")]
+        for col in flag_columns:
+            count = frame[col].sum()
+            if count:
+                logger.warning(f"Attention: {count} {table_type} rows with {col[len('_flag_'):].replace('_', ' ')}")
+        return frame.drop(flag_columns)
+
+    def _strings(self, frame, columns):
+        # string columns: missing values become empty strings (as in the pandas Transformer)
+        return [pl.col(col).cast(pl.Utf8).fill_null("") for col in columns if col in frame.collect_schema().names()]
+
+    ######## table plans ########
+
+    #BRANDS
+
+    def _plan_brands(self, frame):
+        return frame.with_columns(
+            pl.col("brand_id").cast(pl.Int64),
+            pl.col("brand_name").cast(pl.Utf8)
+        )
+
+    #CATEGORIES
+
+    def _plan_categories(self, frame):
+        return frame.with_columns(
+            pl.col("category_id").cast(pl.Int64),
+            pl.col("category_name").cast(pl.Utf8)
+        )
+
+    #STORES
+
+    def _plan_stores(self, frame):
+        columns = frame.collect_schema()
+
+        # adding store_id (incrementing IDs starting from 1) if it doesn't exist, to be used as primary key
+        if "store_id" not in columns.names():
+            frame = frame.with_columns(pl.int_range(1, pl.len() + 1, dtype=pl.Int64).alias("store_id"))
+
+        string_columns = [name for name, dtype in columns.items() if dtype == pl.Utf8]
+        return frame.with_columns(
+            *[pl.col(col).cast(pl.Utf8) for col in string_columns],
+            pl.col("zip_code").cast(pl.Int64)
+        )
+
+    #STAFFS
+
+    def _plan_staffs(self, frame):
+        if "name" in frame.collect_schema().names():
+            frame = frame.rename({"name": "first_name"})
+
+        if "staff_id" not in frame.collect_schema().names():
+            frame = frame.with_columns(pl.int_range(1, pl.len() + 1, dtype=pl.Int64).alias("staff_id"))
+
+        # store_name -> store_id with the stores reference data
+        if "store_name" in frame.collect_schema().names() and self._has_reference("stores"):
+            frame = frame.with_columns(self._lookup_keys("store_name", "stores").alias("store_id")).drop("store_name")
+
+        # manager_id stays null for the top manager, the rest are integers
+        frame = frame.with_columns(
+            pl.col("manager_id").cast(pl.Float64, strict=False).cast(pl.Int64),
+            pl.col("active").cast(pl.Int64)
+        )
+
+        string_columns = [name for name, dtype in frame.collect_schema().items() if dtype == pl.Utf8]
+        return frame.with_columns(self._strings(frame, string_columns)).drop("street", strict=False)
+
+    #PRODUCTS
+
+    def _plan_products(self, frame):
+        frame = frame.with_columns(
+            pl.col("product_id").cast(pl.Int64),
+            pl.col("product_name").cast(pl.Utf8),
+            pl.col("brand_id").cast(pl.Float64, strict=False).cast(pl.Int64),
+            pl.col("category_id").cast(pl.Float64, strict=False).cast(pl.Int64),
+            pl.col("model_year").cast(pl.Int64),
+            pl.col("list_price").cast(pl.Float64, strict=False)
+        )
+
+        # invalid brand_id/category_id values are set to NULL
+        for column, table_type in [("brand_id", "brands"), ("category_id", "categories")]:
+            if self._has_reference(table_type):
+                invalid = ~self._is_valid_key(column, table_type)
+                frame = frame.with_columns(
+                    invalid.alias(f"_flag_invalid_{column}_set_to_NULL"),
+                    pl.when(invalid).then(None).otherwise(pl.col(column)).alias(column)
+                )
+
+        return frame
+
+    #STOCKS
+
+    def _plan_stocks(self, frame):
+        if "store_name" in frame.collect_schema().names() and self._has_reference("stores"):
+            frame = frame.with_columns(self._lookup_keys("store_name", "stores").alias("store_id")).drop("store_name")
+
+        frame = frame.with_columns(
+            pl.col("product_id").cast(pl.Int64),
+            pl.col("quantity").cast(pl.Int64)
+        )
+
+        # rows with a product_id that doesn't exist are removed
+        if self._has_reference("products"):
+            frame = frame.filter(self._is_valid_key("product_id", "products"))
+
+        return frame
+
+    #CUSTOMERS
+
+    def _plan_customers(self, frame):
+        frame = frame.with_columns(
+            pl.col("customer_id").cast(pl.Int64),
+            *self._strings(frame, ["first_name", "last_name", "phone", "email", "street", "city", "state"])
+        )
+
+        if "zip_code" in frame.collect_schema().names():
+            frame = frame.with_columns(pl.col("zip_code").cast(pl.Float64, strict=False).fill_null(0).cast(pl.Int64))
+
+        return frame
+
+    #ORDERS
+
+    def _plan_orders(self, frame):
+        schema = frame.collect_schema()
+
+        # dates are parsed from dd/mm/yyyy strings, unless they already arrived as dates (Arrow/Parquet extraction)
+        date_columns = []
+        for col in ["order_date", "required_date", "shipped_date"]:
+            if schema[col] in (pl.Utf8, pl.String):
+                date_columns.append(pl.col(col).str.to_date("%d/%m/%Y", strict=False).cast(pl.Datetime("ms")))
+            else:
+                date_columns.append(pl.col(col).cast(pl.Datetime("ms")))
+
+        frame = frame.with_columns(
+            pl.col("order_id").cast(pl.Int64),
+            pl.col("customer_id").cast(pl.Int64),
+            pl.col("order_status").cast(pl.Int64),
+            *date_columns
+        )
+
+        if "store" in schema.names() and self._has_reference("stores"):
+            frame = frame.with_columns(self._lookup_keys("store", "stores").alias("store_id")).drop("store")
+
+        if "staff_name" in schema.names() and self._has_reference("staffs"):
+            frame = frame.with_columns(self._lookup_keys("staff_name", "staffs").alias("staff_id")).drop("staff_name")
+
+        # orders with an invalid customer_id are kept, with customer_id set to NULL
+        if self._has_reference("customers"):
+            invalid = ~self._is_valid_key("customer_id", "customers")
+            frame = frame.with_columns(
+                invalid.alias("_flag_invalid_customer_id_set_to_NULL"),
+                pl.when(invalid).then(None).otherwise(pl.col("customer_id")).alias("customer_id")
+            )
+
+        return frame
+
+    #ORDER_ITEMS
+
+    def _plan_order_items(self, frame):
+        frame = frame.with_columns(
+            pl.col("order_id").cast(pl.Int64),
+            pl.col("product_id").cast(pl.Int64),
+            pl.col("quantity").cast(pl.Int64),
+            pl.col("list_price").cast(pl.Float64, strict=False),
+            pl.col("discount").cast(pl.Float64, strict=False)
+        )
+
+        # items of orders that don't exist are removed
+        if self._has_reference("orders"):
+            frame = frame.filter(self._is_valid_key("order_id", "orders"))
+
+        # invalid product_id's are set to NULL
+        if self._has_reference("products"):
+            invalid = ~self._is_valid_key("product_id", "products")
+            frame = frame.with_columns(
+                invalid.alias("_flag_invalid_product_id_set_to_NULL"),
+                pl.when(invalid).then(None).otherwise(pl.col("product_id")).alias("product_id")
+            )
+
+        # quantities must be at least 1, and discounts between 0 and 1
+        return frame.with_columns(
+            (pl.col("quantity") <= 0).alias("_flag_zero_or_negative_quantity_set_to_1"),
+            ((pl.col("discount") < 0) | (pl.col("discount") > 1)).alias("_flag_discount_outside_0_to_1_clipped"),
+            pl.when(pl.col("quantity") <= 0).then(1).otherwise(pl.col("quantity")).alias("quantity"),
+            pl.col("discount").clip(0, 1)
+        )
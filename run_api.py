@@ -1,6 +1,9 @@
 from typing import Union
+import io
+import json
+import threading
 import polars as pl
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from os.path import join
 
 app = FastAPI()
@@ -9,17 +12,137 @@ orders = pl.read_csv(join("data","orders.csv"))
 order_items = pl.read_csv(join("data","order_items.csv"))
 customers = pl.read_csv(join("data","customers.csv"))
 
+# column each endpoint is paginated on, the frames are kept sorted by it so pages are stable
+KEY_COLUMNS = {
+    "orders": "order_id",
+    "order_items": "order_id",
+    "customers": "customer_id"
+}
+
+# media types the endpoints can answer with (chosen from the Accept header of the request), JSON is the default
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# date columns (dd/mm/yyyy strings in the csv files) which are sent as real dates in the binary formats
+DATE_COLUMNS = {
+    "orders": ["order_date", "required_date", "shipped_date"]
+}
+
+orders = orders.sort(KEY_COLUMNS["orders"], maintain_order=True)
+order_items = order_items.sort(KEY_COLUMNS["order_items"], maintain_order=True)
+customers = customers.sort(KEY_COLUMNS["customers"], maintain_order=True)
+
+
+def paginate(frame, key_column, offset=0, limit=None, after_id=None, since=None):
+    """
+    Returns one page of a frame
+
+    Two kinds of pagination are supported:
+    - offset/limit: skips the first offset rows and returns (at most) limit rows
+    - after_id/limit (keyset): returns rows where key_column > after_id. A page never ends in the
+      middle of a key, so for order_items all items of an order are always on the same page
+
+    since (used for incremental extraction) limits the frame to rows where key_column > since,
+    before any pagination is applied.
+
+    Returns:
+            tuple (page, total number of rows after the since and after_id filters)
+    """
+
+    if since is not None:
+        frame = frame.filter(pl.col(key_column) > since)
+
+    if after_id is not None:
+        frame = frame.filter(pl.col(key_column) > after_id)
+
+    if limit is None:
+        return frame.slice(offset), frame.height
+
+    page = frame.slice(offset, limit)
+    if after_id is not None and page.height == limit:
+        # extending the page with the remaining rows that share the key of its last row
+        last_key = page[key_column][-1]
+        page = frame.slice(offset).filter(pl.col(key_column) <= last_key)
+
+    return page, frame.height
+
+
+# ETag of the data of each endpoint: endpoint -> (frame, etag), computed once per frame
+_etags = {}
+_etags_lock = threading.Lock()
+
+
+def etag(frame, endpoint):
+    """
+    Returns the ETag of an endpoint's data (a hash of all of its rows)
+
+    Every response of the endpoint carries it, whatever page was asked for, so a client can tell
+    whether the data has changed since it last extracted it (e.g to reuse a checkpoint of it).
+    """
+
+    with _etags_lock:
+        cached = _etags.get(endpoint)
+        if cached is None or cached[0] is not frame:
+            cached = (frame, f'"{frame.height}-{frame.hash_rows().sum():x}"')
+            _etags[endpoint] = cached
+        return cached[1]
+
+
+def respond(page, total_rows, request, endpoint, data_etag=None):
+    """
+    Serialises a page in the format asked for in the Accept header of the request
+
+    - application/vnd.apache.arrow.stream -> Arrow IPC stream
+    - application/vnd.apache.parquet -> Parquet file
+    - anything else -> JSON (a JSON string of the rows, as the endpoints have always returned)
+
+    The binary formats keep the column types, so date columns are sent as dates.
+    The total number of rows is sent in the X-Total-Count header, so a client can work out
+    how many pages there are and fetch them concurrently. The ETag of the endpoint's data (see etag) is sent along.
+    """
+
+    headers = {"X-Total-Count": str(total_rows)}
+    if data_etag is not None:
+        headers["ETag"] = data_etag
+    accept = request.headers.get("accept", "")
+
+    if ARROW_MEDIA_TYPE in accept or PARQUET_MEDIA_TYPE in accept:
+        date_columns = DATE_COLUMNS.get(endpoint, [])
+        if date_columns:
+            page = page.with_columns(pl.col(date_columns).str.to_date("%d/%m/%Y", strict=False))
+
+        buffer = io.BytesIO()
+        if ARROW_MEDIA_TYPE in accept:
+            page.write_ipc_stream(buffer)
+            media_type = ARROW_MEDIA_TYPE
+        else:
+            page.write_parquet(buffer)
+            media_type = PARQUET_MEDIA_TYPE
+        return Response(content=buffer.getvalue(), media_type=media_type, headers=headers)
+
+    return Response(content=json.dumps(page.write_json()), media_type="application/json", headers=headers)
+
+
 @app.get("/orders")
-def read_orders():
-    return orders.write_json()
+def read_orders(request: Request, offset: int = 0, limit: Union[int, None] = None, after_id: Union[int, None] = None,
+                since: Union[int, None] = None):
+    page, total_rows = paginate(orders, KEY_COLUMNS["orders"], offset, limit, after_id, since)
+    return respond(page, total_rows, request, "orders", etag(orders, "orders"))
 
 @app.get("/order_items")
-def read_order_items():
-    return order_items.write_json()
+def read_order_items(request: Request, offset: int = 0, limit: Union[int, None] = None, after_id: Union[int, None] = None,
+                     since: Union[int, None] = None):
+    page, total_rows = paginate(order_items, KEY_COLUMNS["order_items"], offset, limit, after_id, since)
+    return respond(page, total_rows, request, "order_items", etag(order_items, "order_items"))
 
 @app.get("/customers")
-def read_customers():
-    return customers.write_json()
+def read_customers(request: Request, offset: int = 0, limit: Union[int, None] = None, after_id: Union[int, None] = None,
+                   since: Union[int, None] = None):
+    page, total_rows = paginate(customers, KEY_COLUMNS["customers"], offset, limit, after_id, since)
+    return respond(page, total_rows, request, "customers", etag(customers, "customers"))
 
 # to start API run "fastapi run run_api.py" in terminal
-# can then access API at localhost:8000/docs
\ No newline at end of file
+# can then access API at localhost:8000/docs
+# pages can be requested with e.g localhost:8000/orders?offset=1000&limit=500 or localhost:8000/orders?after_id=1500&limit=500
+# only rows newer than a watermark can be requested with e.g localhost:8000/orders?since=1500
+# send "Accept: application/vnd.apache.arrow.stream" (or application/vnd.apache.parquet) to get a binary columnar response
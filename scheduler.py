@@ -0,0 +1,186 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+
+# default number of tables that may be processed at once for each kind of source
+# (the ProductDB and the API are shared servers, so they get a cap, csv files are local)
+DEFAULT_SOURCE_LIMITS = {
+    "db": 2,
+    "csv": 2,
+    "api": 3
+}
+
+
+class TableScheduler:
+    """
+    Class that runs the ETL of every table as a DAG (directed acyclic graph) of tasks
+
+    Each table declares the tables it depends on ("depends_on"), and as soon as all of
+    those are done the table is handed to a worker thread. This means that independent
+    tables (e.g brands, categories and stores) are processed at the same time instead of
+    one after another.
+
+    - the number of tables running at once is capped per source type (db, csv, api)
+    - the measured duration of each table is used to report the critical path of the run
+    """
+
+    def __init__(self, tables, max_workers=4, source_limits=None):
+        """
+        Initialises the scheduler and validates the declared dependencies
+
+        Arguments:
+            tables: list of table dicts, each with "name", "type" and optionally "depends_on"
+            max_workers: size of the worker pool
+            source_limits: dict with the max number of concurrent tables per source type
+
+        """
+
+        self.tables = {table_info["name"]: table_info for table_info in tables}
+        self.max_workers = max_workers
+        self.source_limits = dict(DEFAULT_SOURCE_LIMITS)
+        if source_limits:
+            self.source_limits.update(source_limits)
+
+        # filled in while running
+        self.durations = {}
+        self.results = {}
+
+        # making sure every dependency is a known table and that there are no cycles
+        for name, table_info in self.tables.items():
+            for dependency in self._dependencies(name):
+                if dependency not in self.tables:
+                    raise ValueError(f"Table {name} depends on unknown table {dependency}")
+        self.order = self._topological_order()
+
+    def _dependencies(self, name):
+        return self.tables[name].get("depends_on", [])
+
+    def _topological_order(self):
+        """
+        Orders the tables so that every table comes after its dependencies (Kahn's algorithm)
+
+        Returns:
+                list of table names
+        """
+
+        remaining = {name: set(self._dependencies(name)) for name in self.tables}
+        order = []
+
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Circular dependency between tables: {sorted(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+        return order
+
+    def run(self, task):
+        """
+        Runs task(table_info) for every table, starting each one as soon as its dependencies are done
+
+        Arguments:
+                task: callable taking a table dict and returning True if the table was processed successfully
+
+        Returns:
+                dict mapping table name -> result of the task
+        """
+
+        pending = {name: set(self._dependencies(name)) for name in self.tables}
+        running_per_source = {}
+        futures = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or futures:
+
+                # submit every ready table, in dependency order, as long as its source has a free slot
+                for name in [name for name in self.order if name in pending and not pending[name]]:
+                    if len(futures) >= self.max_workers:
+                        break
+                    source = self.tables[name]["type"]
+                    if running_per_source.get(source, 0) >= self.source_limits.get(source, self.max_workers):
+                        continue
+                    running_per_source[source] = running_per_source.get(source, 0) + 1
+                    del pending[name]
+                    futures[pool.submit(self._timed, task, self.tables[name])] = name
+
+                if not futures:
+                    # nothing running and nothing could be started -> should not happen with a valid DAG
+                    raise RuntimeError(f"Scheduler stalled with pending tables: {sorted(pending)}")
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures.pop(future)
+                    running_per_source[self.tables[name]["type"]] -= 1
+
+                    # an exception stops the run: nothing new is started and the error is raised
+                    # once the tables that are already running have finished
+                    if future.exception() is not None:
+                        pending.clear()
+                        wait(futures)
+                        raise future.exception()
+
+                    self.results[name] = future.result()
+                    for deps in pending.values():
+                        deps.discard(name)
+
+        return self.results
+
+    def _timed(self, task, table_info):
+        # wraps the task so that the wall time of each table is recorded
+        start = time.perf_counter()
+        try:
+            return task(table_info)
+        finally:
+            self.durations[table_info["name"]] = time.perf_counter() - start
+
+    def critical_path(self):
+        """
+        Finds the chain of dependent tables that took the longest in total
+
+        This chain is what bounds the wall time of the whole run, so it is where speeding
+        up a single table actually pays off.
+
+        Returns:
+                tuple (list of table names along the path, total seconds)
+        """
+
+        # longest path ending in each table, computed in topological order
+        finish = {}
+        previous = {}
+        for name in self.order:
+            best_dependency = None
+            best_time = 0.0
+            for dependency in self._dependencies(name):
+                if finish[dependency] > best_time:
+                    best_dependency = dependency
+                    best_time = finish[dependency]
+            finish[name] = best_time + self.durations.get(name, 0.0)
+            previous[name] = best_dependency
+
+        if not finish:
+            return [], 0.0
+
+        # walking back from the table that finished last
+        last = max(finish, key=finish.get)
+        path = []
+        while last is not None:
+            path.append(last)
+            last = previous[last]
+        path.reverse()
+
+        return path, finish[path[-1]]
+
+    def log_report(self):
+        # logs the duration of each table and the critical path
+        durations = ", ".join(f"{name}: {self.durations[name]:.2f}s" for name in self.order if name in self.durations)
+        logger.info(f"Table durations: {durations}")
+
+        path, total = self.critical_path()
+        logger.info(f"Critical path: {' -> '.join(path)} ({total:.2f}s)")
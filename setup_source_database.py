@@ -1,26 +1,44 @@
+import argparse
+import time
 import mysql.connector
-import pandas as pd
-import json
+from db_connection import load_credentials
+from data_generator import generate_dataset
 
 
+# the ProductDB tables and their columns, in the order they're loaded
+PRODUCTDB_TABLES = {
+    "brands": ["brand_id", "brand_name"],
+    "categories": ["category_id", "category_name"],
+    "products": ["product_id", "product_name", "brand_id", "category_id", "model_year", "list_price"],
+    "stocks": ["store_name", "product_id", "quantity"]
+}
 
-def setup_source_database():
+# number of rows sent per INSERT (mysql-connector turns an executemany of an INSERT into one multi-row INSERT)
+SEED_BATCH_SIZE = 10000
+
+
+def setup_source_database(scale=1, data_dir="data", batch_size=SEED_BATCH_SIZE):
     """
     This function sets up the source database (ProductDB) by creating it
     and its tables, then loading data from the CSV files..
+    
+    Arguments:
+        scale: the sample data is loaded scale times, with the keys of every copy shifted (see data_generator.py),
+               e.g 1000 gives a ProductDB of ~320 000 products and ~940 000 stocks rows for load testing
+        data_dir: directory with the sample csv files
+        batch_size: number of rows inserted per statement
     """
 
     print("Setting up source database (ProductDB)...")
     
     try:        
-        with open("cred_info.json") as f:
-            content = f.read()
-            json_content = json.loads(content)
+        # credentials are read from cred_info.json (see db_connection.py)
+        credentials = load_credentials()
         #connect to the MySQL server (note: without specifying a database)
         conn = mysql.connector.connect(
-            host = json_content["host"],
-            user = json_content["user"],
-            password = json_content["password"]
+            host = credentials["host"],
+            user = credentials["user"],
+            password = credentials["password"]
             )
             
         
@@ -88,59 +106,22 @@ def setup_source_database():
         conn.commit()
         print("Tables created successfully in ProductDB.")
         
-        # Nnext load data from CSV files
-        print("\nLoading data from CSV files into ProductDB...")
-        
-        # Load brands data
-        try:
-            brands_df = pd.read_csv('data\\brands.csv')
-            for _, row in brands_df.iterrows():
-                cursor.execute(
-                    "INSERT INTO brands (brand_id, brand_name) VALUES (%s, %s)",
-                    (row['brand_id'], row['brand_name'])
-                )
-            print(f"Loaded {len(brands_df)} records into brands table")
-        except Exception as e:
-            print(f"Error loading brands data: {e}")
-        
-        # Load categories data
-        try:
-            categories_df = pd.read_csv('data\\categories.csv')
-            for _, row in categories_df.iterrows():
-                cursor.execute(
-                    "INSERT INTO categories (category_id, category_name) VALUES (%s, %s)",
-                    (row['category_id'], row['category_name'])
-                )
-            print(f"Loaded {len(categories_df)} records into categories table")
-        except Exception as e:
-            print(f"Error loading categories data: {e}")
-        
-        # load products data
-        try:
-            products_df = pd.read_csv('data\\products.csv')
-            for _, row in products_df.iterrows():
-                cursor.execute(
-                    "INSERT INTO products (product_id, product_name, brand_id, category_id, model_year, list_price) VALUES (%s, %s, %s, %s, %s, %s)",
-                    (row['product_id'], row['product_name'], row['brand_id'], row['category_id'], row['model_year'], row['list_price'])
-                )
-            print(f"Loaded {len(products_df)} records into products table")
-        except Exception as e:
-            print(f"Error loading products data: {e}")
-        
-        # load stocks data
-        try:
-            stocks_df = pd.read_csv('data\\stocks.csv')
-            for _, row in stocks_df.iterrows():
-                cursor.execute(
-                    "INSERT INTO stocks (store_name, product_id, quantity) VALUES (%s, %s, %s)",
-                    (row['store_name'], row['product_id'], row['quantity'])
-                )
-            print(f"Loaded {len(stocks_df)} records into stocks table")
-        except Exception as e:
-            print(f"Error loading stocks data: {e}")
-        
-        # commit all the data insertions
-        conn.commit()
+        # Nnext load data from CSV files (scaled up, with consistent keys, when scale > 1)
+        print(f"\nLoading data from CSV files into ProductDB (scale {scale})...")
+        dataset = generate_dataset(scale, data_dir, tables=list(PRODUCTDB_TABLES))
+        
+        # the rows are consistent by construction, so foreign and unique keys aren't checked row by row while seeding
+        cursor.execute("SET SESSION foreign_key_checks = 0, SESSION unique_checks = 0")
+        
+        for table_name, columns in PRODUCTDB_TABLES.items():
+            try:
+                start = time.perf_counter()
+                insert_rows(conn, cursor, table_name, dataset[table_name], columns, batch_size)
+                print(f"Loaded {len(dataset[table_name])} records into {table_name} table ({time.perf_counter() - start:.1f}s)")
+            except Exception as e:
+                print(f"Error loading {table_name} data: {e}")
+        
+        cursor.execute("SET SESSION foreign_key_checks = 1, SESSION unique_checks = 1")
         print("All data loaded successfully into ProductDB")
         
         # close the connection and cursor
@@ -156,9 +137,30 @@ def setup_source_database():
             conn.close()
         return False
 
+def insert_rows(conn, cursor, table_name, df, columns, batch_size=SEED_BATCH_SIZE):
+    """
+    Inserts the rows of a df into a table in batches of batch_size rows, each committed on its own
+    """
+    
+    # missing values are sent as NULL, and numpy values as plain Python values (which mysql-connector can convert)
+    df = df[columns].astype(object)
+    rows = list(df.where(df.notna(), None).itertuples(index=False, name=None))
+    
+    query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany(query, rows[start:start + batch_size])
+        conn.commit()
+
 #  allows the script to be run directly
 if __name__ == "__main__":
-    success = setup_source_database()
+    parser = argparse.ArgumentParser(description="Creates ProductDB and loads the sample data into it")
+    parser.add_argument("--scale", type=int, default=1,
+                        help="load the sample data this many times, with consistent keys (e.g 1000 for load testing)")
+    parser.add_argument("--data-dir", default="data", help="directory with the sample csv files")
+    parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE, help="number of rows inserted per statement")
+    args = parser.parse_args()
+    
+    success = setup_source_database(args.scale, args.data_dir, args.batch_size)
     if success:
         print("\nSuccess: Source database (ProductDB) is set up and ready.")
     else:
@@ -1,5 +1,5 @@
 import mysql.connector
-import json
+from db_connection import load_credentials
 
 def create_bikecorp_db():
     """
@@ -12,14 +12,13 @@ def create_bikecorp_db():
 
     # first attempt to connect to the mySQL server itself:
     try:        
-        with open("cred_info.json") as f:
-            content = f.read()
-            json_content = json.loads(content)
+        # credentials are read from cred_info.json (see db_connection.py)
+        credentials = load_credentials()
         #connect to the MySQL server (note: without specifying a database)
         conn = mysql.connector.connect(
-            host = json_content["host"],
-            user = json_content["user"],
-            password = json_content["password"]
+            host = credentials["host"],
+            user = credentials["user"],
+            password = credentials["password"]
             )
 
         #creates cursor to execute sql commands
@@ -40,6 +39,9 @@ def create_bikecorp_db():
         --> Table creation step <--
         Be mindful of the order of table creation to ensure correct key relationships
         "Parent" tables must be created before "child" tables that reference them..
+
+        Every table has a row_hash column, a hash of the content of the row set by the Loader,
+        which lets merge loads skip the rows that haven't changed since they were loaded
         """
 
         # BRANDS table (based on ProductDB data)
@@ -47,7 +49,8 @@ def create_bikecorp_db():
         cursor.execute("""
         CREATE TABLE brands (
         brand_id INT PRIMARY KEY,
-        brand_name VARCHAR(255) NOT NULL
+        brand_name VARCHAR(255) NOT NULL,
+        row_hash BIGINT
         ) COMMENT 'Stores bike brand information, sourced from ProductDB'
         """)
 
@@ -57,7 +60,8 @@ def create_bikecorp_db():
         cursor.execute("""
         CREATE TABLE categories (
             category_id INT PRIMARY KEY,
-            category_name VARCHAR(255) NOT NULL
+            category_name VARCHAR(255) NOT NULL,
+            row_hash BIGINT
         ) COMMENT 'Stores bike category information soruced from ProductDB'
         """)
 
@@ -74,7 +78,8 @@ def create_bikecorp_db():
             street VARCHAR(255),
             city VARCHAR (255),
             state VARCHAR (255),
-            zip_code int
+            zip_code int,
+            row_hash BIGINT
         ) COMMENT 'Stores information about store locations sourced from flat CSV file'
         """)
 
@@ -90,6 +95,7 @@ def create_bikecorp_db():
             category_id INT,
             model_year INT,
             list_price DECIMAL(10, 2),
+            row_hash BIGINT,
             FOREIGN KEY (brand_id) REFERENCES brands(brand_id),
             FOREIGN KEY (category_id) REFERENCES categories(category_id)
         ) COMMENT 'Stores product information sourced from ProductDB'
@@ -112,6 +118,7 @@ def create_bikecorp_db():
             active TINYINT DEFAULT 1,
             store_id INT,
             manager_id INT,
+            row_hash BIGINT,
             FOREIGN KEY (store_id) REFERENCES stores(store_id),
             FOREIGN KEY (manager_id) REFERENCES staffs(staff_id)
         ) COMMENT 'Stores staff information sourced from flat CSV file'
@@ -130,6 +137,7 @@ def create_bikecorp_db():
             store_id INT,
             product_id INT,
             quantity INT NOT NULL,
+            row_hash BIGINT,
             PRIMARY KEY(store_id, product_id),
             FOREIGN KEY (store_id) REFERENCES stores(store_id),
             FOREIGN KEY (product_id) REFERENCES products(product_id)
@@ -148,7 +156,8 @@ def create_bikecorp_db():
             street VARCHAR(255),
             city VARCHAR(255),
             state VARCHAR(10),
-            zip_code INT
+            zip_code INT,
+            row_hash BIGINT
         ) COMMENT 'Stores customer information sourced from API'
         """)
 
@@ -165,6 +174,7 @@ def create_bikecorp_db():
             shipped_date DATE,
             store_id INT,
             staff_id INT,
+            row_hash BIGINT,
             FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
             FOREIGN KEY (store_id) REFERENCES stores(store_id),
             FOREIGN KEY (staff_id) REFERENCES staffs(staff_id)
@@ -183,6 +193,7 @@ def create_bikecorp_db():
             quantity INT NOT NULL,
             list_price DECIMAL(10, 2) NOT NULL,
             discount DECIMAL(4, 2) NOT NULL DEFAULT 0,
+            row_hash BIGINT,
             PRIMARY KEY (order_id, item_id),
             FOREIGN KEY (order_id) REFERENCES orders(order_id),
             FOREIGN KEY (product_id) REFERENCES products(product_id)
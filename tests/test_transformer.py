@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pandas as pd
+
+# the ETL modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transformer
+from transformer import Transformer
+
+
+def test_parse_dates_across_the_cache_limit(monkeypatch):
+    # the second column has dates that were cached by the first one and new ones that make the cache overflow,
+    # so the cache is emptied while the column still needs the dates that were in it
+    monkeypatch.setattr(transformer, "DATE_CACHE_LIMIT", 5)
+    monkeypatch.setattr(transformer, "DATE_CACHE", {})
+    parser = Transformer()
+
+    first = pd.Series(["01/01/2020", "02/01/2020", "03/01/2020", "04/01/2020"])
+    second = pd.Series(["03/01/2020", "04/01/2020", "05/01/2020", "06/01/2020", None, "not a date"])
+
+    parser._parse_dates(first)
+    parsed = parser._parse_dates(second)
+
+    expected = pd.to_datetime(second, format="%d/%m/%Y", errors="coerce")
+    pd.testing.assert_series_equal(parsed, expected, check_names=False)
+    assert len(transformer.DATE_CACHE["%d/%m/%Y"]) <= 5
+
+
+def test_copy_free_transform_restores_copy_on_write():
+    # copy-on-write is only switched on while the df is transformed, the setting of the process is left as it was
+    previous = pd.get_option("mode.copy_on_write")
+    brands = pd.DataFrame({"brand_id": [1, 2], "brand_name": [" Trek ", "electra"]})
+
+    transformed = Transformer(copy_free=True).transform(brands, "brands")
+
+    assert pd.get_option("mode.copy_on_write") == previous
+    assert len(transformed) == 2
@@ -1,5 +1,129 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
+from multiprocessing import shared_memory
+import numpy as np
 import pandas as pd
 
+try:
+    # pyarrow backed strings take far less memory than Python string objects, the default string dtype is used without it
+    import pyarrow
+    TEXT_DTYPE = "string[pyarrow]"
+except ImportError:
+    TEXT_DTYPE = "string"
+
+logger = logging.getLogger(__name__)
+
+
+# key column of each reference table, the values other tables are validated against
+REFERENCE_KEYS = {
+    "brands": "brand_id",
+    "categories": "category_id",
+    "stores": "store_id",
+    "staffs": "staff_id",
+    "products": "product_id",
+    "customers": "customer_id",
+    "orders": "order_id"
+}
+
+# name column of the reference tables that other tables refer to by name instead of by key
+# (staff_name in orders corresponds to first_name in staffs)
+REFERENCE_NAMES = {
+    "stores": "name",
+    "staffs": "first_name"
+}
+
+
+# columns of the ProductDB tables each transformation uses, only these are extracted from the source database
+# (see Transformer.required_columns). A column added to the source tables isn't sent over the wire until a
+# transformation needs it and it's added here
+SOURCE_COLUMNS = {
+    "brands": ["brand_id", "brand_name"],
+    "categories": ["category_id", "category_name"],
+    "products": ["product_id", "product_name", "brand_id", "category_id", "model_year", "list_price"],
+    "stocks": ["store_name", "product_id", "quantity"]
+}
+
+
+# compact dtypes of the transformed tables (used in compact mode), following the column types of BikeCorpDB
+# (setup_target_database.py): INT -> int32, TINYINT -> int8, nullable INT (foreign keys) -> Int32, low cardinality
+# VARCHAR -> category, other VARCHAR -> TEXT_DTYPE. DECIMAL columns stay float64 and DATE columns datetime64
+COMPACT_DTYPES = {
+    "brands": {"brand_id": "int32", "brand_name": TEXT_DTYPE},
+    "categories": {"category_id": "int32", "category_name": TEXT_DTYPE},
+    "stores": {"store_id": "int32", "name": "category", "phone": TEXT_DTYPE, "email": TEXT_DTYPE, "street": TEXT_DTYPE,
+               "city": "category", "state": "category", "zip_code": "int32"},
+    "staffs": {"staff_id": "int32", "first_name": TEXT_DTYPE, "last_name": TEXT_DTYPE, "email": TEXT_DTYPE,
+               "phone": TEXT_DTYPE, "active": "int8", "store_id": "Int32", "manager_id": "Int32"},
+    "products": {"product_id": "int32", "product_name": TEXT_DTYPE, "brand_id": "Int32", "category_id": "Int32",
+                 "model_year": "int32"},
+    "stocks": {"store_id": "Int32", "product_id": "int32", "quantity": "int32"},
+    "customers": {"customer_id": "int32", "first_name": TEXT_DTYPE, "last_name": TEXT_DTYPE, "phone": TEXT_DTYPE,
+                  "email": TEXT_DTYPE, "street": TEXT_DTYPE, "city": "category", "state": "category", "zip_code": "int32"},
+    "orders": {"order_id": "int32", "customer_id": "Int32", "order_status": "int8", "store_id": "Int32", "staff_id": "Int32"},
+    "order_items": {"order_id": "int32", "item_id": "int32", "product_id": "Int32", "quantity": "int32"}
+}
+
+
+# format of the dates in the orders source data (dd/mm/yyyy)
+DATE_FORMAT = "%d/%m/%Y"
+
+# parsed dates, per format: date string -> numpy datetime64
+# shared by all columns, chunks and Transformer instances of the process, since the same days keep coming back
+DATE_CACHE = {}
+
+# the cache of a format is emptied when it grows past this many strings (in case of many distinct, e.g invalid, values)
+DATE_CACHE_LIMIT = 100000
+
+# tables that can be transformed in partitions by a pool of worker processes, and the key column they're split on
+# (rows with the same key always end up in the same partition. stores and staffs number their rows, so they can't be split)
+PARTITION_KEYS = {
+    "products": "product_id",
+    "stocks": "product_id",
+    "customers": "customer_id",
+    "orders": "order_id",
+    "order_items": "order_id"
+}
+
+# frames with fewer rows are transformed in one go, starting the worker processes would cost more than it saves
+PARTITION_MIN_ROWS = 200000
+
+# the Transformer of a worker process, set up once per process by _init_partition_worker
+_worker_state = {}
+
+
+# number of copy_on_write blocks that are running (in any thread), and the copy-on-write setting from before the first one
+_copy_on_write_state = {"users": 0, "previous": None}
+_copy_on_write_lock = threading.Lock()
+
+
+@contextmanager
+def copy_on_write():
+    """
+    Switches pandas copy-on-write on while the block runs
+
+    The option is process-wide, so blocks running at the same time in several threads share it: it's switched on by
+    the first block that starts, and set back to what it was before when the last one ends.
+    (pd.option_context would set it back when the first block ends, while the others still rely on it)
+    """
+
+    with _copy_on_write_lock:
+        if _copy_on_write_state["users"] == 0:
+            _copy_on_write_state["previous"] = pd.get_option("mode.copy_on_write")
+            pd.set_option("mode.copy_on_write", True)
+        _copy_on_write_state["users"] += 1
+    try:
+        yield
+    finally:
+        with _copy_on_write_lock:
+            _copy_on_write_state["users"] -= 1
+            if _copy_on_write_state["users"] == 0:
+                pd.set_option("mode.copy_on_write", _copy_on_write_state["previous"])
+
+
 class Transformer:
     """
     Class with the purpose of transforming data from different sources
@@ -7,8 +131,30 @@ class Transformer:
     Handles datacleaning, typeconversion and standardisation
     """
     
-    def __init__(self):
+    def __init__(self, copy_free=False, date_unit=None, compact=False, workers=1):
+        """
+        Arguments:
+            copy_free: if True, the transformations take ownership of the DataFrames they are given instead of
+                       copying them first. pandas copy-on-write is switched on while a df is transformed (see
+                       copy_on_write), so the transformed df shares every column it doesn't modify with the
+                       extracted df, and a column is only copied when it is changed. The caller must not use the
+                       df after transforming it.
+            date_unit: resolution of the parsed date columns, e.g "s" for datetime64[s] which is enough for dates
+                       (pandas supports "s", "ms", "us" and "ns", not days). None keeps the default (ns)
+            compact: if True, the transformed frames get the compact dtypes of COMPACT_DTYPES (small ints,
+                     categoricals and Arrow backed strings) instead of int64/float64/object columns
+            workers: number of processes large frames (PARTITION_MIN_ROWS rows or more) of the tables in
+                     PARTITION_KEYS are transformed by, each one transforming a key range of the frame
+                     (see _transform_partitioned). 1 transforms every frame in the calling process
+        """
+        
+        self.copy_free = copy_free
+        self.date_unit = date_unit
+        self.compact = compact
+        self.workers = workers
+        
          # Initialize the Transformer with empty reference data containers
+         # each one is filled with a compact lookup index by add_reference_data (see _build_reference_index)
          
         self.reference_data = {
             "brands": None,
@@ -19,23 +165,145 @@ class Transformer:
             "customers": None,
             "orders": None
         }
-    def add_reference_data(self, df, table_type):
+        
+    def required_columns(self, table_type):
+        """
+        Returns the list of source columns the transformation of a table uses (see SOURCE_COLUMNS),
+        or None if it isn't declared (then every column is extracted)
+        """
+        
+        return SOURCE_COLUMNS.get(table_type)
+        
+    def add_reference_data(self, df, table_type, append=False):
         """
-        Add a reference DataFrame that other transformations might need.
+        Add reference data that other transformations might need.
         
-        Saves a copy each type of reference data as a df (self.reference_data)
+        Instead of keeping a copy of the whole df, only lookup indexes are kept (self.reference_data):
+        - "keys": a pandas Index of the unique key values (e.g all brand_id's), used to validate foreign keys
+        - "names": a Series mapping names to keys (e.g store name -> store_id), for tables looked up by name
+        The indexes are built once here, so transformations don't have to rebuild sets/dicts on every call.
         
         Arguments:
             df: pandas DataFrame containing reference data
             table_type: Type of reference table (brands, categories, etc.)
+            append: if True, df is added to the existing reference data instead of replacing it
             
         """
         
         
         if df is not None and not df.empty:
-            self.reference_data[table_type] = df.copy()
-            print(f"Added {table_type} reference data with {len(df)} records")
+            reference = self._build_reference_index(df, table_type)
+            
+            # when a table is transformed in chunks, each chunk is appended to the existing reference data
+            if append and self.reference_data[table_type] is not None:
+                existing = self.reference_data[table_type]
+                reference["keys"] = existing["keys"].append(reference["keys"]).unique().sort_values()
+                if reference["names"] is not None:
+                    names = pd.concat([existing["names"], reference["names"]])
+                    reference["names"] = names[~names.index.duplicated(keep="last")]
             
+            self.reference_data[table_type] = reference
+            logger.debug(f"Added {table_type} reference data with {len(df)} records")
+
+    def _build_reference_index(self, df, table_type):
+        # builds the lookup indexes of a reference table (see add_reference_data)
+        key_column = REFERENCE_KEYS[table_type]
+        keys = pd.Index(df[key_column].dropna().unique()).sort_values()
+        
+        names = None
+        if table_type in REFERENCE_NAMES and REFERENCE_NAMES[table_type] in df.columns:
+            # like dict(zip(names, ids)), the last row wins if a name appears more than once
+            names = pd.Series(df[key_column].to_numpy(), index=df[REFERENCE_NAMES[table_type]].to_numpy())
+            names = names[~names.index.duplicated(keep="last")]
+        
+        return {"keys": keys, "names": names}
+    
+    def _working_copy(self, df):
+        # the df a transformation works on: a full copy, or in copy-free mode a shallow one
+        # (with copy-on-write, modifying a column of the shallow copy never changes the original df)
+        if self.copy_free:
+            return df.copy(deep=False)
+        return df.copy()
+    
+    def _parse_dates(self, values, date_format=DATE_FORMAT):
+        """
+        Parses a column of date strings, parsing every distinct string only once
+        
+        The column is factorized into codes + unique strings, only the strings that aren't in DATE_CACHE yet
+        are parsed (with pd.to_datetime, invalid dates become NaT), and the parsed dates are mapped back to the
+        rows with the codes. Orders only span a limited set of days, so most columns are (almost) all cache hits.
+        
+        Arguments:
+            values: Series of date strings
+            date_format: format of the strings
+            
+        Returns:
+            datetime64 Series (in self.date_unit if set), NaT where the value is missing or not a valid date
+        """
+        
+        codes, uniques = pd.factorize(values) # missing values get code -1
+        
+        cache = DATE_CACHE.setdefault(date_format, {})
+        # the dates of this column are collected in a dict of their own, so emptying the cache (here, or in another
+        # thread) can't lose a date this column still needs
+        dates = {}
+        new_strings = []
+        for value in uniques:
+            date = cache.get(value)
+            if date is None:
+                new_strings.append(value)
+            else:
+                dates[value] = date
+        
+        if new_strings:
+            parsed = pd.to_datetime(pd.Index(new_strings, dtype=object), format=date_format, errors="coerce")
+            new_dates = dict(zip(new_strings, parsed.to_numpy()))
+            dates.update(new_dates)
+            if len(cache) + len(new_dates) > DATE_CACHE_LIMIT:
+                cache.clear()
+            cache.update(new_dates)
+        
+        # one extra NaT at the end, which code -1 (missing value) picks
+        # (the unit is set on the unique dates, before they're spread out over the rows)
+        unit = self.date_unit or "ns"
+        parsed_uniques = np.array([dates[value] for value in uniques] + [np.datetime64("NaT")], dtype=f"datetime64[{unit}]")
+        
+        return pd.Series(parsed_uniques[codes], index=values.index, name=values.name)
+    
+    def _apply_compact_dtypes(self, df, table_type):
+        """
+        Converts the columns of a transformed df to the compact dtypes of COMPACT_DTYPES
+        
+        Missing text becomes an empty string (as the string columns are standardised in the transformations),
+        so the converted frame holds the same values, and gets the same row hashes, as the uncompacted one.
+        """
+        
+        converted = {}
+        for col, dtype in COMPACT_DTYPES.get(table_type, {}).items():
+            if col not in df.columns:
+                continue
+            
+            if dtype in (TEXT_DTYPE, "category"):
+                text = df[col].astype(TEXT_DTYPE).fillna("")
+                converted[col] = text.astype("category") if dtype == "category" else text
+            else:
+                converted[col] = df[col].astype(dtype)
+        
+        return df.assign(**converted)
+    
+    def _has_reference(self, table_type):
+        # True if reference data has been added for the table
+        return self.reference_data[table_type] is not None
+    
+    def _invalid_keys(self, values, table_type):
+        # boolean Series that is True where a value is not a key of the reference table
+        # get_indexer looks every value up in the (already built) hash table of the key index at once, -1 = not found
+        positions = self.reference_data[table_type]["keys"].get_indexer(values)
+        return pd.Series(positions < 0, index=values.index)
+    
+    def _lookup_keys(self, names, table_type):
+        # maps names to keys with the name index of the reference table (NaN where the name is unknown)
+        return names.map(self.reference_data[table_type]["names"])
             
     def transform(self, df, table_type):
         """
@@ -51,40 +319,142 @@ class Transformer:
         """
         
         if df.empty:
-            print(f"Oops, received an empty Dataframe as arguemnt for {table_type} transformation")
+            logger.warning(f"Oops, received an empty Dataframe as arguemnt for {table_type} transformation")
             return df
 
-        print(f"Initialising transformation of {table_type} data")
-        
-        if table_type == "brands":
-            return self._transform_brands(df)
+        if self.copy_free:
+            with copy_on_write():
+                return self._transform_frame(df, table_type)
+        return self._transform_frame(df, table_type)
+
+    def _transform_frame(self, df, table_type):
+        # runs the transformation of the table type on a (non-empty) df, see transform
+        logger.debug(f"Initialising transformation of {table_type} data")
+        
+        if self.workers > 1 and table_type in PARTITION_KEYS and len(df) >= PARTITION_MIN_ROWS:
+            transformed_df = self._transform_partitioned(df, table_type)
+        elif table_type == "brands":
+            transformed_df = self._transform_brands(df)
         elif table_type == "categories":
-            return self._transform_categories(df)       
+            transformed_df = self._transform_categories(df)       
         elif table_type == "stores":
-            return self._transform_stores(df)
+            transformed_df = self._transform_stores(df)
         elif table_type == "staffs":        
-            return self._transform_staffs(df)
+            transformed_df = self._transform_staffs(df)
         elif table_type == "products":
-            return self._transform_products(df)
+            transformed_df = self._transform_products(df)
         elif table_type == "stocks":
-            return self._transform_stocks(df)    
+            transformed_df = self._transform_stocks(df)    
         elif table_type == "customers":
-            return self._transform_customers(df)
+            transformed_df = self._transform_customers(df)
         elif table_type == "orders":
-            return self._transform_orders(df)
+            transformed_df = self._transform_orders(df)
         elif table_type == "order_items":
-            return self._transform_order_items(df)
+            transformed_df = self._transform_order_items(df)
         else:
-            print("Attention: Received unknown table type as argument. No transformation - returning original DataFrame")
+            logger.warning("Attention: Received unknown table type as argument. No transformation - returning original DataFrame")
             return df
         
+        if self.compact:
+            transformed_df = self._apply_compact_dtypes(transformed_df, table_type)
+        return transformed_df
+
+    def _transform_partitioned(self, df, table_type):
+        """
+        Transforms a large frame in a pool of worker processes
+        
+        The frame is split into self.workers partitions by ranges of its PARTITION_KEYS column (the boundaries are
+        quantiles of the key, so the partitions get about the same number of rows), and every partition is transformed
+        by a worker process. The rows come back in their original order, with their original index.
+        
+        The workers don't get the reference data with every partition: the key arrays are copied once into shared
+        memory, which the workers attach to when they start (see _share_reference_data and _init_partition_worker).
+        """
+        
+        # the partition of every row, by the range its key falls into (rows with a missing key go to the last one)
+        keys = pd.to_numeric(df[PARTITION_KEYS[table_type]], errors="coerce").to_numpy(dtype="float64")
+        boundaries = np.nanquantile(keys, np.linspace(0, 1, self.workers + 1)[1:-1])
+        partition_numbers = np.searchsorted(boundaries, keys, side="right")
+        
+        # every partition is indexed by the positions of its rows, to put the transformed rows back in order afterwards
+        partitions = []
+        for number in range(self.workers):
+            positions = np.flatnonzero(partition_numbers == number)
+            if len(positions):
+                partitions.append(df.iloc[positions].set_axis(positions))
+        
+        shared_reference, segments = self._share_reference_data()
+        settings = {"copy_free": self.copy_free, "date_unit": self.date_unit}
+        
+        try:
+            with ProcessPoolExecutor(max_workers=len(partitions), mp_context=_process_context(),
+                                     initializer=_init_partition_worker,
+                                     initargs=(settings, shared_reference, logging.getLogger().getEffectiveLevel())) as pool:
+                results = list(pool.map(_transform_partition, partitions, repeat(table_type)))
+        finally:
+            # the workers have exited, so the shared memory can be freed
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+        
+        transformed_df = pd.concat(results).sort_index()
+        transformed_df.index = df.index[transformed_df.index.to_numpy()]
+        logger.debug(f"Transformed {len(transformed_df)} rows of {table_type} in {len(partitions)} partitions")
+        return transformed_df
+    
+    def _share_reference_data(self):
+        """
+        Copies the key indexes of the reference data into shared memory, for the worker processes
+        
+        Returns:
+                the description of the reference data the workers rebuild it from (numeric keys by the name, shape and
+                dtype of their shared memory segment, other keys and the small name indexes as they are),
+                and the shared memory segments, which the caller has to close and unlink
+        """
+        
+        shared_reference = {}
+        segments = []
+        for table_type, reference in self.reference_data.items():
+            if reference is None:
+                continue
+            
+            keys = reference["keys"].to_numpy()
+            if keys.dtype.kind in "iuf" and len(keys):
+                segment = shared_memory.SharedMemory(create=True, size=keys.nbytes)
+                np.ndarray(keys.shape, dtype=keys.dtype, buffer=segment.buf)[:] = keys
+                segments.append(segment)
+                shared_keys = ("shared", segment.name, keys.shape, keys.dtype.str)
+            else:
+                shared_keys = ("array", keys)
+            
+            shared_reference[table_type] = {"keys": shared_keys, "names": reference["names"]}
+        
+        return shared_reference, segments
+    
+    def transform_chunks(self, chunks, table_type):
+        """
+        Transforms a stream of DataFrame chunks (e.g from Extractor.extract_from_db_chunks) one at a time
+        
+        Arguements:
+                chunks: iterable of pandas DataFrames
+                table_type: specific table type
+                
+        Yields:
+                Transformed chunks (chunks where every row was removed are skipped)
+        """
+        
+        for chunk in chunks:
+            transformed_chunk = self.transform(chunk, table_type)
+            if not transformed_chunk.empty:
+                yield transformed_chunk
+        
     
     #BRANDS
     
     def _transform_brands(self, df):
            
         #  dataframe is copied to avoid modifying the original data
-        transformed_df = df.copy()
+        transformed_df = self._working_copy(df)
 
         # first step of tranformation -> data types
         # brand_id type is set to integer,brand_name data type as string 
@@ -92,20 +462,20 @@ class Transformer:
         transformed_df["brand_name"] = transformed_df["brand_name"].astype(str)
 
         # since data set is small, no need to check for duplicates here
-        print(f"Transformed  {len(transformed_df)} reocrds")
+        logger.debug(f"Transformed  {len(transformed_df)} reocrds")
         return transformed_df
     
     #CATEGORIES
     
     def _transform_categories(self, df):
         
-        transformed_df = df.copy()
+        transformed_df = self._working_copy(df)
     
         # data types: category_id is set as int; category_name as string
         transformed_df['category_id'] = transformed_df['category_id'].astype(int)
         transformed_df['category_name'] = transformed_df['category_name'].astype(str)    
 
-        print(f"Transformed {len(transformed_df)} category records")
+        logger.debug(f"Transformed {len(transformed_df)} category records")
         return transformed_df
         
     #STORES
@@ -113,28 +483,30 @@ class Transformer:
     def _transform_stores(self, df):
         
         # copy the DataFrame 
-        transformed_df = df.copy()
+        transformed_df = self._working_copy(df)
         
         # first: adding store_id column if it doesn't exist (to be used as primary key)
         if "store_id" not in transformed_df.columns:
             # we do this by creating incrementing IDs starting from 1
             transformed_df["store_id"] = range(1, len(transformed_df) + 1)
-            print("Added a new store_id column (primary key)")
+            logger.debug("Added a new store_id column (primary key)")
         
         # next, loop through each column in the df and check if datatype = object (string in pandas)
         # for those, missing values (na/NaN) is replaced with an empty string (" ") and each column is set as string type
         # doesn't seem super necessary in this set, but doing it for consistency
-        for col in transformed_df.columns:
-            if transformed_df[col].dtype == "object":
-                transformed_df[col] = transformed_df[col].astype(str)    
+        # (in compact mode the text columns are converted once at the end instead, see _apply_compact_dtypes)
+        if not self.compact:
+            for col in transformed_df.columns:
+                if transformed_df[col].dtype == "object":
+                    transformed_df[col] = transformed_df[col].astype(str)    
 
         # making sure that zip_code can be treated as intergers
         transformed_df["zip_code"] = transformed_df["zip_code"].astype(int)
-        print("Converted zip_code to integer")
+        logger.debug("Converted zip_code to integer")
 
         # lastly, saving the newly transformed stores data in its target dir
         
-        print(f"Transformed {len(transformed_df)} STORES records")
+        logger.debug(f"Transformed {len(transformed_df)} STORES records")
         return transformed_df
         
     #STAFFS
@@ -143,32 +515,31 @@ class Transformer:
         
             
         # again, copy the df
-        transformed_df = df.copy()
+        transformed_df = self._working_copy(df)
         
         # starting by renaming  the "name" column to "first_name" for clarity
         if "name" in transformed_df.columns:
             transformed_df = transformed_df.rename(columns={"name": "first_name"})
-            print("Renamed 'name' column to 'first_name'")
+            logger.debug("Renamed 'name' column to 'first_name'")
         
         # then adding a NEW staff_id column if it doesn't exist already (to be used as primary key)
         if "staff_id" not in transformed_df.columns:
             transformed_df["staff_id"] = range(1, len(transformed_df) + 1)
-            print("Added a new column: staff_id, designated primary key")
+            logger.debug("Added a new column: staff_id, designated primary key")
         
         # convert store_name to store_id and map it using the transformed stores df just created (where store_id was added)
-        if "store_name" in transformed_df.columns and self.reference_data["stores"] is not None:
+        if "store_name" in transformed_df.columns and self._has_reference("stores"):
 
-            # zip() pairs the two columns in tuples, and then into a dict (e.g {'Santa Cruz Bikes': 1, 'Baldwin Bikes': 2, 'Rowlett Bikes': 3})
-            # this dict can then be used to look up ID for store name
-            store_name_to_id = dict(zip(self.reference_data["stores"]["name"], self.reference_data["stores"]["store_id"]))
+            # the stores reference data has a name index: a Series with store names as index and store_id's as values
+            # (e.g Santa Cruz Bikes -> 1, Baldwin Bikes -> 2, Rowlett Bikes -> 3)
 
             # then we can create a new "store_id" column by replacing each store name with its corresponding store_id:
-            # for each staff member .map takes each store_name and looks up its corresponding store_id in the dict
+            # for each staff member .map takes each store_name and looks up its corresponding store_id in the index
             # the IDs are then assigned to a new column on the left called store_id
             # lastly we the store_name column is dropped(deleted)
-            transformed_df["store_id"] = transformed_df["store_name"].map(store_name_to_id)
+            transformed_df["store_id"] = self._lookup_keys(transformed_df["store_name"], "stores")
             transformed_df = transformed_df.drop(columns=["store_name"])
-            print("Converted store_name to store_id in a new store_id column and dropped store_name column")
+            logger.debug("Converted store_name to store_id in a new store_id column and dropped store_name column")
         
         # next we need to handle manager_id because first row is empty
         if "manager_id" in transformed_df.columns:
@@ -185,25 +556,27 @@ class Transformer:
             mask = transformed_df["manager_id"].notna()
             transformed_df.loc[mask, "manager_id"] = transformed_df.loc[mask, "manager_id"].astype(int)
             
-            print("Processed manager_id values: kept NaN for top manager, converted others to integers")
+            logger.debug("Processed manager_id values: kept NaN for top manager, converted others to integers")
 
         # also ensure that "active" column is an integer type (0 or 1)
         if "active" in transformed_df.columns:
             transformed_df["active"] = transformed_df["active"].astype(int)
-            print("Converted values in 'active' column to integers")
+            logger.debug("Converted values in 'active' column to integers")
         
 
-        # as before standardise remaining columns
-        for col in transformed_df.columns:
-            if transformed_df[col].dtype == "object":  # string columns
-                transformed_df[col] = transformed_df[col].fillna('').astype(str)
+        # as before standardise remaining columns (unless compact mode converts them at the end)
+        if not self.compact:
+            for col in transformed_df.columns:
+                if transformed_df[col].dtype == "object":  # string columns
+                    transformed_df[col] = transformed_df[col].fillna('').astype(str)
         
         # finally, dropping the street column which is redundant
-        transformed_df = transformed_df.drop(columns=["street"])
+        # (it isn't read at all when the csv schema hints are used, see extractor.CSV_SCHEMAS)
+        transformed_df = transformed_df.drop(columns=["street"], errors="ignore")
 
         # then save the transformed staffs data to its dir
 
-        print(f"Transformed {len(transformed_df)} staff records")
+        logger.debug(f"Transformed {len(transformed_df)} staff records")
         return transformed_df
         
     #PRODUCTS
@@ -211,62 +584,57 @@ class Transformer:
     def _transform_products(self, df):
           
         #copying the df
-        transformed_df = df.copy()
+        transformed_df = self._working_copy(df)
         
         # beginning the tranformation by ensuring correct data types for all columsn in products
         
         transformed_df["product_id"] = transformed_df["product_id"].astype(int) #product_id -> int (primary key)
-        print("converted product_id to integers")
+        logger.debug("converted product_id to integers")
         transformed_df["product_name"] = transformed_df["product_name"].astype(str) #product_name -> string
-        print("Converted product_name to string type")
+        logger.debug("Converted product_name to string type")
         transformed_df["brand_id"] = pd.to_numeric(transformed_df["brand_id"], errors="coerce") #brand_id -> num. using pd.to_num which allows handling of NaN
-        print("Converted brand_id to numeric")
+        logger.debug("Converted brand_id to numeric")
         transformed_df["category_id"] = pd.to_numeric(transformed_df["category_id"], errors="coerce") #category_id -> numeric (might encounter NaN)
-        print("Converted category_id to numeric")
+        logger.debug("Converted category_id to numeric")
         transformed_df["model_year"] = transformed_df["model_year"].astype(int) #model_year -> int
-        print("converted model_year to integers")
+        logger.debug("converted model_year to integers")
         transformed_df["list_price"] = pd.to_numeric(transformed_df["list_price"], errors="coerce") #list_price -> numeric (to be float)
-        print("Converted list_price to numeric (float)")
+        logger.debug("Converted list_price to numeric (float)")
         
         # validating the brand IDs in products by comparing to brands
-        # first extracting the brand_id column from the brands df resulting in a list 
-        # the list is converted to a set to eliminate potential duplicates and for optimisation
-        if self.reference_data["brands"] is not None:
-            
-            valid_brand_ids = set(self.reference_data["brands"]["brand_id"])
+        # the brands reference data holds an index of the unique brand_id's, built once when it was added
+        if self._has_reference("brands"):
         
             #next a we create a mask for catching invaLid brand IDs:
-            # a list of all brand ID in products is checked against the set of valid IDs created above and returns a boolen
-            # ~ operator inverts those booleans value, so that True becomes False and vice versa
-            # the invalid_brand_mask series of bools now has the value of True for the rows(if nay) that need fixing
-            invalid_brand_mask = ~transformed_df["brand_id"].isin(valid_brand_ids)
+            # all brand ID in products are looked up in the index of valid IDs, which returns a boolean for each row
+            # the invalid_brand_mask series of bools has the value of True for the rows(if nay) that need fixing
+            invalid_brand_mask = self._invalid_keys(transformed_df["brand_id"], "brands")
         
             # here then any() return True if at least one value in the mask is True
             # potentential invalid ID are then counted with .sum (True is 1 and False is 0)
             # where invalid ID are encountered, they're changed to NULL at the affected rows 
             if invalid_brand_mask.any():
                 invalid_count = invalid_brand_mask.sum()
-                print(f"Attention: Located {invalid_count} products with invalid brand_id values..!")
+                logger.warning(f"Attention: Located {invalid_count} products with invalid brand_id values..!")
                 transformed_df.loc[invalid_brand_mask, "brand_id"] = None
-                print("Invalid brand_id values changed to NULL")
+                logger.debug("Invalid brand_id values changed to NULL")
             else:
-                print("All good - No invalid brand_id values identified!")
+                logger.debug("All good - No invalid brand_id values identified!")
             
             #repeating the procedure for category_id values against category data set..
-        if self.reference_data["categories"] is not None:
+        if self._has_reference("categories"):
                 
-            valid_category_ids = set(self.reference_data["categories"]["category_id"])
-            invalid_category_mask = ~transformed_df["category_id"].isin(valid_category_ids)
+            invalid_category_mask = self._invalid_keys(transformed_df["category_id"], "categories")
             
             if invalid_category_mask.any():
                 invalid_count = invalid_category_mask.sum()
-                print(f"Attention: Located {invalid_count} products with invalid category_id values..!")
+                logger.warning(f"Attention: Located {invalid_count} products with invalid category_id values..!")
                 transformed_df.loc[invalid_category_mask, "category_id"] = None
-                print("Invalid categoryd_id values changed to NULL")
+                logger.debug("Invalid categoryd_id values changed to NULL")
             else:
-                print("All the category_id values are valid - good data quality!")
+                logger.debug("All the category_id values are valid - good data quality!")
             
-        print(f"Transformed {len(transformed_df)} product records")
+        logger.debug(f"Transformed {len(transformed_df)} product records")
         return transformed_df
     
     #STOCKS
@@ -274,46 +642,43 @@ class Transformer:
     def _transform_stocks(self, df):
         
         #copy time
-        transformed_df = df.copy()
+        transformed_df = self._working_copy(df)
         
         # beginning the transforming of stocks data by converting store_name to store_id
         # doing this in order to be able to establish relationships between tables later
-        # first a dict is created to map store names to store IDs using the store df
-        # then each store "name" is replaced by the corresponding "store_id" with .map
-        if "store_name" in transformed_df.columns and self.reference_data["stores"] is not None:
-            store_name_to_id = dict(zip(self.reference_data["stores"]["name"], self.reference_data["stores"]["store_id"]))
-            transformed_df["store_id"] = transformed_df["store_name"].map(store_name_to_id)
-            print("converted store names to store IDs in stocks data set")
+        # each store "name" is replaced by the corresponding "store_id" with the name index of the stores reference data
+        if "store_name" in transformed_df.columns and self._has_reference("stores"):
+            transformed_df["store_id"] = self._lookup_keys(transformed_df["store_name"], "stores")
+            logger.debug("converted store names to store IDs in stocks data set")
             # can then remove the store_name columns which is now redundant 
             transformed_df = transformed_df.drop(columns=["store_name"])
-            print("Removed store_name column in stocks data set")
+            logger.debug("Removed store_name column in stocks data set")
         else:
-            print("store_name column not found")
+            logger.warning("store_name column not found")
         
         #moving on to data type conversions:
         transformed_df["product_id"] = transformed_df["product_id"].astype(int) # product_id -> int
-        print("Converted product_id to integers")
+        logger.debug("Converted product_id to integers")
         transformed_df["quantity"] = transformed_df["quantity"].astype(int) # quantity -> int
-        print("converted quantity to integer")
+        logger.debug("converted quantity to integer")
         
         #lastly, validation that product_id values in the stocks data exist in the products data 
-        if self.reference_data["products"] is not None:
-            valid_product_ids = set(self.reference_data["products"]["product_id"])
-            invalid_product_mask = ~transformed_df["product_id"].isin(valid_product_ids)
+        if self._has_reference("products"):
+            invalid_product_mask = self._invalid_keys(transformed_df["product_id"], "products")
         
             if invalid_product_mask.any():
                 invalid_count = invalid_product_mask.sum()
-                print(f"Warning: Encountered {invalid_count} rows in stocks data set with invalid product IDs")
+                logger.warning(f"Warning: Encountered {invalid_count} rows in stocks data set with invalid product IDs")
 
                 #opting to delete any rows in stocks with invalid product ID since it represents non-existing product
                 transformed_df = transformed_df[~invalid_product_mask]
-                print(f"Removed {invalid_count} stocks rows with invalid product IDs")
+                logger.debug(f"Removed {invalid_count} stocks rows with invalid product IDs")
             else:
-                print("All inventory in stock has a valid product ID - Yay!")
+                logger.debug("All inventory in stock has a valid product ID - Yay!")
             
         #save the transformed stocks data
 
-        print(f"Transformed {len(transformed_df)} rows of stocks records")
+        logger.debug(f"Transformed {len(transformed_df)} rows of stocks records")
         return transformed_df
     
     #CUSTOMERS
@@ -322,24 +687,24 @@ class Transformer:
         
             
         # copy ok ok
-        transformed_df = df.copy()
+        transformed_df = self._working_copy(df)
         
         # data type conversion for customers data set columns
         
         transformed_df["customer_id"] = transformed_df["customer_id"].astype(int) #customer_id -> int (primary key)
-        print("converted customer_id to integer")
+        logger.debug("converted customer_id to integer")
 
         for col in ['first_name', 'last_name', 'phone', 'email', 'street', 'city', 'state']: # -> all strings
-            if col in transformed_df.columns:
+            if col in transformed_df.columns and not self.compact: # (compact mode converts them at the end)
                 transformed_df[col] = transformed_df[col].fillna('').astype(str)
-        print("Converted 'first_name', 'last_name', 'phone', 'email', 'street', 'city', 'state' to string values and converted NaN to empty strings")
+        logger.debug("Converted 'first_name', 'last_name', 'phone', 'email', 'street', 'city', 'state' to string values and converted NaN to empty strings")
         
         if "zip_code" in transformed_df.columns:
             transformed_df["zip_code"] = pd.to_numeric(transformed_df["zip_code"], errors="coerce") # zip_code -> numeric first
             transformed_df["zip_code"] = transformed_df["zip_code"].fillna(0).astype(int) # NaN are replaced ith 0 and zip_code -> int
-            print("Zip codes are converted to numeric, NaN are replaced with 0, and zip codes are finally converted to integers")
+            logger.debug("Zip codes are converted to numeric, NaN are replaced with 0, and zip codes are finally converted to integers")
             
-        print(f"Transformed {len(transformed_df)} rows of customers data")
+        logger.debug(f"Transformed {len(transformed_df)} rows of customers data")
         return transformed_df
     
     #ORDERS
@@ -347,50 +712,51 @@ class Transformer:
     def _transform_orders(self, df):
         
         # copy copy copy
-        transformed_df = df.copy()
+        transformed_df = self._working_copy(df)
                 
         # data type conversions
         transformed_df["order_id"] = transformed_df["order_id"].astype(int) # order_id -> int
         transformed_df["customer_id"] = transformed_df["customer_id"].astype(int) # customer_id -> int
         transformed_df["order_status"] = transformed_df["order_status"].astype(int) # order_status -> int
-        print("converted order_id, customer_id, and order_status to integers")
+        logger.debug("converted order_id, customer_id, and order_status to integers")
         
         # data type conversion cont... Dates <____<
         # converting string dates into DATETIME objects with pandas
-        transformed_df["order_date"] = pd.to_datetime(transformed_df["order_date"], format="%d/%m/%Y", errors="coerce") #order_date -> datetime 
-        transformed_df["required_date"] = pd.to_datetime(transformed_df["required_date"],format="%d/%m/%Y", errors="coerce") #required_date -> datetime
-        transformed_df["shipped_date"] = pd.to_datetime(transformed_df["shipped_date"], format="%d/%m/%Y", errors="coerce") #shipped_date -> datetime
-        print("converted order_date, required_date, and shipped_date to datetime data types. Note that shipped_date values may Null values (=not shipped yet)")
+        # each distinct date string is only parsed once, see _parse_dates
+        # (dates extracted from the API in a binary format (Arrow/Parquet) are already datetimes, so they're not parsed)
+        for col in ["order_date", "required_date", "shipped_date"]:
+            if not pd.api.types.is_datetime64_any_dtype(transformed_df[col]):
+                transformed_df[col] = self._parse_dates(transformed_df[col]) # -> datetime
+            elif self.date_unit is not None:
+                transformed_df[col] = transformed_df[col].astype(f"datetime64[{self.date_unit}]")
+        logger.debug("converted order_date, required_date, and shipped_date to datetime data types. Note that shipped_date values may Null values (=not shipped yet)")
         
         # Next, changing store names to store IDs (and thus creation of relationship with stores table)
-        if "store" in transformed_df.columns and self.reference_data["stores"] is not None:
-            store_name_to_id = dict(zip(self.reference_data["stores"]["name"], self.reference_data["stores"]["store_id"]))
-            transformed_df["store_id"] = transformed_df["store"].map(store_name_to_id)
+        if "store" in transformed_df.columns and self._has_reference("stores"):
+            transformed_df["store_id"] = self._lookup_keys(transformed_df["store"], "stores")
             transformed_df = transformed_df.drop(columns=["store"])
-            print("Converted store names to store_id referencing staffs table")
+            logger.debug("Converted store names to store_id referencing staffs table")
             
         # changing staff_name to staff_id. note that staff_name in orders corresponds to first_name in our staffs data set
-        if "staff_name" in transformed_df.columns and self.reference_data["staffs"] is not None:
+        if "staff_name" in transformed_df.columns and self._has_reference("staffs"):
 
-            staff_name_to_id = dict(zip(self.reference_data["staffs"]["first_name"], self.reference_data["staffs"]["staff_id"]))
-            transformed_df["staff_id"] = transformed_df["staff_name"].map(staff_name_to_id)
+            transformed_df["staff_id"] = self._lookup_keys(transformed_df["staff_name"], "staffs")
             transformed_df = transformed_df.drop(columns=["staff_name"])
-            print("converted staff names to staff_id referencing staffs table")
+            logger.debug("converted staff names to staff_id referencing staffs table")
             
         # lastly, validating customer_id's, ensuring that all orders are referencing customers that exist
         # OPting to setting potential orders with invalid customer_id to NULL to keep the data
-        if self.reference_data["customers"] is not None:
-            valid_customer_ids = set(self.reference_data["customers"]["customer_id"])
-            invalid_customer_mask = ~transformed_df["customer_id"].isin(valid_customer_ids)
+        if self._has_reference("customers"):
+            invalid_customer_mask = self._invalid_keys(transformed_df["customer_id"], "customers")
             
             if invalid_customer_mask.any():
                 invalid_count = invalid_customer_mask.sum()
                 transformed_df.loc[invalid_customer_mask, "customer_id"] = None
-                print(f"Attention: encountered {invalid_count} orders where customer_id is invalid! Where applicable, customer_id set as NULL")
+                logger.warning(f"Attention: encountered {invalid_count} orders where customer_id is invalid! Where applicable, customer_id set as NULL")
             else:
-                print("No issues encountered when validating customer_id in orders data set")
+                logger.debug("No issues encountered when validating customer_id in orders data set")
                 
-        print(f"Transformed {len(transformed_df)}  rows of orders data")
+        logger.debug(f"Transformed {len(transformed_df)}  rows of orders data")
         return transformed_df
     
     #ORDER_ITEMS
@@ -398,47 +764,45 @@ class Transformer:
     def _transform_order_items(self, df):
         
         # copy dataframe
-        transformed_df = df.copy()
+        transformed_df = self._working_copy(df)
         
         # conversion of datatypes
         transformed_df["order_id"] = transformed_df["order_id"].astype(int) #order_id -> int
         transformed_df["product_id"] = transformed_df["product_id"].astype(int) # product_id -> int
         transformed_df["quantity"] = transformed_df["quantity"].astype(int) # quantity -> int
-        print("Converted order_id, item_id, product_id, and quantity to integers")    
+        logger.debug("Converted order_id, item_id, product_id, and quantity to integers")    
         transformed_df["list_price"] = pd.to_numeric(transformed_df["list_price"], errors="coerce") #list_price -> numeric (to allow decimals -> float)
         transformed_df["discount"] = pd.to_numeric(transformed_df["discount"], errors="coerce") #discount -> numeric (ditto)
-        print("Converted list_price and discount to numeric (-> float) values")
+        logger.debug("Converted list_price and discount to numeric (-> float) values")
         
         #next up, validating order_id against the orders data set, ensuring that the ordered items refer to actual orders
-        if self.reference_data["orders"] is not None:
-            valid_order_ids = set(self.reference_data["orders"]["order_id"])
-            invalid_order_mask = ~transformed_df["order_id"].isin(valid_order_ids)
+        if self._has_reference("orders"):
+            invalid_order_mask = self._invalid_keys(transformed_df["order_id"], "orders")
             
             if invalid_order_mask.any():
                 invalid_count = invalid_order_mask.sum()
                 transformed_df = transformed_df[~invalid_order_mask] # deletes the bad rows
-                print(f"Warning!! Found {invalid_count} rows of order_items data with invalid order_ids - These rows have been removed from the transformed order_items data")
+                logger.warning(f"Warning!! Found {invalid_count} rows of order_items data with invalid order_ids - These rows have been removed from the transformed order_items data")
             else:
-                print("Wow, all order items reference valid order_id - Nice data")
+                logger.debug("Wow, all order items reference valid order_id - Nice data")
             
         # same thing with product_id's - ensuring that all products in order_items reference actual products in the products table
-        if self.reference_data["products"] is not None:
-            valid_product_ids = set(self.reference_data["products"]["product_id"])
-            invalid_product_mask = ~transformed_df["product_id"].isin(valid_product_ids)
+        if self._has_reference("products"):
+            invalid_product_mask = self._invalid_keys(transformed_df["product_id"], "products")
             
             if invalid_product_mask.any():
                 invalid_count = invalid_product_mask.sum()
-                transformed_df.loc[invalid_order_mask, "product_id"] = None # opting to set these as NULL rather than delete
-                print(f"Warning!! Found {invalid_count} rows of order_items data with invalid product_id's - these set as NULL values")
+                transformed_df.loc[invalid_product_mask, "product_id"] = None # opting to set these as NULL rather than delete
+                logger.warning(f"Warning!! Found {invalid_count} rows of order_items data with invalid product_id's - these set as NULL values")
             else:
-                print("Yay, all order items reference valid product_id - Nice data")
+                logger.debug("Yay, all order items reference valid product_id - Nice data")
                 
         # ensuring all quantities are positive 
         negative_qty_mask = transformed_df["quantity"] <= 0
         if negative_qty_mask.any():
             negative_count = negative_qty_mask.sum()                   
             transformed_df.loc[negative_qty_mask, 'quantity'] = 1 # Fixing the issue by setting to a minimum value of 1
-            print(f"Oops! Found {negative_count} order items with zero or negative quantities, that doens't make sense. Correctly the affected rows by setting val as 1")
+            logger.warning(f"Oops! Found {negative_count} order items with zero or negative quantities, that doens't make sense. Correctly the affected rows by setting val as 1")
 
         # likewise, ensure that all discounts are between 0 and 1 (=0% to 100%)
         invalid_discount_mask = (transformed_df["discount"] < 0) | (transformed_df["discount"] > 1)
@@ -446,9 +810,44 @@ class Transformer:
             invalid_count = invalid_discount_mask.sum()
             transformed_df.loc[transformed_df["discount"] < 0, "discount"] = 0 # if negative, set to 0
             transformed_df.loc[transformed_df["discount"] > 1, "discount"] = 1 # if > 1 set to 1
-            print(f"Warning: Found {invalid_count} order items with invalid discount values.. Vals > 1 set to 1, vals < 0 set to 0 ")
+            logger.warning(f"Warning: Found {invalid_count} order items with invalid discount values.. Vals > 1 set to 1, vals < 0 set to 0 ")
 
-        print(f"Transformed {len(transformed_df)} rows of order_item records")
+        logger.debug(f"Transformed {len(transformed_df)} rows of order_item records")
         return transformed_df
 
                 
+
+
+def _process_context():
+    # worker processes are started from a fork server where there is one (Unix): forking the ETL process itself isn't safe
+    # while its other threads are working, and a fork server that has imported this module once starts workers quickly
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _init_partition_worker(settings, shared_reference, log_level):
+    # runs once in every worker process: builds the worker's Transformer on the reference data in shared memory
+    logging.basicConfig(level=log_level)
+    transformer = Transformer(**settings)
+    segments = []
+    
+    for table_type, reference in shared_reference.items():
+        if reference["keys"][0] == "shared":
+            _, name, shape, dtype = reference["keys"]
+            segment = shared_memory.SharedMemory(name=name)
+            keys = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+            segments.append(segment) # (kept open for as long as the worker lives)
+        else:
+            keys = reference["keys"][1]
+        transformer.reference_data[table_type] = {"keys": pd.Index(keys, copy=False), "names": reference["names"]}
+    
+    _worker_state["transformer"] = transformer
+    _worker_state["segments"] = segments
+
+
+def _transform_partition(df, table_type):
+    # transforms one partition in a worker process (compact dtypes are applied to the whole frame afterwards)
+    return _worker_state["transformer"].transform(df, table_type)
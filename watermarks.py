@@ -0,0 +1,62 @@
+import logging
+import json
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class WatermarkStore:
+    """
+    Class that keeps track of the high-water mark (=highest key loaded so far) of each table
+
+    The watermarks are saved in a small JSON file after every successful load, so the next
+    (incremental) run only has to extract the rows that are newer than the watermark.
+    """
+
+    def __init__(self, path="watermarks.json"):
+        """
+        Initialises the store and reads the saved watermarks, if any
+
+        Arguments:
+            path: path of the JSON file the watermarks are saved in
+        """
+
+        self.path = path
+        self._lock = threading.Lock() # tables are loaded in parallel, so updates are serialised
+
+        if os.path.exists(path):
+            with open(path) as f:
+                self.watermarks = json.load(f)
+        else:
+            self.watermarks = {}
+
+    def get(self, table_name):
+        """
+        Returns the watermark of a table, or None if the table hasn't been loaded before
+        """
+        return self.watermarks.get(table_name)
+
+    def update(self, table_name, value):
+        """
+        Saves a new watermark for a table (it never moves backwards)
+
+        Arguments:
+            table_name: name of the table
+            value: highest key value that was loaded
+        """
+
+        with self._lock:
+            current = self.watermarks.get(table_name)
+            if current is not None and value <= current:
+                return
+
+            self.watermarks[table_name] = value
+
+            # writing to a temporary file first, so a crash can't leave a half written file behind
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self.watermarks, f, indent=4)
+            os.replace(temp_path, self.path)
+
+        logger.info(f"Saved watermark for {table_name}: {value}")